@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
-from .models import User, Page, Permission, Comment, CommentHistory
+from django.db.models import Q
+
+from .models import User, Page, Permission, Comment, CommentHistory, PageGroup, Role, RoleGrant, UserRole
+from .search import INDEXES, get_search_backend
 
 # 1) Register your custom User model so “Users” shows up in admin.
 #    We subclass DjangoUserAdmin so you keep the standard “add/change user” forms.
@@ -32,29 +35,113 @@ class UserAdmin(DjangoUserAdmin):
 
 @admin.register(Page)
 class PageAdmin(admin.ModelAdmin):
-    list_display = ("id", "name")
+    # counts come from the maintained PageActivity row, joined in the list query
+    list_display = ("id", "name", "comment_count", "commenter_count", "edit_count", "last_comment_at")
+    list_select_related = ("activity",)
     search_fields = ("name",)
 
+    def _activity(self, obj, field, default=0):
+        activity = getattr(obj, "activity", None)
+        return default if activity is None else getattr(activity, field)
+
+    @admin.display(description="comments", ordering="activity__comment_count")
+    def comment_count(self, obj):
+        return self._activity(obj, "comment_count")
+
+    @admin.display(description="commenters", ordering="activity__commenter_count")
+    def commenter_count(self, obj):
+        return self._activity(obj, "commenter_count")
+
+    @admin.display(description="edits", ordering="activity__edit_count")
+    def edit_count(self, obj):
+        return self._activity(obj, "edit_count")
+
+    @admin.display(description="last comment", ordering="activity__last_comment_at")
+    def last_comment_at(self, obj):
+        return self._activity(obj, "last_comment_at", None)
+
 
 @admin.register(Permission)
 class PermissionAdmin(admin.ModelAdmin):
+    # Per-user overrides of role grants; the (user, page) joins come with the
+    # list query, and the exact row count is not computed on every page.
     list_display = ("user", "page", "can_view", "can_create", "can_edit", "can_delete")
-    list_filter = ("page", "can_view", "can_create", "can_edit", "can_delete")
+    list_filter = ("can_view", "can_create", "can_edit", "can_delete")
+    list_select_related = ("user", "page")
+    raw_id_fields = ("user", "page")
+    show_full_result_count = False
     search_fields = ("user__email", "page__name")
 
 
+@admin.register(PageGroup)
+class PageGroupAdmin(admin.ModelAdmin):
+    list_display = ("id", "name")
+    search_fields = ("name",)
+    filter_horizontal = ("pages",)
+
+
+class RoleGrantInline(admin.TabularInline):
+    model = RoleGrant
+    raw_id_fields = ("page_group",)
+    extra = 0
+
+
+@admin.register(Role)
+class RoleAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "is_default")
+    list_filter = ("is_default",)
+    search_fields = ("name",)
+    inlines = (RoleGrantInline,)
+
+
+@admin.register(UserRole)
+class UserRoleAdmin(admin.ModelAdmin):
+    list_display = ("user", "role")
+    list_select_related = ("user", "role")
+    list_filter = ("role",)
+    raw_id_fields = ("user",)
+    show_full_result_count = False
+    search_fields = ("user__email", "role__name")
+
+
+class IndexedSearchMixin:
+    """
+    When the search backend keeps a full-text index, the indexed text
+    columns are matched through it instead of an `icontains` table scan;
+    the other search_fields keep the stock admin lookup.
+    """
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        backend = get_search_backend()
+        search_term = search_term.strip()
+        if not search_term or not backend.maintains_index:
+            return super().get_search_results(request, queryset, search_term)
+        index = INDEXES[self.search_index]
+        others = Q()
+        for field in self.get_search_fields(request):
+            if field not in index.fields:
+                others |= Q(**{f"{field}__icontains": search_term})
+        matched = backend.filter(queryset, index, search_term)
+        if others:
+            matched = matched | queryset.filter(others)
+        return matched, False
+
+
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("id", "page", "user", "created_at", "updated_at")
     list_filter = ("page", "user")
     search_fields = ("content", "user__email")
+    search_index = "comment"
 
 
 @admin.register(CommentHistory)
-class CommentHistoryAdmin(admin.ModelAdmin):
+class CommentHistoryAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("id", "comment", "modified_by", "modified_at")
     list_filter = ("modified_by",)
     search_fields = ("previous_content", "modified_by__email")
+    search_index = "comment_history"
 
 from .models import Product
 
@@ -63,4 +150,12 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'price', 'created_at')
     list_display_links = ('name',)
     search_fields = ('name',)
-    list_filter = ('created_at',)
\ No newline at end of file
+    list_filter = ('created_at',)
+
+from .models import OutboundEmail
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'subject')
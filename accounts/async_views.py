@@ -0,0 +1,228 @@
+# accounts/async_views.py
+
+"""
+ASGI-native versions of the hot read endpoints, mounted under /api/async/.
+
+DRF views are synchronous, so under uvicorn every request to them is handed
+to a worker thread. These are plain Django `async def` views: JWT checking,
+the user lookup (`aget`), the page-permission check and the queries
+(`async for`) all run on the event loop. The DRF serializers are reused for
+output; they do no I/O once the querysets are planned.
+
+    GET /api/async/pages/
+    GET /api/async/products/            (?limit= / ?cursor= for keyset pages)
+    GET /api/async/products/<id>/
+    GET /api/async/comments/?page_id=   (requires can_view on the page)
+    GET /api/comments/stream/?page_id=  Server-Sent Events of the page's
+                                        comment changes (accounts/realtime.py)
+"""
+
+from functools import wraps
+
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import aclaims_user
+from .models import Comment, Page, Product, User
+from .pagination import CreatedAtKeysetPagination, IdKeysetPagination
+from .permission_cache import ACTION_FLAGS, aget_permission_matrix
+from .query_planning import plan_queryset
+from .serializers import CommentSerializer, PageSerializer, ProductSerializer
+
+
+class AsyncAuthenticationFailed(Exception):
+    pass
+
+
+async def aauthenticate(request):
+    """
+    Async counterpart of JWTAuthentication: validates the Bearer token and
+    loads the user with the async ORM. Returns None when no token was sent.
+    """
+    header = request.headers.get('Authorization', '')
+    parts = header.split()
+    if not parts or parts[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    if len(parts) != 2:
+        raise AsyncAuthenticationFailed('Authorization header must contain two space-delimited values.')
+    try:
+        token = AccessToken(parts[1])
+    except TokenError as exc:
+        raise AsyncAuthenticationFailed(str(exc))
+    # fresh token claims: no user query at all
+    user = await aclaims_user(token)
+    if user is not None:
+        return user
+    try:
+        user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]})
+    except (KeyError, User.DoesNotExist):
+        raise AsyncAuthenticationFailed('User not found.')
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AsyncAuthenticationFailed('User is inactive.')
+    return user
+
+
+async def ahas_page_permission(user, page_id, action):
+    """
+    Async HasPagePermission: superusers pass, everyone else needs the flag
+    for `action` in their compiled permission matrix.
+    """
+    if user.is_superuser:
+        return True
+    flag = ACTION_FLAGS.get(action)
+    if flag is None:
+        return False
+    try:
+        page_id = int(page_id)
+    except (TypeError, ValueError):
+        return False
+    if 'perms' in getattr(user, 'token', {}):
+        matrix = user.permission_matrix  # carried in the token claims
+    else:
+        matrix = await aget_permission_matrix(user.pk)
+    return matrix.allows(page_id, flag)
+
+
+def _error(detail, status):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def async_api_view(view):
+    """
+    Authenticates the request (IsAuthenticated semantics) and turns DRF
+    exceptions raised by the view into JSON error responses.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _error(f'Method "{request.method}" not allowed.', 405)
+        try:
+            user = await aauthenticate(request)
+        except AsyncAuthenticationFailed as exc:
+            return _error(str(exc), 401)
+        if user is None:
+            return _error('Authentication credentials were not provided.', 401)
+        request.user = user
+        try:
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    return wrapper
+
+
+async def _list_response(request, queryset, serializer_class, paginator):
+    rows = await paginator.apaginate_queryset(queryset, request)
+    if rows is None:
+        rows = [row async for row in queryset]
+        return JsonResponse(serializer_class(rows, many=True).data, safe=False)
+    return JsonResponse({
+        'next': paginator.get_next_link(),
+        'results': serializer_class(rows, many=True).data,
+    })
+
+
+# ─── Views ─────────────────────────────────────────────────────────────────────
+@async_api_view
+async def page_list(request):
+    queryset = plan_queryset(Page.objects.all(), PageSerializer)
+    rows = [page async for page in queryset]
+    return JsonResponse(PageSerializer(rows, many=True).data, safe=False)
+
+
+@async_api_view
+async def product_list(request):
+    queryset = plan_queryset(Product.objects.all(), ProductSerializer)
+    return await _list_response(request, queryset, ProductSerializer, IdKeysetPagination())
+
+
+@async_api_view
+async def product_detail(request, pk):
+    try:
+        product = await plan_queryset(Product.objects.all(), ProductSerializer).aget(pk=pk)
+    except Product.DoesNotExist:
+        raise NotFound()
+    return JsonResponse(ProductSerializer(product).data)
+
+
+@async_api_view
+async def comment_list(request):
+    page_id = request.GET.get('page_id')
+    if not page_id:
+        return JsonResponse([], safe=False)
+    try:
+        page_id = int(page_id)
+    except ValueError:
+        return _error('page_id must be an integer.', 400)
+    if not await ahas_page_permission(request.user, page_id, 'list'):
+        return _error('You do not have permission to perform this action.', 403)
+    queryset = plan_queryset(
+        Comment.objects.filter(page_id=page_id).order_by('-created_at'), CommentSerializer
+    )
+    return await _list_response(request, queryset, CommentSerializer, CreatedAtKeysetPagination())
+
+
+# ─── Comment stream (Server-Sent Events) ───────────────────────────────────────
+import asyncio
+
+from django.http import StreamingHttpResponse
+
+from .permission_cache import VIEW
+from .realtime import get_broker, realtime_setting
+
+
+async def _still_allowed(user, page_id):
+    # fresh matrix, not the token's claims: permissions may change mid-stream
+    return user.is_superuser or (await aget_permission_matrix(user.pk)).allows(page_id, VIEW)
+
+
+async def _event_stream(user, page_id, cursor):
+    """
+    Backlog after `cursor`, then live events, keep-alives and permission
+    re-checks every HEARTBEAT seconds (see accounts/realtime.py).
+    """
+    broker = get_broker()
+    heartbeat = realtime_setting('HEARTBEAT')
+    subscription = broker.subscribe(page_id, cursor)
+    try:
+        yield f"retry: {realtime_setting('RETRY_MS')}\n\n".encode()
+        if subscription.resync:
+            yield f"id: {subscription.cursor}\nevent: resync\ndata: {{}}\n\n".encode()
+        for event in subscription.backlog:
+            yield event.frame
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:  # builtin TimeoutError only from 3.11
+                if not await _still_allowed(user, page_id):
+                    yield b"event: revoked\ndata: {}\n\n"
+                    return
+                yield b": keep-alive\n\n"
+                continue
+            if event is None:
+                # fell too far behind: start over from here after a refetch
+                yield f"id: {broker.cursor()}\nevent: resync\ndata: {{}}\n\n".encode()
+                return
+            yield event.frame
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@async_api_view
+async def comment_stream(request):
+    if not realtime_setting('ENABLED'):
+        raise NotFound()
+    try:
+        page_id = int(request.GET.get('page_id', ''))
+    except ValueError:
+        return _error('page_id must be an integer.', 400)
+    if not await ahas_page_permission(request.user, page_id, 'list'):
+        return _error('You do not have permission to perform this action.', 403)
+    # resume point: the last event the client saw, or "now" for a new stream
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor') or get_broker().cursor()
+    response = StreamingHttpResponse(_event_stream(request.user, page_id, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
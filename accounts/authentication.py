@@ -0,0 +1,237 @@
+# accounts/authentication.py
+
+"""
+Stateless JWT authentication.
+
+Tokens minted by MyTokenObtainPairSerializer / MyTokenRefreshSerializer
+carry the user's id, username, flags and compiled page-permission matrix,
+plus `ver`: the user's auth version at mint time, and `gen`: the global
+auth generation. Both live in the cache. The version is bumped whenever the
+user row, any of their Permission rows or their roles change; the
+generation when a role grant or page group changes, which may reach every
+user at once (see accounts/signals.py).
+
+StatelessJWTAuthentication trusts those claims for safe (read) requests
+when `ver` and `gen` still match the cache, and returns a ClaimsUser
+without touching the database. Writes, tokens without claims, and tokens
+whose version is stale or unknown (cache flushed / evicted) fall back to
+the normal database-backed JWTAuthentication.
+
+With more than one worker process STATELESS_JWT["CACHE_ALIAS"] must point
+at a shared cache, otherwise a bump in one process isn't seen by the others.
+The claims are therefore never trusted while the counters live in a
+process-local LocMemCache, unless STATELESS_JWT["SINGLE_PROCESS"] says one
+process serves every request. Bumps are made by the receivers in
+accounts/signals.py once the change has committed.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .permission_cache import PermissionMatrix, get_permission_matrix
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "MAX_PERMS_IN_TOKEN": 200,  # larger matrices are looked up server-side instead
+    "SINGLE_PROCESS": False,  # True lets a LocMemCache back the counters
+}
+
+VERSION_KEY_PREFIX = "accounts:auth-version"
+GENERATION_KEY = f"{VERSION_KEY_PREFIX}:generation"
+
+
+def stateless_setting(name):
+    return getattr(settings, "STATELESS_JWT", {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[stateless_setting("CACHE_ALIAS")]
+
+
+def claims_trusted():
+    """
+    False when a bump would only reach this process: the counters are in a
+    LocMemCache and SINGLE_PROCESS isn't set.
+    """
+    return stateless_setting("SINGLE_PROCESS") or not isinstance(_cache(), LocMemCache)
+
+
+def _version_key(user_id):
+    return f"{VERSION_KEY_PREFIX}:{user_id}"
+
+
+# ─── Auth version counter ──────────────────────────────────────────────────────
+def current_auth_version(user_id):
+    """
+    Version to stamp into a new token; starts the counter if it is missing.
+
+    Counters start at the current time in milliseconds rather than 1, so a
+    counter lost to eviction or a cache flush never restarts at a value an
+    older (possibly stale) token was stamped with.
+    """
+    return _start_counter(_version_key(user_id))
+
+
+def current_auth_generation():
+    """
+    Global counterpart of current_auth_version(), stamped as `gen`.
+    """
+    return _start_counter(GENERATION_KEY)
+
+
+def _start_counter(key):
+    cache = _cache()
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    return cache.get(key)
+
+
+def _bump(key):
+    try:
+        _cache().incr(key)
+    except ValueError:
+        pass  # no counter: every existing token is already treated as stale
+
+
+def bump_auth_version(user_id):
+    """
+    Marks every token issued so far for `user_id` as stale.
+    """
+    _bump(_version_key(user_id))
+
+
+def bump_auth_generation():
+    """
+    Marks every token issued so far, for every user, as stale.
+    """
+    _bump(GENERATION_KEY)
+
+
+# ─── Claims ────────────────────────────────────────────────────────────────────
+def encode_permissions(matrix):
+    """
+    {3: 5, 7: 1} → "3:5,7:1"
+    """
+    return ",".join(f"{page_id}:{mask}" for page_id, mask in sorted(matrix.masks.items()))
+
+
+def decode_permissions(user_id, value):
+    masks = {}
+    for item in filter(None, value.split(",")):
+        page_id, mask = item.split(":")
+        masks[int(page_id)] = int(mask)
+    return PermissionMatrix(user_id, masks)
+
+
+def stamp_claims(token, user):
+    """
+    Adds the claims StatelessJWTAuthentication relies on to `token`.
+    """
+    token["username"] = user.username
+    token["is_superuser"] = user.is_superuser
+    token["is_staff"] = user.is_staff
+    token["ver"] = current_auth_version(user.pk)
+    token["gen"] = current_auth_generation()
+    if not user.is_superuser:
+        matrix = get_permission_matrix(user.pk)
+        if len(matrix) <= stateless_setting("MAX_PERMS_IN_TOKEN"):
+            token["perms"] = encode_permissions(matrix)
+    return token
+
+
+def claims_are_fresh(validated_token, versions):
+    """
+    `versions`: the cache's {key: value} for the token's user and generation.
+    """
+    user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+    version, generation = versions.get(_version_key(user_id)), versions.get(GENERATION_KEY)
+    return (
+        "username" in validated_token
+        and version is not None
+        and generation is not None
+        and validated_token.get("ver") == version
+        and validated_token.get("gen") == generation
+    )
+
+
+class ClaimsUser:
+    """
+    Read-only user built from token claims. Quacks like accounts.User for
+    everything the read endpoints and permission classes look at.
+    """
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, validated_token):
+        self.token = validated_token
+        self.id = self.pk = validated_token[jwt_settings.USER_ID_CLAIM]
+        self.username = validated_token["username"]
+        self.is_superuser = bool(validated_token.get("is_superuser", False))
+        self.is_staff = bool(validated_token.get("is_staff", False))
+
+    @property
+    def permission_matrix(self):
+        if "perms" in self.token:
+            return decode_permissions(self.pk, self.token["perms"])
+        return get_permission_matrix(self.pk)
+
+    def __str__(self):
+        return self.username
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk and getattr(other, "is_authenticated", False)
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError("ClaimsUser is read-only; writes authenticate against the database.")
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError("ClaimsUser is read-only; writes authenticate against the database.")
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that skips the user query for fresh tokens on safe
+    requests (see module docstring).
+    """
+
+    def authenticate(self, request):
+        if request.method not in permissions.SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is not None and claims_trusted() and claims_are_fresh(
+            validated_token, _cache().get_many([_version_key(user_id), GENERATION_KEY])
+        ):
+            return ClaimsUser(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+
+async def aclaims_user(validated_token):
+    """
+    Async version of the fast path: returns a ClaimsUser, or None when the
+    caller has to load the user from the database.
+    """
+    user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None or not claims_trusted():
+        return None
+    versions = await _cache().aget_many([_version_key(user_id), GENERATION_KEY])
+    if claims_are_fresh(validated_token, versions):
+        return ClaimsUser(validated_token)
+    return None
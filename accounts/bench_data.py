@@ -0,0 +1,189 @@
+# accounts/bench_data.py
+
+"""
+Deterministic benchmark data for `seed_benchmark_data` / `loadtest`.
+
+Everything is written with bulk_create in batches, so even the "full"
+scale (100k users, 1k pages, 1M permissions, 5M comments) loads without
+holding more than one batch in memory. Every seeded user shares the
+password BENCH_PASSWORD, hashed once, so scenarios can log in as any of
+them. Bulk inserts send no signals: the permission matrices, cached list
+responses, page activity counters and search indexes are refreshed once at
+the end instead.
+
+Seed into a dedicated database, e.g.
+
+    SQLITE_PATH=/tmp/bench.sqlite3 python manage.py migrate
+    SQLITE_PATH=/tmp/bench.sqlite3 python manage.py seed_benchmark_data --scale small
+"""
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import page_activity, permission_cache
+from .models import Comment, CommentHistory, Page, Permission, Product, User
+from .response_cache import bump_model_version
+from .search import INDEXES, get_search_backend
+
+BENCH_PASSWORD = "bench-password"
+USER_PREFIX = "bench-user-"
+PAGE_PREFIX = "bench-page-"
+
+SCALES = {
+    "tiny": {"users": 200, "pages": 20, "permissions": 2_000, "comments": 5_000, "products": 500},
+    "small": {"users": 5_000, "pages": 100, "permissions": 50_000, "comments": 200_000, "products": 5_000},
+    "medium": {"users": 20_000, "pages": 500, "permissions": 200_000, "comments": 1_000_000, "products": 20_000},
+    "full": {"users": 100_000, "pages": 1_000, "permissions": 1_000_000, "comments": 5_000_000, "products": 100_000},
+}
+
+WORDS = (
+    "order refund shipping invoice delay thanks broken replacement account login password "
+    "price discount warranty support update feature request bug report great slow fast "
+    "delivery package tracking question answer please urgent issue resolved"
+).split()
+
+
+def bench_data_exists():
+    return User.objects.filter(username__startswith=USER_PREFIX).exists()
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def _sentence(rng, low=4, high=30):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def _spread(model, field, pks, moment):
+    # auto_now_add fields ignore values passed to bulk_create; the base
+    # manager skips the bookkeeping of CommentQuerySet.update()
+    if pks:
+        model._base_manager.filter(pk__in=pks).update(**{field: moment})
+
+
+class Seeder:
+    """
+    Writes one scale's worth of rows; `log` receives progress lines.
+    """
+
+    def __init__(self, counts, seed=42, batch_size=10_000, history_ratio=0.3, permission_profiles=0, log=None):
+        self.counts = counts
+        self.permission_profiles = permission_profiles
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.history_ratio = history_ratio
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def run(self):
+        user_ids = self.seed_users()
+        page_ids = self.seed_pages()
+        self.seed_permissions(user_ids, page_ids)
+        self.seed_comments(user_ids, page_ids)
+        self.seed_products()
+        self.refresh_derived_state()
+
+    def seed_users(self):
+        password = make_password(BENCH_PASSWORD)
+        ids = []
+        for start, end in _batches(self.counts["users"], self.batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=f"{USER_PREFIX}{i}", email=f"{USER_PREFIX}{i}@example.com", password=password)
+                    for i in range(start, end)
+                ])
+            ids.extend(user.pk for user in users)
+        self.log(f"users: {len(ids)}")
+        return ids
+
+    def seed_pages(self):
+        pages = Page.objects.bulk_create([Page(name=f"{PAGE_PREFIX}{i}") for i in range(self.counts["pages"])])
+        self.log(f"pages: {len(pages)}")
+        return [page.pk for page in pages]
+
+    def _permission_set(self, page_ids, per_user):
+        return [
+            dict(
+                page_id=page_id, can_view=True,
+                can_create=self.rng.random() < 0.5,
+                can_edit=self.rng.random() < 0.3,
+                can_delete=self.rng.random() < 0.1,
+            )
+            for page_id in self.rng.sample(page_ids, per_user)
+        ]
+
+    def seed_permissions(self, user_ids, page_ids):
+        # the same number of distinct pages for every user; with
+        # permission_profiles, every user gets one of that many sets (the
+        # shape compact_permissions turns into roles)
+        per_user = min(len(page_ids), max(1, self.counts["permissions"] // max(1, len(user_ids))))
+        profiles = [self._permission_set(page_ids, per_user) for _ in range(self.permission_profiles)]
+        batch, written = [], 0
+        for user_id in user_ids:
+            rows = self.rng.choice(profiles) if profiles else self._permission_set(page_ids, per_user)
+            batch.extend(Permission(user_id=user_id, **row) for row in rows)
+            if len(batch) >= self.batch_size:
+                written += self._flush(Permission, batch)
+                batch = []
+        written += self._flush(Permission, batch)
+        self.log(f"permissions: {written}")
+
+    def seed_comments(self, user_ids, page_ids):
+        total = self.counts["comments"]
+        batches = max(1, -(-total // self.batch_size))
+        step = timedelta(days=365) / batches
+        comments = histories = 0
+        for n, (start, end) in enumerate(_batches(total, self.batch_size)):
+            moment = self.now - timedelta(days=365) + step * n
+            with transaction.atomic():
+                created = Comment.objects.bulk_create([
+                    Comment(page_id=self.rng.choice(page_ids), user_id=self.rng.choice(user_ids),
+                            content=_sentence(self.rng))
+                    for _ in range(start, end)
+                ])
+                _spread(Comment, "created_at", [c.pk for c in created], moment)
+                edits = [
+                    CommentHistory(comment_id=c.pk, previous_content=_sentence(self.rng), modified_by_id=c.user_id)
+                    for c in created if self.rng.random() < self.history_ratio
+                    for _ in range(self.rng.randint(1, 3))
+                ]
+                edits = CommentHistory.objects.bulk_create(edits)
+                _spread(CommentHistory, "modified_at", [h.pk for h in edits], moment + step / 2)
+            comments += len(created)
+            histories += len(edits)
+            self.log(f"comments: {comments}/{total} (history rows: {histories})")
+
+    def seed_products(self):
+        written = 0
+        for start, end in _batches(self.counts["products"], self.batch_size):
+            written += len(Product.objects.bulk_create([
+                Product(name=f"{self.rng.choice(WORDS).capitalize()} {i}", description=_sentence(self.rng, 3, 12),
+                        price=Decimal(self.rng.randint(100, 100_000)) / 100)
+                for i in range(start, end)
+            ]))
+        self.log(f"products: {written}")
+
+    def refresh_derived_state(self):
+        permission_cache.invalidate_all()
+        with transaction.atomic():
+            for model in (Page, Product):
+                bump_model_version(model)
+        self.log(f"page activity: {page_activity.rebuild(batch_size=self.batch_size)} page(s)")
+        backend = get_search_backend()
+        if backend.maintains_index:
+            for name, index in INDEXES.items():
+                self.log(f"search index {name}: {backend.rebuild(index, batch_size=self.batch_size)}")
+
+    @staticmethod
+    def _flush(model, batch):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            return len(model.objects.bulk_create(batch))
@@ -0,0 +1,108 @@
+# accounts/benchmarking.py
+
+"""
+Small helpers shared by the `bench_*` management commands.
+
+`run_http_load` drives a running server (runserver, gunicorn, uvicorn, ...)
+with a pool of threads issuing blocking HTTP requests, which is enough to
+compare two endpoints served by the same process under the same load.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+def obtain_token(base_url, username, password):
+    """
+    Logs in through /api/token/ and returns the access token.
+    """
+    body = json.dumps({"username": username, "password": password}).encode("utf-8")
+    request = Request(
+        base_url.rstrip("/") + "/api/token/",
+        data=body,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urlopen(request, timeout=30) as response:
+        return json.loads(response.read())["access"]
+
+
+class HttpClient:
+    """
+    JSON-over-HTTP client for scripted scenarios (accounts/loadtest.py).
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def call(self, method, path, body=None, token=None):
+        """
+        Returns (status code, response body); HTTP errors are not raised.
+        """
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except HTTPError as exc:
+            return exc.code, exc.read()
+        except (URLError, OSError):
+            return 0, b""
+
+
+def run_http_load(url, headers=None, concurrency=16, total=1000, timeout=30):
+    """
+    Issues `total` GET requests to `url` from `concurrency` threads.
+    Returns {"requests", "errors", "seconds", "rps", "latencies"}.
+    """
+    headers = headers or {}
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+                response.read()
+            ok = True
+        except (HTTPError, URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    seconds = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": seconds,
+        "rps": len(latencies) / seconds if seconds else 0.0,
+        "latencies": latencies,
+    }
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of `values` (0 when empty).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
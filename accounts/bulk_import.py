@@ -0,0 +1,322 @@
+# accounts/bulk_import.py
+
+"""
+Bulk import of users and products from CSV or NDJSON.
+
+    python manage.py import_records users hr-export.csv --report errors.ndjson --checkpoint hr.ckpt
+    POST /api/import/<users|products>/        (superuser only; multipart `file` or a raw body)
+
+Records are processed in chunks of IMPORT["CHUNK_SIZE"]:
+
+1. every row is validated by the importer's serializer;
+2. uniqueness (username / email) is checked with one query per field and
+   chunk against the table (which by then holds the earlier chunks), and
+   within the chunk itself;
+3. passwords are hashed across a process pool of IMPORT["WORKERS"]
+   processes (hashing is CPU-bound and holds the GIL), started on first
+   use and shared by every later import of the process;
+4. the chunk is written with one bulk_create inside a transaction.
+
+Invalid rows don't stop the import; each one is reported with its line
+number and field errors. After every committed chunk the caller's
+`on_chunk` hook can persist a checkpoint (the command writes a small JSON
+file) so a later run resumes after the last committed line. A crash
+between a commit and the checkpoint write replays that one chunk: users
+come back as duplicates in the report, products would be inserted twice.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth import password_validation
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Product, User
+from .response_cache import bump_model_version
+from .search import INDEXES, get_search_backend
+from .serializers import ProductSerializer
+
+DEFAULTS = {
+    "CHUNK_SIZE": 1000,
+    "WORKERS": None,  # hashing processes; None = os.cpu_count(), 0/1 = hash in-process
+    "MAX_REPORTED_ERRORS": 1000,  # per API response; the command reports every row
+}
+
+INPUTS = ("csv", "ndjson")
+
+HASH_CHUNKSIZE = 16  # passwords per pool task: amortises the IPC round trip
+
+
+def import_setting(name):
+    return getattr(settings, "IMPORT", {}).get(name, DEFAULTS[name])
+
+
+# ─── Reading ───────────────────────────────────────────────────────────────────
+def guess_input(filename, default="csv"):
+    """
+    "users.ndjson.gz" → ("ndjson", True)
+    """
+    name = (filename or "").lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson", compressed
+    if name.endswith(".csv"):
+        return "csv", compressed
+    return default, compressed
+
+
+def read_records(binary, input_format, compressed=False):
+    """
+    Yields (line_number, record) from a binary file object. `record` is a
+    dict, or None when the line could not be parsed.
+    """
+    if compressed:
+        binary = gzip.GzipFile(fileobj=binary)
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    if input_format == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+# ─── Password hashing ──────────────────────────────────────────────────────────
+_pools = {}  # workers → ProcessPoolExecutor
+_pools_lock = threading.Lock()
+
+
+def hashing_pool(workers=None):
+    """
+    Process pool for make_password(), or None to hash in-process. Pools
+    are kept for the life of the process: starting one (a spawn plus
+    django.setup() per worker) costs far more than a request.
+    """
+    if workers is None:
+        workers = import_setting("WORKERS")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return None
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn, not fork: the caller may be a threaded server holding locks.
+            # Workers only need settings, so they run django.setup() and import
+            # nothing from this app (its models can't load before setup).
+            pool = _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=get_context("spawn"), initializer=django.setup
+            )
+        return pool
+
+
+def discard_pool(pool):
+    """
+    Forgets a broken pool so the next hashing_pool() call starts a new one.
+    """
+    with _pools_lock:
+        for workers, known in list(_pools.items()):
+            if known is pool:
+                del _pools[workers]
+    pool.shutdown(wait=False)
+
+
+def hash_passwords(passwords, pool=None):
+    """
+    make_password() for each password; blank ones become unusable passwords.
+    """
+    passwords = [password or None for password in passwords]
+    usable = [i for i, password in enumerate(passwords) if password]
+    hashed = [make_password(None) if password is None else None for password in passwords]
+    if pool is None:
+        results = map(make_password, (passwords[i] for i in usable))
+    else:
+        results = pool.map(make_password, [passwords[i] for i in usable], chunksize=HASH_CHUNKSIZE)
+    for i, value in zip(usable, results):
+        hashed[i] = value
+    return hashed
+
+
+# ─── Importers ─────────────────────────────────────────────────────────────────
+class UserImportSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField()
+    password = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default="")
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default="")
+    is_active = serializers.BooleanField(required=False, default=True)
+
+    def validate_password(self, value):
+        if value:
+            try:
+                password_validation.validate_password(value)
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError(list(exc.messages))
+        return value
+
+
+class BaseImporter:
+    model = None
+    serializer_class = None
+
+    def check_unique(self, rows):
+        """
+        Splits validated (line, data) rows into accepted rows and (line, errors).
+        """
+        return rows, []
+
+    def build(self, rows, pool):
+        return [self.model(**data) for _, data in rows]
+
+    def after_insert(self, objs):
+        pass
+
+
+class UserImporter(BaseImporter):
+    model = User
+    serializer_class = UserImportSerializer
+    unique_fields = ("username", "email")
+
+    def check_unique(self, rows):
+        taken = {}
+        for field in self.unique_fields:
+            values = {data[field] for _, data in rows}
+            # earlier chunks are committed by now, so the table covers them too
+            taken[field] = set(User.objects.filter(**{f"{field}__in": values}).values_list(field, flat=True))
+
+        accepted, rejected = [], []
+        for line, data in rows:
+            errors = {
+                field: [f"A user with that {field} already exists."]
+                for field in self.unique_fields if data[field] in taken[field]
+            }
+            if errors:
+                rejected.append((line, errors))
+                continue
+            for field in self.unique_fields:
+                taken[field].add(data[field])
+            accepted.append((line, data))
+        return accepted, rejected
+
+    def build(self, rows, pool):
+        hashed = hash_passwords([data.get("password") for _, data in rows], pool)
+        return [
+            User(
+                username=data["username"],
+                email=data["email"],
+                first_name=data["first_name"],
+                last_name=data["last_name"],
+                is_active=data["is_active"],
+                password=password,
+            )
+            for (_, data), password in zip(rows, hashed)
+        ]
+
+
+class ProductImporter(BaseImporter):
+    model = Product
+    serializer_class = ProductSerializer
+
+    def after_insert(self, objs):
+        # bulk_create() sends no signals: refresh the search index and the
+        # cached product list ourselves.
+        backend = get_search_backend()
+        if backend.maintains_index:
+            backend.index(INDEXES["product"], [obj for obj in objs if obj.pk is not None])
+        bump_model_version(Product)
+
+
+IMPORTERS = {
+    "users": UserImporter,
+    "products": ProductImporter,
+}
+
+
+# ─── Pipeline ──────────────────────────────────────────────────────────────────
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.last_line = 0
+
+
+def _chunks(records, size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_import(resource, records, *, start_after=0, chunk_size=None, workers=None, on_error=None, on_chunk=None):
+    """
+    Imports (line_number, record) pairs into `resource`. `on_error(line,
+    errors)` is called for every rejected row and `on_chunk(result)` after
+    every committed chunk. Lines up to `start_after` are skipped (resume).
+    """
+    importer = IMPORTERS[resource]()
+    chunk_size = chunk_size or import_setting("CHUNK_SIZE")
+    result = ImportResult()
+    result.last_line = start_after
+
+    def reject(line, errors):
+        result.failed += 1
+        if on_error is not None:
+            on_error(line, errors)
+
+    pool = hashing_pool(workers) if resource == "users" else None
+    try:
+        pending = ((line, record) for line, record in records if line > start_after)
+        for chunk in _chunks(pending, chunk_size):
+            valid = []
+            for line, record in chunk:
+                if record is None:
+                    reject(line, {"non_field_errors": ["Could not parse this line."]})
+                    continue
+                serializer = importer.serializer_class(data=record)
+                if serializer.is_valid():
+                    valid.append((line, serializer.validated_data))
+                else:
+                    reject(line, serializer.errors)
+
+            accepted, duplicates = importer.check_unique(valid)
+            for line, errors in duplicates:
+                reject(line, errors)
+            objs = importer.build(accepted, pool)
+            with transaction.atomic():
+                importer.model.objects.bulk_create(objs)
+                importer.after_insert(objs)
+
+            result.created += len(objs)
+            result.last_line = chunk[-1][0]
+            if on_chunk is not None:
+                on_chunk(result)
+    except BrokenProcessPool:
+        discard_pool(pool)
+        raise
+    return result
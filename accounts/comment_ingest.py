@@ -0,0 +1,141 @@
+# accounts/comment_ingest.py
+
+"""
+Batch comment ingestion.
+
+    POST /api/comments/batch/   {"comments": [{"page": 3, "content": "..."}, ...]}
+    → {"created": 2, "pending": 0, "errors": 1, "results": [{"index": 0, "status": "created", "id": 41}, ...]}
+
+Items are validated one by one, the pages checked with one query, and the
+caller's CREATE flag looked up in their compiled permission matrix (as
+HasPagePermission does), so a rejected item is reported without failing
+the others. The accepted ones are written with one bulk_create().
+
+bulk_create() sends no signals, so write_comments() does what the
+receivers would: page activity counters (page_activity.comments_added),
+the full-text index, and stream events after the commit, all inside the
+transaction of the insert.
+
+With GROUP_COMMIT["ENABLED"] (accounts/group_commit.py) batches and single
+creates from concurrent requests are handed to one writer thread and
+committed together. A request whose write is still queued after
+GROUP_COMMIT["TIMEOUT"] seconds is answered 202: the rows will still be
+written, so the client must not retry (its items are reported "pending",
+without ids).
+"""
+
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.db import transaction
+from rest_framework.exceptions import APIException
+
+from . import page_activity, realtime
+from .group_commit import GroupCommitter, group_commit_setting
+from .models import Comment, Page
+from .permission_cache import CREATE, get_permission_matrix
+from .search import INDEXES, get_search_backend
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueued(APIException):
+    """
+    A single create still queued after TIMEOUT: accepted, not yet saved.
+    """
+    status_code = 202
+    default_detail = "Accepted; the comment will be saved shortly. Do not retry."
+    default_code = "write_queued"
+
+
+def write_comments(batches):
+    """
+    Inserts every comment of `batches` (lists of unsaved Comments) in one
+    transaction, with the side effects of the post_save receivers.
+    """
+    comments = [comment for batch in batches for comment in batch]
+    for comment in comments:
+        # a failed combined write (see GroupCommitter._flush) may have
+        # assigned pks that were rolled back and reused since
+        comment.pk = None
+        comment._state.adding = True
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        page_activity.comments_added(comments)
+        backend = get_search_backend()
+        if backend.maintains_index:
+            backend.index(INDEXES['comment'], comments)
+        for comment in comments:
+            realtime.publish_comment(comment, realtime.CREATED)
+    return comments
+
+
+_committer = None
+
+
+def get_committer():
+    global _committer
+    if _committer is None:
+        _committer = GroupCommitter(write_comments)
+    return _committer
+
+
+def save_comments(comments):
+    """
+    Writes unsaved `comments` through the group committer when it is
+    enabled, directly otherwise. Returns False when they are still queued
+    after TIMEOUT (they get their pks once written), True once saved.
+    """
+    if not group_commit_setting("ENABLED"):
+        write_comments([comments])
+        return True
+    future = get_committer().submit(comments)
+    try:
+        future.result(timeout=group_commit_setting("TIMEOUT"))
+    except FutureTimeoutError:
+        future.add_done_callback(_log_failure)
+        return False
+    return True
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("Queued comment write failed", exc_info=future.exception())
+
+
+def ingest(user, items, item_serializer_class):
+    """
+    Creates the valid, permitted items as `user`'s comments. Returns one
+    result dict per item, in order.
+    """
+    results, valid = [], []
+    for index, item in enumerate(items):
+        serializer = item_serializer_class(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+            results.append(None)
+        else:
+            results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+
+    known = set(Page.objects.filter(pk__in={data['page'] for _, data in valid}).values_list('pk', flat=True))
+    matrix = None
+    if not user.is_superuser:
+        matrix = getattr(user, 'permission_matrix', None) or get_permission_matrix(user.pk)
+
+    accepted = []
+    for index, data in valid:
+        if data['page'] not in known:
+            results[index] = {'index': index, 'status': 'error', 'errors': {'page': ['Unknown page.']}}
+        elif matrix is not None and not matrix.allows(data['page'], CREATE):
+            results[index] = {'index': index, 'status': 'error', 'errors': {'page': ['Permission denied.']}}
+        else:
+            accepted.append((index, Comment(page_id=data['page'], user=user, content=data['content'])))
+
+    saved = not accepted or save_comments([comment for _, comment in accepted])
+    for index, comment in accepted:
+        results[index] = (
+            {'index': index, 'status': 'created', 'id': comment.pk} if saved
+            else {'index': index, 'status': 'pending'}
+        )
+    return results
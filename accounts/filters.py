@@ -0,0 +1,98 @@
+# accounts/filters.py
+
+"""
+Declarative query-string filtering for the list endpoints.
+
+A view declares the parameters it accepts:
+
+    query_filters = {
+        'price_min': QueryFilter('price', 'gte', parse_decimal),
+        'name_prefix': QueryFilter('name', 'istartswith'),
+    }
+    search_index = 'product'          # ?search= goes through accounts/search.py
+    ordering_fields = ['price', 'name', 'created_at', 'id']
+
+and lists DeclarativeFilterBackend / TextSearchFilter / OrderingFilter in
+`filter_backends`. Unparseable values answer 400 instead of being ignored.
+
+Keyset pagination (?limit= / ?cursor=) pages along the ?ordering= columns,
+with `id` as the tiebreaker (see accounts/pagination.py).
+"""
+
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .search import INDEXES, get_search_backend
+
+
+def parse_decimal(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError("Enter a number.")
+
+
+def parse_int(value):
+    return int(value)
+
+
+def parse_moment(value):
+    """
+    Accepts an ISO datetime or a plain date (midnight, current timezone).
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError("Enter an ISO 8601 date or datetime.")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class QueryFilter:
+    def __init__(self, field, lookup='exact', parse=str):
+        self.field = field
+        self.lookup = lookup
+        self.parse = parse
+
+
+class DeclarativeFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        errors = {}
+        for param, spec in getattr(view, 'query_filters', {}).items():
+            raw = request.query_params.get(param)
+            if raw in (None, ''):
+                continue
+            try:
+                value = spec.parse(raw)
+            except ValueError as exc:
+                errors[param] = [str(exc) or 'Invalid value.']
+                continue
+            queryset = queryset.filter(**{f'{spec.field}__{spec.lookup}': value})
+        if errors:
+            raise ValidationError(errors)
+        return queryset
+
+
+class TextSearchFilter(BaseFilterBackend):
+    """
+    ?search=<words> through the configured search backend.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        index_name = getattr(view, 'search_index', None)
+        if not term or index_name is None:
+            return queryset
+        return get_search_backend().filter(queryset, INDEXES[index_name], term)
+
+
+DEFAULT_FILTER_BACKENDS = [DeclarativeFilterBackend, TextSearchFilter, OrderingFilter]
@@ -0,0 +1,104 @@
+# accounts/group_commit.py
+
+"""
+Group commit: coalescing concurrent writes into one transaction.
+
+Request threads hand their rows to a GroupCommitter and wait on the
+returned Future. A single writer thread takes whatever is queued (waiting
+up to MAX_WAIT_MS for more once the first submission arrives, and
+stopping at MAX_BATCH rows) and writes it with one call of the committer's
+`write` function, i.e. one transaction and, on SQLite, one fsync for the
+lot instead of one per request. If the combined write fails, the
+submissions are retried one by one so a bad one only fails itself.
+
+Disabled by default (GROUP_COMMIT["ENABLED"]): the writes leave the
+request's own transaction and connection, which matters to code that
+wraps the request in a transaction. The coalescing only spans the threads
+of one process; several processes each run their own writer.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULTS = {
+    "ENABLED": False,
+    "MAX_BATCH": 500,  # rows per combined transaction
+    "MAX_WAIT_MS": 5,  # how long the writer waits for more submissions
+    "TIMEOUT": 30,  # seconds a request waits for its write
+}
+
+
+def group_commit_setting(name):
+    return getattr(settings, "GROUP_COMMIT", {}).get(name, DEFAULTS[name])
+
+
+class GroupCommitter:
+    """
+    `write(batches)` receives a list of submitted row lists and writes them
+    all in one transaction. After a failed combined write the same row
+    objects are passed again, so `write` must undo whatever a rolled-back
+    attempt left on them (write_comments() resets the pks).
+    """
+
+    def __init__(self, write, max_batch=None, max_wait_ms=None):
+        self.write = write
+        self.max_batch = max_batch or group_commit_setting("MAX_BATCH")
+        self.max_wait = (group_commit_setting("MAX_WAIT_MS") if max_wait_ms is None else max_wait_ms) / 1000
+        self.flushes = 0  # combined transactions run so far
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, rows):
+        """
+        Queues `rows`; the Future resolves to them once committed.
+        """
+        future = Future()
+        self._start()
+        self._queue.put((list(rows), future))
+        return future
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            self.write([rows for rows, _ in batch])
+        except Exception:
+            for rows, future in batch:
+                try:
+                    self.write([rows])
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(rows)
+        else:
+            for rows, future in batch:
+                future.set_result(rows)
+        finally:
+            self.flushes += 1
+            close_old_connections()  # this thread's connection ages like a request's
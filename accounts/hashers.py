@@ -0,0 +1,51 @@
+# accounts/hashers.py
+
+"""
+Django's password hashers with their cost taken from
+settings.PASSWORD_HASHER_COST (see backend/passwords.py). The algorithm
+names are Django's own, so these verify existing hashes, and must_update()
+compares against the configured cost: raising it re-hashes a user's
+password on their next login.
+"""
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def hasher_cost(name, default):
+    value = getattr(settings, "PASSWORD_HASHER_COST", {}).get(name)
+    return default if value is None else value
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return hasher_cost("PBKDF2_ITERATIONS", hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return hasher_cost("SCRYPT_WORK_FACTOR", hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return hasher_cost("SCRYPT_BLOCK_SIZE", hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return hasher_cost("SCRYPT_PARALLELISM", hashers.ScryptPasswordHasher.parallelism)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return hasher_cost("ARGON2_TIME_COST", hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return hasher_cost("ARGON2_MEMORY_COST", hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return hasher_cost("ARGON2_PARALLELISM", hashers.Argon2PasswordHasher.parallelism)
@@ -0,0 +1,189 @@
+# accounts/history_archive.py
+
+"""
+Cold storage for old CommentHistory rows.
+
+`python manage.py archive_comment_history --older-than 365` moves history
+rows older than the cutoff out of the hot table into append-only segment
+files under COMMENT_HISTORY_ARCHIVE["DIR"], one per month of `modified_at`
+(e.g. `2025-06.jsonl.gz`). Every run appends gzip members holding JSON
+lines sorted by comment; a concatenation of gzip members is itself a valid
+gzip file, so `zcat 2025-06.jsonl.gz` still reads a whole month.
+
+CommentHistoryArchive rows index the members by comment id, so reading the
+history of one comment seeks to its members and decompresses only those
+(each is cut at roughly MEMBER_BYTES of uncompressed JSON).
+
+A batch is appended and fsynced before its index rows are committed and its
+hot rows deleted, so a crash mid-run leaves at worst unreferenced bytes in
+a segment, never an index entry without data. Run one archiver at a time.
+"""
+
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import CommentHistory, CommentHistoryArchive, User
+
+DEFAULTS = {
+    "DIR": None,  # defaults to BASE_DIR / "archive" / "comment_history"
+    "RETENTION_DAYS": 365,
+    "BATCH_SIZE": 5000,
+    "MEMBER_BYTES": 64 * 1024,
+}
+
+FIELDS = ("id", "comment_id", "previous_content", "modified_by_id", "modified_at")
+
+
+def archive_setting(name):
+    return getattr(settings, "COMMENT_HISTORY_ARCHIVE", {}).get(name, DEFAULTS[name])
+
+
+def archive_dir():
+    directory = archive_setting("DIR")
+    if directory is None:
+        directory = Path(settings.BASE_DIR) / "archive" / "comment_history"
+    return Path(directory)
+
+
+def segment_name(moment):
+    return f"{moment.astimezone(dt_timezone.utc):%Y-%m}.jsonl.gz"
+
+
+# ─── Writing ───────────────────────────────────────────────────────────────────
+def _encode(row):
+    row = dict(row, modified_at=row["modified_at"].isoformat())
+    return (json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _members(rows, member_bytes):
+    """
+    Splits rows (sorted by comment) into members of about `member_bytes`,
+    never splitting one comment's rows of this batch across two members.
+    """
+    member, size, last_comment = [], 0, None
+    for row in rows:
+        line = _encode(row)
+        if member and size >= member_bytes and row["comment_id"] != last_comment:
+            yield member
+            member, size = [], 0
+        member.append((row, line))
+        size += len(line)
+        last_comment = row["comment_id"]
+    if member:
+        yield member
+
+
+def _append(segment, payloads):
+    """
+    Appends gzip members to `segment` and returns their (offset, length).
+    """
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    spans = []
+    with open(directory / segment, "ab") as fh:
+        offset = fh.seek(0, os.SEEK_END)
+        for payload in payloads:
+            fh.write(payload)
+            spans.append((offset, len(payload)))
+            offset += len(payload)
+        fh.flush()
+        os.fsync(fh.fileno())
+    return spans
+
+
+def _archive_batch(rows, member_bytes):
+    by_segment = defaultdict(list)
+    for row in rows:
+        by_segment[segment_name(row["modified_at"])].append(row)
+
+    entries = []
+    for segment, segment_rows in sorted(by_segment.items()):
+        segment_rows.sort(key=lambda row: (row["comment_id"], row["modified_at"], row["id"]))
+        members = list(_members(segment_rows, member_bytes))
+        spans = _append(segment, [gzip.compress(b"".join(line for _, line in member)) for member in members])
+        for member, (offset, length) in zip(members, spans):
+            per_comment = defaultdict(list)
+            for row, _ in member:
+                per_comment[row["comment_id"]].append(row)
+            for comment_id, comment_rows in per_comment.items():
+                entries.append(CommentHistoryArchive(
+                    comment_id=comment_id,
+                    segment=segment,
+                    offset=offset,
+                    length=length,
+                    rows=len(comment_rows),
+                    oldest=comment_rows[0]["modified_at"],
+                    newest=comment_rows[-1]["modified_at"],
+                ))
+
+    with transaction.atomic():
+        CommentHistoryArchive.objects.bulk_create(entries)
+        CommentHistory.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+
+
+def archive_history(cutoff, batch_size=None, member_bytes=None):
+    """
+    Moves every CommentHistory row modified before `cutoff` into the
+    archive, `batch_size` rows per transaction. Returns the number moved.
+    """
+    batch_size = batch_size or archive_setting("BATCH_SIZE")
+    member_bytes = member_bytes or archive_setting("MEMBER_BYTES")
+    moved = 0
+    while True:
+        rows = list(
+            CommentHistory.objects.filter(modified_at__lt=cutoff)
+            .order_by("modified_at", "id")
+            .values(*FIELDS)[:batch_size]
+        )
+        if not rows:
+            return moved
+        _archive_batch(rows, member_bytes)
+        moved += len(rows)
+
+
+# ─── Reading ───────────────────────────────────────────────────────────────────
+def _read_member(segment, offset, length):
+    with open(archive_dir() / segment, "rb") as fh:
+        fh.seek(offset)
+        return gzip.decompress(fh.read(length))
+
+
+def read_archived(comment_id):
+    """
+    Archived history of `comment_id` as unsaved CommentHistory instances
+    (modified_by not loaded), oldest first.
+    """
+    entries = CommentHistoryArchive.objects.filter(comment_id=comment_id).order_by("newest", "id")
+    histories = []
+    for entry in entries:
+        for line in _read_member(entry.segment, entry.offset, entry.length).splitlines():
+            row = json.loads(line)
+            if row["comment_id"] != comment_id:
+                continue
+            row["modified_at"] = parse_datetime(row["modified_at"])
+            histories.append(CommentHistory(**row))
+    return histories
+
+
+def load_comment_history(comment_id):
+    """
+    Full history of `comment_id` — hot rows and archived ones — newest first,
+    as (CommentHistory, archived) pairs with `modified_by` loaded.
+    """
+    hot = [(history, False) for history in
+           CommentHistory.objects.filter(comment_id=comment_id).select_related("modified_by")]
+    cold = read_archived(comment_id)
+    users = User.objects.in_bulk({history.modified_by_id for history in cold} - {None})
+    for history in cold:
+        history.modified_by = users.get(history.modified_by_id)
+    merged = hot + [(history, True) for history in cold]
+    merged.sort(key=lambda pair: (pair[0].modified_at, pair[0].id), reverse=True)
+    return merged
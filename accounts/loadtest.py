@@ -0,0 +1,266 @@
+# accounts/loadtest.py
+
+"""
+Scripted load-test scenarios for `python manage.py loadtest`.
+
+Each Scenario issues one API request per iteration as a seeded bench user
+(see accounts/bench_data.py). Requests go either through Django's test
+client in this process — the full middleware/view stack without a network,
+and with the SQL statements of every request counted — or over HTTP to a
+running server (`--base-url`), where queries per request are not visible.
+
+A run's summary (p50/p95/p99 latency, req/s, errors, queries/request per
+scenario) is saved as JSON named after the current git commit, so two runs
+can be compared with `--compare <commit or file>`.
+"""
+
+import json
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from .bench_data import BENCH_PASSWORD, USER_PREFIX
+from .benchmarking import percentile
+from .models import Permission, User
+
+
+# ─── Clients ───────────────────────────────────────────────────────────────────
+class InProcessClient:
+    """
+    Django test client with the same call() interface as benchmarking.HttpClient.
+    """
+
+    def __init__(self):
+        # a host ALLOWED_HOSTS accepts (the test client's "testserver" isn't one)
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+        self.client = Client(SERVER_NAME=host)
+
+    def call(self, method, path, body=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        handler = getattr(self.client, method.lower())
+        if body is None:
+            response = handler(path, headers=headers)
+        else:
+            response = handler(path, data=json.dumps(body), content_type="application/json", headers=headers)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, content
+
+
+# ─── Scenarios ─────────────────────────────────────────────────────────────────
+class Scenario:
+    """
+    `path` and `body` are values or callables of (state, iteration); `state`
+    is the worker's copy of the run context. `prepare(state, client)` runs
+    once per worker, `update(state, content)` after every success.
+    """
+
+    def __init__(self, name, method, path, body=None, auth=True, expect=(200,), prepare=None, update=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.auth = auth
+        self.expect = expect
+        self.prepare = prepare
+        self.update = update
+
+    def call(self, client, state, i):
+        path = self.path(state, i) if callable(self.path) else self.path
+        body = self.body(state, i) if callable(self.body) else self.body
+        status, content = client.call(self.method, path, body, state["access"] if self.auth else None)
+        ok = status in self.expect
+        if ok and self.update is not None:
+            self.update(state, content)
+        return ok
+
+
+def obtain_pair(client, username, password=BENCH_PASSWORD):
+    status, content = client.call("POST", "/api/token/", {"username": username, "password": password})
+    if status != 200:
+        raise RuntimeError(f"Could not log in as {username}: HTTP {status}")
+    return json.loads(content)
+
+
+def _own_refresh_token(state, client):
+    # refresh tokens rotate and are blacklisted after use: one chain per worker
+    state["refresh"] = obtain_pair(client, state["username"])["refresh"]
+
+
+def _next_refresh_token(state, content):
+    state["refresh"] = json.loads(content).get("refresh", state["refresh"])
+
+
+SCENARIOS = [
+    Scenario("token_obtain", "POST", "/api/token/",
+             body=lambda s, i: {"username": s["username"], "password": BENCH_PASSWORD}, auth=False),
+    Scenario("token_refresh", "POST", "/api/token/refresh/",
+             body=lambda s, i: {"refresh": s["refresh"]}, auth=False,
+             prepare=_own_refresh_token, update=_next_refresh_token),
+    Scenario("comment_list", "GET", lambda s, i: f"/api/comments/?page_id={s['page_id']}&limit=50"),
+    Scenario("comment_create", "POST", "/api/comments/",
+             body=lambda s, i: {"page": s["page_id"], "content": f"load test comment {i}"}, expect=(201,)),
+    Scenario("comment_edit", "PATCH", lambda s, i: f"/api/comments/{s['comment_id']}/?page_id={s['page_id']}",
+             body=lambda s, i: {"content": f"load test edit {i}"}),
+    Scenario("permission_check", "GET", lambda s, i: f"/api/async/comments/?page_id={s['page_id']}&limit=20"),
+    Scenario("product_list", "GET", "/api/products/?limit=50"),
+    Scenario("password_reset", "POST", "/api/password-reset/request/",
+             body=lambda s, i: {"email": s["emails"][i % len(s["emails"])]}, auth=False),
+]
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+
+
+def prepare_context(client):
+    """
+    Picks a bench user who may view and comment on a page, logs in, and
+    creates the comment the edit scenario works on.
+    """
+    grant = (
+        Permission.objects.filter(user__username__startswith=USER_PREFIX, can_view=True, can_create=True)
+        .values_list("user__username", "page_id").order_by("id").first()
+    )
+    if grant is None:
+        raise RuntimeError("No benchmark data found; run `manage.py seed_benchmark_data` first.")
+    username, page_id = grant
+    pair = obtain_pair(client, username)
+    status, content = client.call(
+        "POST", "/api/comments/", {"page": page_id, "content": "load test seed comment"}, pair["access"]
+    )
+    if status != 201:
+        raise RuntimeError(f"Could not create the comment to edit: HTTP {status}")
+    emails = list(
+        User.objects.filter(username__startswith=USER_PREFIX).order_by("id").values_list("email", flat=True)[:1000]
+    )
+    return {
+        "username": username,
+        "page_id": page_id,
+        "access": pair["access"],
+        "refresh": pair["refresh"],
+        "comment_id": json.loads(content)["id"],
+        "emails": emails,
+    }
+
+
+# ─── Runner ────────────────────────────────────────────────────────────────────
+def run_scenario(scenario, context, make_client, iterations, concurrency=1, count_queries=True):
+    """
+    Runs `iterations` calls of `scenario` spread over `concurrency` workers.
+    """
+    latencies, lock = [], threading.Lock()
+    totals = {"errors": 0, "queries": 0}
+
+    def worker(indexes):
+        client = make_client()
+        state = dict(context)
+        if scenario.prepare is not None:
+            scenario.prepare(state, client)
+        queries = [0]
+
+        def count(execute, sql, params, many, ctx):
+            queries[0] += 1
+            return execute(sql, params, many, ctx)
+
+        for i in indexes:
+            started = time.perf_counter()
+            if count_queries:
+                with connection.execute_wrapper(count):
+                    ok = scenario.call(client, state, i)
+            else:
+                ok = scenario.call(client, state, i)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    totals["errors"] += 1
+        with lock:
+            totals["queries"] += queries[0]
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker(range(iterations))
+    else:
+        def threaded(indexes):
+            try:
+                worker(indexes)
+            finally:
+                connection.close()  # this thread's connection
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(threaded, [range(w, iterations, concurrency) for w in range(concurrency)]))
+    seconds = time.perf_counter() - started
+
+    return {
+        "requests": iterations,
+        "errors": totals["errors"],
+        "rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(totals["queries"] / iterations, 2) if count_queries and iterations else None,
+    }
+
+
+# ─── Results ───────────────────────────────────────────────────────────────────
+def default_results_dir():
+    return Path(settings.BASE_DIR) / "benchmarks" / "results"
+
+
+def current_commit():
+    """
+    Short HEAD sha, suffixed with "+dirty" for uncommitted changes.
+    """
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}+dirty" if dirty else sha
+
+
+def save_results(directory, payload):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{payload['commit']}-{timezone.now():%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True))
+    return path
+
+
+def load_results(directory, ref):
+    """
+    `ref` is a results file, or a commit prefix: the newest run of it.
+    """
+    path = Path(ref)
+    if not path.is_file():
+        matches = sorted(Path(directory).glob(f"{ref}*.json"))
+        if not matches:
+            raise FileNotFoundError(f"No saved results for {ref!r} in {directory}.")
+        path = matches[-1]
+    return json.loads(path.read_text())
+
+
+def compare(current, baseline):
+    """
+    Yields (scenario, metric, before, after, change %) for the metrics both
+    runs have.
+    """
+    for name, after in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            if before.get(metric) is None or after.get(metric) is None:
+                continue
+            change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            yield name, metric, before[metric], after[metric], change
@@ -0,0 +1,83 @@
+# accounts/login_throttle.py
+
+"""
+Failed-login throttling for POST /api/token/.
+
+Failed attempts are counted in the cache per username and per client IP
+(fixed windows of LOGIN_THROTTLE["WINDOW"] seconds). Once either count
+reaches its limit, further attempts are refused with 429 *before* the
+password is hashed, so guessing costs the attacker requests but costs us
+no PBKDF2/scrypt rounds. A successful login clears the username's count;
+the IP count only expires, so one address can't walk through accounts.
+
+The client IP comes from DRF's throttle identity (REMOTE_ADDR, or
+X-Forwarded-For with REST_FRAMEWORK["NUM_PROXIES"] behind a proxy). With
+more than one worker process the cache must be shared (Redis/Memcached).
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "default",
+    "WINDOW": 900,  # seconds
+    "USER_FAILURES": 10,  # failed attempts per username and window
+    "IP_FAILURES": 50,  # failed attempts per client IP and window
+}
+
+KEY_PREFIX = "accounts:login-fail"
+
+
+def throttle_setting(name):
+    return getattr(settings, "LOGIN_THROTTLE", {}).get(name, DEFAULTS[name])
+
+
+def _keys(request, username):
+    digest = hashlib.sha256((username or "").strip().lower().encode("utf-8")).hexdigest()[:32]
+    return {
+        "user": f"{KEY_PREFIX}:user:{digest}",
+        "ip": f"{KEY_PREFIX}:ip:{BaseThrottle().get_ident(request)}",
+    }
+
+
+def check(request, username):
+    """
+    Raises Throttled when the username or the client IP is over its limit.
+    """
+    if not throttle_setting("ENABLED"):
+        return
+    cache = caches[throttle_setting("CACHE_ALIAS")]
+    keys = _keys(request, username)
+    counts = cache.get_many(keys.values())
+    limits = {"user": throttle_setting("USER_FAILURES"), "ip": throttle_setting("IP_FAILURES")}
+    for kind, key in keys.items():
+        if counts.get(key, 0) >= limits[kind]:
+            raise Throttled(
+                wait=throttle_setting("WINDOW"),
+                detail="Too many failed login attempts. Try again later.",
+            )
+
+
+def record_failure(request, username):
+    if not throttle_setting("ENABLED"):
+        return
+    cache = caches[throttle_setting("CACHE_ALIAS")]
+    window = throttle_setting("WINDOW")
+    for key in _keys(request, username).values():
+        if cache.add(key, 1, timeout=window):
+            continue
+        try:
+            cache.incr(key)
+        except ValueError:
+            # expired between add() and incr(): start a new window
+            cache.set(key, 1, timeout=window)
+
+
+def record_success(request, username):
+    if throttle_setting("ENABLED"):
+        caches[throttle_setting("CACHE_ALIAS")].delete(_keys(request, username)["user"])
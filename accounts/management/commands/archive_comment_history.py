@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.history_archive import archive_dir, archive_history, archive_setting
+from accounts.models import CommentHistory
+
+
+class Command(BaseCommand):
+    help = "Moves CommentHistory rows older than N days into compressed archive segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=None, metavar="DAYS",
+            help="Archive rows modified more than DAYS ago (default: COMMENT_HISTORY_ARCHIVE['RETENTION_DAYS']).",
+        )
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would move.")
+
+    def handle(self, *args, **options):
+        days = options["older_than"]
+        if days is None:
+            days = archive_setting("RETENTION_DAYS")
+        if days < 0:
+            raise CommandError("--older-than must not be negative.")
+        cutoff = timezone.now() - timedelta(days=days)
+
+        if options["dry_run"]:
+            count = CommentHistory.objects.filter(modified_at__lt=cutoff).count()
+            self.stdout.write(f"{count} history row(s) older than {days} day(s) would be archived.")
+            return
+        moved = archive_history(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} history row(s) into {archive_dir()}."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarking import obtain_token, percentile, run_http_load
+
+# (label, sync path, async path)
+ENDPOINTS = [
+    ("pages", "/api/pages/", "/api/async/pages/"),
+    ("products", "/api/products/", "/api/async/products/"),
+    ("comments", "/api/comments/?page_id={page_id}", "/api/async/comments/?page_id={page_id}"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares req/s of the sync DRF endpoints and their /api/async/ "
+        "counterparts on a running server, e.g. one started with "
+        "`uvicorn backend.asgi:application`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--page-id", type=int, default=1)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        base = options["base_url"].rstrip("/")
+        try:
+            token = obtain_token(base, options["username"], options["password"])
+        except OSError as exc:
+            raise CommandError(f"Could not obtain a token from {base}: {exc}")
+        headers = {"Authorization": f"Bearer {token}"}
+
+        self.stdout.write(f"{'endpoint':<10} {'stack':<6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for label, sync_path, async_path in ENDPOINTS:
+            for stack, path in (("sync", sync_path), ("async", async_path)):
+                result = run_http_load(
+                    base + path.format(page_id=options["page_id"]),
+                    headers=headers,
+                    concurrency=options["concurrency"],
+                    total=options["requests"],
+                )
+                self.stdout.write(
+                    f"{label:<10} {stack:<6} {result['rps']:>9.1f} "
+                    f"{percentile(result['latencies'], 50) * 1000:>8.1f} "
+                    f"{percentile(result['latencies'], 99) * 1000:>8.1f} "
+                    f"{result['errors']:>7}"
+                )
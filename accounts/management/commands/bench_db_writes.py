@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from accounts.benchmarking import percentile
+from accounts.models import Comment, Page, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures comment write throughput of the active database profile "
+        "(DB_PROFILE, see backend/database.py) with concurrent writer threads. "
+        "The rows it creates are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8, help="Concurrent writer threads.")
+        parser.add_argument("--writes", type=int, default=2000, help="Total comments to create.")
+        parser.add_argument("--edit-ratio", type=float, default=0.25,
+                            help="Share of writes that edit an earlier comment (records history).")
+
+    def handle(self, *args, **options):
+        page = Page.objects.create(name=f"bench-db-writes-{int(time.time())}")
+        user = User.objects.create_user(username=page.name, email=f"{page.name}@example.invalid")
+        try:
+            self._describe()
+            self._run(page, user, options)
+        finally:
+            page.delete()
+            user.delete()
+
+    def _describe(self):
+        settings = connection.settings_dict
+        line = f"engine={settings['ENGINE'].rsplit('.', 1)[-1]} conn_max_age={settings.get('CONN_MAX_AGE')}"
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size"):
+                    cursor.execute(f"PRAGMA {pragma}")
+                    line += f" {pragma}={cursor.fetchone()[0]}"
+        elif "pool" in settings.get("OPTIONS", {}):
+            line += f" pool={settings['OPTIONS']['pool']}"
+        self.stdout.write(line)
+
+    def _run(self, page, user, options):
+        latencies, errors = [], 0
+        lock = threading.Lock()
+        edit_every = int(1 / options["edit_ratio"]) if options["edit_ratio"] > 0 else 0
+        local = threading.local()
+
+        def write(i):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                last = getattr(local, "comment", None)
+                if edit_every and last is not None and i % edit_every == 0:
+                    last.content = f"edited #{i}"
+                    last.save()
+                else:
+                    local.comment = Comment.objects.create(page=page, user=user, content=f"bench write #{i}")
+                ok = True
+            except OperationalError:  # "database is locked" once the busy timeout runs out
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+        def worker(indexes):
+            try:
+                for i in indexes:
+                    write(i)
+            finally:
+                connection.close()  # per-thread connection
+
+        writers = max(1, options["writers"])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            list(pool.map(worker, [range(w, options["writes"], writers) for w in range(writers)]))
+        seconds = time.perf_counter() - started
+
+        self.stdout.write(
+            f"writers={writers} writes={options['writes']} writes/s={len(latencies) / seconds:.1f} "
+            f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms "
+            f"errors={errors}"
+        )
@@ -0,0 +1,72 @@
+import resource
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.export import EXPORTS, OUTPUTS, stream_export
+from accounts.models import Product
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures export throughput (rows/s, MB/s) and peak memory for every "
+        "output/compression combination, in-process. Use --seed to grow the "
+        "products table first (e.g. --seed 1000000); the seeded rows are "
+        "rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("resources", nargs="*", help=f"Exports to measure: {', '.join(sorted(EXPORTS))} (default: products).")
+        parser.add_argument("--seed", type=int, default=0, help="Insert this many synthetic products before measuring.")
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        resources = options["resources"] or ["products"]
+        unknown = sorted(set(resources) - set(EXPORTS))
+        if unknown:
+            raise CommandError(f"Unknown export(s): {', '.join(unknown)}. Choose from: {', '.join(sorted(EXPORTS))}.")
+        if options["seed"] < 0:
+            raise CommandError("--seed must not be negative.")
+
+        # One transaction, rolled back: the synthetic rows never reach other
+        # connections, the response cache or the search index.
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self._seed_products(options["seed"])
+                self._measure(resources, options["chunk_size"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _measure(self, resources, chunk_size):
+        self.stdout.write(f"{'export':<12} {'output':<10} {'rows':>10} {'rows/s':>10} {'MB/s':>8} {'MB':>8} {'peak RSS MB':>12}")
+        for name in resources:
+            rows = EXPORTS[name].model._base_manager.count()
+            for output in OUTPUTS:
+                for compress in (False, True):
+                    size = 0
+                    started = time.perf_counter()
+                    for chunk in stream_export(name, output, compress, chunk_size=chunk_size):
+                        size += len(chunk)
+                    seconds = time.perf_counter() - started
+                    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                    label = output + ("+gzip" if compress else "")
+                    self.stdout.write(
+                        f"{name:<12} {label:<10} {rows:>10} {rows / seconds:>10.0f} "
+                        f"{size / seconds / 1e6:>8.1f} {size / 1e6:>8.1f} {peak:>12.1f}"
+                    )
+
+    def _seed_products(self, count, batch_size=5000):
+        for start in range(0, count, batch_size):
+            Product.objects.bulk_create([
+                Product(name=f"bench-export-{i}", description="synthetic row for bench_export", price=Decimal(i % 1000))
+                for i in range(start, min(start + batch_size, count))
+            ])
+        self.stdout.write(f"Inserted {count} product(s) (rolled back when done).")
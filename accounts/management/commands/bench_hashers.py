@@ -0,0 +1,90 @@
+import math
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from accounts.benchmarking import percentile
+from accounts.loadtest import InProcessClient, obtain_pair
+from accounts.models import User
+from backend.passwords import HASHERS, LIBRARIES, library_available
+
+PASSWORD = "bench-hashers-Pa55word!"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures password verification cost per hasher profile (see backend/passwords.py) "
+        "and end-to-end logins/s per core of POST /api/token/ with the active profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", nargs="*", choices=sorted(HASHERS), help="Profiles to time (default: all).")
+        parser.add_argument("--rounds", type=int, default=10, help="Verifications timed per profile.")
+        parser.add_argument("--logins", type=int, default=20, help="Token logins timed (0 to skip).")
+        parser.add_argument("--target-ms", type=float, help="Suggest the cost that makes one verify take this long.")
+
+    def handle(self, *args, **options):
+        if options["rounds"] < 1:
+            raise CommandError("--rounds must be at least 1.")
+        self.stdout.write(f"{'profile':<8} {'verify p50 ms':>14} {'verifies/s/core':>16}  cost")
+        for profile in options["profiles"] or HASHERS:
+            if not library_available(profile):
+                self.stdout.write(f"{profile:<8} skipped: needs the {LIBRARIES[profile]!r} package")
+                continue
+            hasher = import_string(HASHERS[profile])()
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            timings = []
+            for _ in range(options["rounds"]):
+                started = time.perf_counter()
+                hasher.verify(PASSWORD, encoded)
+                timings.append(time.perf_counter() - started)
+            p50 = percentile(timings, 50)
+            line = f"{profile:<8} {p50 * 1000:>14.1f} {1 / p50:>16.1f}  {self._cost(hasher)}"
+            if options["target_ms"]:
+                line += f"  → {self._suggest(hasher, options['target_ms'] / 1000 / p50)}"
+            self.stdout.write(line)
+
+        if options["logins"]:
+            self._logins(options["logins"])
+
+    @staticmethod
+    def _cost(hasher):
+        if hasattr(hasher, "iterations"):
+            return f"PBKDF2_ITERATIONS={hasher.iterations}"
+        if hasattr(hasher, "work_factor"):
+            return f"SCRYPT_WORK_FACTOR={hasher.work_factor}"
+        if hasattr(hasher, "time_cost"):
+            return f"ARGON2_TIME_COST={hasher.time_cost} ARGON2_MEMORY_COST={hasher.memory_cost}"
+        return f"rounds={getattr(hasher, 'rounds', '?')}"
+
+    @staticmethod
+    def _suggest(hasher, scale):
+        # verify time grows linearly with each of these costs
+        if hasattr(hasher, "iterations"):
+            return f"PBKDF2_ITERATIONS={max(10_000, round(hasher.iterations * scale, -4)):.0f}"
+        if hasattr(hasher, "work_factor"):
+            return f"SCRYPT_WORK_FACTOR={2 ** max(10, round(math.log2(hasher.work_factor * scale)))}"
+        if hasattr(hasher, "time_cost"):
+            return f"ARGON2_TIME_COST={max(1, round(hasher.time_cost * scale))}"
+        return "no cost knob"
+
+    def _logins(self, count):
+        username = f"bench-hashers-{int(time.time())}"
+        user = User.objects.create_user(username=username, email=f"{username}@example.invalid", password=PASSWORD)
+        try:
+            client = InProcessClient()
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                obtain_pair(client, username, PASSWORD)
+                timings.append(time.perf_counter() - started)
+        finally:
+            user.delete()
+        p50 = percentile(timings, 50)
+        self.stdout.write(
+            f"\nPOST /api/token/ with {get_hasher().algorithm}: {count} logins, "
+            f"p50 {p50 * 1000:.1f} ms, p95 {percentile(timings, 95) * 1000:.1f} ms, "
+            f"{1 / p50:.1f} logins/s per core"
+        )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.benchmarking import percentile
+from accounts.models import Page, PageGroup, Permission, Role, RoleGrant, User, UserRole
+from accounts.permission_cache import VIEW, PermissionMatrixCache, compile_matrix
+from accounts.roles import compact
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the size of the permission tables and the latency of resolving a user's "
+        "permissions (cold compile and cached check). With --compare, also after "
+        "compact_permissions, inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200, help="Users sampled for the latency figures.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--compare", action="store_true",
+                            help="Measure again after compacting (nothing is kept).")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("--users must be at least 1.")
+        user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+        if not user_ids:
+            raise CommandError("No users; seed some first (seed_benchmark_data).")
+        rng = random.Random(options["seed"])
+        sample = rng.sample(user_ids, min(options["users"], len(user_ids)))
+        page_ids = list(Page.objects.values_list("pk", flat=True)) or [0]
+        checks = [(user_id, rng.choice(page_ids)) for user_id in sample]
+
+        self._report("current", checks)
+        if options["compare"]:
+            try:
+                with transaction.atomic():
+                    stats = compact()
+                    self.stdout.write(f"\ncompacted: {stats}")
+                    self._report("compacted", checks)
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _report(self, label, checks):
+        self.stdout.write(
+            f"[{label}] rows: permission={Permission.objects.count()} user_role={UserRole.objects.count()} "
+            f"role={Role.objects.count()} role_grant={RoleGrant.objects.count()} "
+            f"page_group={PageGroup.objects.count()} page_group_pages={PageGroup.pages.through.objects.count()}"
+        )
+        cold = []
+        for user_id, _ in checks:
+            started = time.perf_counter()
+            compile_matrix(user_id)
+            cold.append(time.perf_counter() - started)
+        cache = PermissionMatrixCache(maxsize=len(checks))
+        for user_id, _ in checks:
+            cache.get(user_id)
+        warm = []
+        for user_id, page_id in checks:
+            started = time.perf_counter()
+            cache.get(user_id).allows(page_id, VIEW)
+            warm.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"[{label}] compile p50 {percentile(cold, 50) * 1000:.2f} ms, p95 {percentile(cold, 95) * 1000:.2f} ms; "
+            f"cached check p50 {percentile(warm, 50) * 1e6:.1f} µs, p95 {percentile(warm, 95) * 1e6:.1f} µs"
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.roles import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves Permission rows shared by several users into roles over page groups, "
+        "and drops rows their roles already grant. Effective permissions do not change "
+        "(see accounts/roles.py). Run it with writes paused."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-users", type=int, default=2,
+                            help="Create a role for a set of rows only if this many users share it.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+
+    def handle(self, *args, **options):
+        if options["min_users"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--min-users and --batch-size must be at least 1.")
+        stats = compact(options["min_users"], batch_size=options["batch_size"], dry_run=options["dry_run"])
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['users']} user(s) onto {stats['roles']} role(s) "
+            f"({stats['page_groups']} new page group(s)): {stats['lifted']} Permission row(s) lifted, "
+            f"{stats['redundant']} redundant, {stats['kept']} kept."
+        ))
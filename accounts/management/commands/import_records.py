@@ -0,0 +1,94 @@
+import json
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.bulk_import import IMPORTERS, INPUTS, guess_input, read_records, run_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-imports users or products from a CSV / NDJSON file (optionally .gz). "
+        "Rejected rows go to --report; --checkpoint makes a re-run resume after "
+        "the last committed chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource", help=f"One of: {', '.join(sorted(IMPORTERS))}.")
+        parser.add_argument("path")
+        parser.add_argument("--input", choices=INPUTS, default=None, help="Default: guessed from the file name.")
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=None, help="Password-hashing processes.")
+        parser.add_argument("--report", default=None, help="Write rejected rows here as NDJSON.")
+        parser.add_argument("--checkpoint", default=None, help="Progress file to resume from / update.")
+
+    def handle(self, *args, **options):
+        resource = options["resource"]
+        if resource not in IMPORTERS:
+            raise CommandError(f"Unknown resource '{resource}'. Choose from: {', '.join(sorted(IMPORTERS))}.")
+        path = Path(options["path"]).resolve()
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist.")
+        input_format, compressed = guess_input(path.name)
+        input_format = options["input"] or input_format
+
+        source = {"resource": resource, "source": str(path), "size": path.stat().st_size}
+        progress = self._load_checkpoint(options["checkpoint"], source)
+        start_after = progress.get("last_line", 0)
+        if start_after:
+            self.stdout.write(f"Resuming after line {start_after}.")
+
+        report = open(options["report"], "a" if start_after else "w") if options["report"] else None
+
+        def on_error(line, errors):
+            if report is not None:
+                report.write(json.dumps({"line": line, "errors": errors}) + "\n")
+
+        def on_chunk(result):
+            if report is not None:
+                report.flush()
+            self._save_checkpoint(options["checkpoint"], {
+                **source,
+                "last_line": result.last_line,
+                "created": progress.get("created", 0) + result.created,
+                "failed": progress.get("failed", 0) + result.failed,
+            })
+            self.stdout.write(f"  … line {result.last_line}: {result.created} created, {result.failed} rejected")
+
+        try:
+            with open(path, "rb") as fh:
+                result = run_import(
+                    resource,
+                    read_records(fh, input_format, compressed),
+                    start_after=start_after,
+                    chunk_size=options["chunk_size"],
+                    workers=options["workers"],
+                    on_error=on_error,
+                    on_chunk=on_chunk,
+                )
+        finally:
+            if report is not None:
+                report.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} {resource}; {result.failed} row(s) rejected."
+        ))
+
+    def _load_checkpoint(self, checkpoint, source):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return {}
+        with open(checkpoint) as fh:
+            progress = json.load(fh)
+        if any(progress.get(key) != value for key, value in source.items()):
+            raise CommandError(f"{checkpoint} belongs to a different import; delete it to start over.")
+        return progress
+
+    def _save_checkpoint(self, checkpoint, progress):
+        if not checkpoint:
+            return
+        tmp = f"{checkpoint}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(progress, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, checkpoint)
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.benchmarking import HttpClient
+from accounts.loadtest import (
+    SCENARIOS, SCENARIOS_BY_NAME, InProcessClient, compare, current_commit,
+    default_results_dir, load_results, prepare_context, run_scenario, save_results,
+)
+from accounts.models import Comment, Permission, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the scripted API scenarios against seeded benchmark data "
+        "(see seed_benchmark_data) and reports p50/p95/p99, req/s and "
+        "queries per request. Results are saved per commit for --compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", default=",".join(s.name for s in SCENARIOS),
+                            help="Comma-separated scenario names (default: all).")
+        parser.add_argument("--iterations", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--base-url", default=None,
+                            help="Drive a running server over HTTP instead of the in-process stack.")
+        parser.add_argument("--results-dir", default=None)
+        parser.add_argument("--no-save", action="store_true")
+        parser.add_argument("--compare", default=None, metavar="REF",
+                            help="Saved results (file or commit prefix) to compare this run against.")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = set(names) - set(SCENARIOS_BY_NAME)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        results_dir = options["results_dir"] or default_results_dir()
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = load_results(results_dir, options["compare"])
+            except FileNotFoundError as exc:
+                raise CommandError(str(exc))
+
+        base_url = options["base_url"]
+        make_client = (lambda: HttpClient(base_url)) if base_url else InProcessClient
+        try:
+            context = prepare_context(make_client())
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            f"{'scenario':<18} {'req':>6} {'err':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}"
+        )
+        summary = {}
+        for name in names:
+            result = run_scenario(
+                SCENARIOS_BY_NAME[name], context, make_client,
+                iterations=options["iterations"],
+                concurrency=options["concurrency"],
+                count_queries=base_url is None,
+            )
+            summary[name] = result
+            queries = "-" if result["queries_per_request"] is None else f"{result['queries_per_request']:.1f}"
+            self.stdout.write(
+                f"{name:<18} {result['requests']:>6} {result['errors']:>5} {result['rps']:>9.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {queries:>6}"
+            )
+
+        payload = {
+            "commit": current_commit(),
+            "mode": "http" if base_url else "in-process",
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "concurrency": options["concurrency"],
+            "data": {
+                "users": User.objects.count(),
+                "permissions": Permission.objects.count(),
+                "comments": Comment.objects.count(),
+            },
+            "scenarios": summary,
+        }
+        if not options["no_save"]:
+            path = save_results(results_dir, payload)
+            self.stdout.write(f"Saved {path}")
+
+        if baseline is not None:
+            self.stdout.write(f"\nCompared with {baseline['commit']}:")
+            for name, metric, before, after, change in compare(payload, baseline):
+                self.stdout.write(f"  {name:<18} {metric:<20} {before:>10.2f} → {after:>10.2f} ({change:+.1f}%)")
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import token_blacklist
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes outstanding and blacklisted refresh tokens that have expired "
+        "(past REFRESH_TOKEN_LIFETIME); an expired token is rejected by its exp "
+        "claim, so its rows serve no purpose. Meant to run from cron, e.g. daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Tokens deleted per transaction.")
+        parser.add_argument(
+            "--grace", type=int, default=0,
+            help="Keep tokens that expired less than this many seconds ago.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        before = timezone.now() - timedelta(seconds=max(0, options["grace"]))
+        outstanding, blacklisted = token_blacklist.prune(
+            before, batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {outstanding} expired outstanding token(s), {blacklisted} of them blacklisted."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.otp import get_otp_store
+
+
+class Command(BaseCommand):
+    help = "Deletes expired password-reset OTPs (no-op for cache-backed stores)."
+
+    def handle(self, *args, **options):
+        deleted = get_otp_store().purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired OTP(s)."))
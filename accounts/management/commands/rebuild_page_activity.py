@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from accounts.page_activity import REBUILD_BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-page comment counters (PageActivity) from the comment tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page", type=int, action="append", dest="pages", help="Page id (repeatable; default: all pages).")
+        parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = rebuild(options["pages"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt activity of {count} page(s)."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.search import INDEXES, get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Re-populates the full-text search index from the model tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("indexes", nargs="*", help=f"Indexes to rebuild: {', '.join(sorted(INDEXES))} (default: all).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if not backend.maintains_index:
+            self.stdout.write(f"{type(backend).__name__} keeps no index; nothing to rebuild.")
+            return
+        unknown = set(options["indexes"]) - set(INDEXES)
+        if unknown:
+            raise CommandError(f"Unknown index(es): {', '.join(sorted(unknown))}")
+        for name in options["indexes"] or sorted(INDEXES):
+            count = backend.rebuild(INDEXES[name], batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} row(s) into '{name}'."))
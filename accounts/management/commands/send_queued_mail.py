@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import drain_outbox, outbox_setting
+
+
+class Command(BaseCommand):
+    help = "Sends mail queued in the OutboundEmail outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=outbox_setting("BATCH_SIZE"))
+        parser.add_argument("--max-attempts", type=int, default=outbox_setting("MAX_ATTEMPTS"))
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling for new mail instead of exiting once the outbox is empty.",
+        )
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = drain_outbox(batch_size=options["batch_size"], max_attempts=options["max_attempts"])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}.")
+                continue  # there may be more due mail right away
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_sent} sent, {total_failed} failed."))
@@ -0,0 +1,311 @@
+# accounts/metrics.py
+
+"""
+Per-route request metrics in the Prometheus text format.
+
+MetricsMiddleware times every request and, through a database execute
+wrapper installed on each new connection (see accounts/signals.py), the
+queries it runs. Per (route, method, status) it records histograms of
+
+    http_request_duration_seconds     whole request, middleware included
+    http_request_db_seconds           time spent executing SQL
+    http_request_queries              number of SQL statements
+    http_request_serializer_seconds   DRF serializer `.data` evaluation (views
+                                      using SerializerMetricsMixin)
+    http_response_bytes               body size (streaming bodies excluded)
+
+and `GET /metrics` returns them for a Prometheus scrape. The route label
+is the URL pattern (`api/comments/<int:pk>/`), never the raw path, so
+label cardinality stays bounded. The scrape needs METRICS["TOKEN"] as a
+bearer token or a staff session, unless METRICS["PUBLIC"] opens it up.
+
+State is per process: with several workers, scrape each one (or front them
+with a per-worker port). Requests slower than METRICS["SLOW_REQUEST_MS"]
+(1000 by default; None turns it off) are logged to the
+"accounts.metrics.slow" logger with their SQL.
+
+The per-request sample lives in a context variable, so queries the async
+views run through sync_to_async threads are attributed to their request.
+Streaming responses are timed up to the point the response is returned.
+"""
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger("accounts.metrics.slow")
+
+DEFAULTS = {
+    "ENABLED": True,
+    "TOKEN": None,  # "Authorization: Bearer <TOKEN>" grants access to /metrics
+    "PUBLIC": False,  # True serves /metrics to anybody
+    "SLOW_REQUEST_MS": 1000,  # log requests slower than this (None = off)
+    "SLOW_SQL_LIMIT": 50,  # statements kept per request for the slow log
+}
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def metrics_setting(name):
+    return getattr(settings, "METRICS", {}).get(name, DEFAULTS[name])
+
+
+# ─── Registry ──────────────────────────────────────────────────────────────────
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by a tuple of label values.
+    """
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}  # labels → [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            base = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                running += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {running}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{base}}} {running}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LABELS = ("route", "method", "status")
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency.", TIME_BUCKETS, LABELS)
+DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing SQL per request.", TIME_BUCKETS, LABELS)
+QUERIES = Histogram("http_request_queries", "SQL statements per request.", COUNT_BUCKETS, LABELS)
+SERIALIZER_SECONDS = Histogram(
+    "http_request_serializer_seconds", "Time spent in DRF serializers per request.", TIME_BUCKETS, LABELS
+)
+RESPONSE_BYTES = Histogram("http_response_bytes", "Response body size.", BYTE_BUCKETS, LABELS)
+
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, QUERIES, SERIALIZER_SECONDS, RESPONSE_BYTES)
+
+
+def expose():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """
+    Drops every recorded series (used by tests).
+    """
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+
+# ─── Per-request sample ────────────────────────────────────────────────────────
+class RequestSample:
+    __slots__ = ("db_seconds", "queries", "serializer_seconds", "serializer_depth", "sql", "keep_sql")
+
+    def __init__(self, keep_sql=0):
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        self.sql = []
+        self.keep_sql = keep_sql
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        if len(self.sql) < self.keep_sql:
+            self.sql.append((seconds, sql))
+
+
+_current = ContextVar("accounts_metrics_sample", default=None)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper: charges the statement to the current request.
+    """
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.add_query(sql, time.perf_counter() - started)
+
+
+def install_execute_wrapper(connection):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def _timed_data(fget):
+    def data(self):
+        sample = _current.get()
+        if sample is None or sample.serializer_depth:
+            return fget(self)
+        sample.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            sample.serializer_seconds += time.perf_counter() - started
+            sample.serializer_depth -= 1
+    return data
+
+
+_timed_classes = {}
+
+
+def timed_serializer_class(cls):
+    """
+    Subclass of the serializer `cls` whose top-level `.data` (where
+    to_representation() runs for the whole payload) is charged to the
+    current request; `many=True` instances get a timed ListSerializer.
+    """
+    timed = _timed_classes.get(cls)
+    if timed is None:
+        from rest_framework.serializers import ListSerializer
+
+        attrs = {"__module__": cls.__module__, "data": property(_timed_data(cls.data.fget))}
+        if not issubclass(cls, ListSerializer):
+            meta = getattr(cls, "Meta", object)
+            list_class = timed_serializer_class(getattr(meta, "list_serializer_class", ListSerializer))
+            attrs["Meta"] = type("Meta", (meta,), {"list_serializer_class": list_class})
+        timed = _timed_classes[cls] = type(cls.__name__, (cls,), attrs)
+    return timed
+
+
+class SerializerMetricsMixin:
+    """
+    For generic views: serializers from get_serializer() feed
+    http_request_serializer_seconds.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if metrics_setting("ENABLED"):
+            serializer_class = timed_serializer_class(serializer_class)
+        kwargs.setdefault("context", self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+# ─── Middleware ────────────────────────────────────────────────────────────────
+_ROUTE_NOISE = re.compile(r"[\^$]|\\Z")
+
+
+def route_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.route:
+        return "<unmatched>"
+    return _ROUTE_NOISE.sub("", match.route)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_setting("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.slow_ms = metrics_setting("SLOW_REQUEST_MS")
+        self.keep_sql = metrics_setting("SLOW_SQL_LIMIT") if self.slow_ms is not None else 0
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sample = RequestSample(self.keep_sql)
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, sample, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        sample = RequestSample(self.keep_sql)
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, sample, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, sample, seconds):
+        labels = (route_label(request), request.method, str(response.status_code))
+        REQUEST_SECONDS.observe(labels, seconds)
+        DB_SECONDS.observe(labels, sample.db_seconds)
+        QUERIES.observe(labels, sample.queries)
+        SERIALIZER_SECONDS.observe(labels, sample.serializer_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(labels, len(response.content))
+
+        if self.slow_ms is not None and seconds * 1000 >= self.slow_ms:
+            statements = "\n".join(f"  {elapsed * 1000:8.1f} ms  {sql}" for elapsed, sql in sample.sql)
+            logger.warning(
+                "Slow request %s %s (%s): %.1f ms total, %.1f ms in %d queries, %.1f ms serializing\n%s",
+                request.method, request.get_full_path(), labels[0], seconds * 1000,
+                sample.db_seconds * 1000, sample.queries, sample.serializer_seconds * 1000, statements,
+            )
+
+
+# ─── Endpoint ──────────────────────────────────────────────────────────────────
+def metrics_view(request):
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _may_scrape(request):
+    if metrics_setting("PUBLIC"):
+        return True
+    token = metrics_setting("TOKEN")
+    if token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_active and user.is_staff)
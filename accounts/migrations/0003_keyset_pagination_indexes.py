@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_product'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['page', 'created_at', 'id'], name='comment_page_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commenthistory',
+            index=models.Index(fields=['modified_at', 'id'], name='history_modified_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+# FTS5 tables for accounts.search.SQLiteFTS5Backend (rowid = model pk).
+# Only created on SQLite; other databases use a different search backend.
+FTS_TABLES = {
+    'accounts_comment_fts': ('content',),
+    'accounts_product_fts': ('name', 'description'),
+}
+
+
+def create_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in FTS_TABLES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+            f"USING fts5({', '.join(columns)}, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in FTS_TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_passwordresetotp_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(db_index=True, help_text='Product name', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, help_text='Unit price in USD (or your currency)', max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at'], name='product_created_idx'),
+        ),
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
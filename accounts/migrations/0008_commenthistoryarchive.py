@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_comment_history_fulltext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentHistoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=64)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('rows', models.PositiveIntegerField()),
+                ('oldest', models.DateTimeField()),
+                ('newest', models.DateTimeField()),
+                ('comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_histories', to='accounts.comment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['comment', 'newest'], name='archive_comment_idx')],
+            },
+        ),
+    ]
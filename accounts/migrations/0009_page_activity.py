@@ -0,0 +1,84 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill(apps, schema_editor):
+    # Same computation as accounts.page_activity.rebuild(), on the historical models.
+    Page = apps.get_model('accounts', 'Page')
+    Comment = apps.get_model('accounts', 'Comment')
+    CommentHistory = apps.get_model('accounts', 'CommentHistory')
+    CommentHistoryArchive = apps.get_model('accounts', 'CommentHistoryArchive')
+    PageActivity = apps.get_model('accounts', 'PageActivity')
+    PageCommenter = apps.get_model('accounts', 'PageCommenter')
+
+    comments = Comment.objects.order_by()
+    PageCommenter.objects.bulk_create([
+        PageCommenter(page_id=row['page_id'], user_id=row['user_id'], comments=row['n'])
+        for row in comments.values('page_id', 'user_id').annotate(n=Count('id')).iterator()
+    ], batch_size=5000)
+    totals = {
+        row['page_id']: row
+        for row in comments.values('page_id').annotate(
+            comments=Count('id'), commenters=Count('user_id', distinct=True), last=Max('created_at'),
+        )
+    }
+    edits = dict(
+        CommentHistory.objects.order_by().values('comment__page_id').annotate(n=Count('id'))
+        .values_list('comment__page_id', 'n')
+    )
+    archived = (
+        CommentHistoryArchive.objects.order_by().values('comment__page_id').annotate(n=Sum('rows'))
+        .values_list('comment__page_id', 'n')
+    )
+    for page_id, n in archived:
+        edits[page_id] = edits.get(page_id, 0) + n
+    PageActivity.objects.bulk_create([
+        PageActivity(
+            page_id=page_id,
+            comment_count=totals.get(page_id, {}).get('comments', 0),
+            commenter_count=totals.get(page_id, {}).get('commenters', 0),
+            edit_count=edits.get(page_id, 0),
+            last_comment_at=totals.get(page_id, {}).get('last'),
+        )
+        for page_id in Page.objects.values_list('pk', flat=True)
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_commenthistoryarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageActivity',
+            fields=[
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to='accounts.page')),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('commenter_count', models.PositiveIntegerField(default=0)),
+                ('edit_count', models.PositiveIntegerField(default=0)),
+                ('last_comment_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-last_comment_at'], name='page_activity_recent_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PageCommenter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commenters', to='accounts.page')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commented_pages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('page', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# token_blacklist.OutstandingToken has no index on expires_at; prune_token_blacklist
+# selects expired rows by it. The table belongs to simplejwt, so the index is
+# created here with portable SQL rather than through its model.
+INDEX = 'token_blacklist_outstanding_expires_idx'
+TABLE = 'token_blacklist_outstandingtoken'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_page_activity'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f"CREATE INDEX IF NOT EXISTS {INDEX} ON {TABLE} (expires_at)",
+            f"DROP INDEX IF EXISTS {INDEX}",
+        ),
+    ]
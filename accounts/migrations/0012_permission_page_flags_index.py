@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_roles_page_groups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='permission',
+            index=models.Index(fields=['page', 'can_view', 'can_create', 'can_edit', 'can_delete', 'user'], name='permission_page_flags_idx'),
+        ),
+    ]
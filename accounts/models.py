@@ -1,7 +1,12 @@
 # accounts/models.py
 
+from collections import Counter
+
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .realtime import publish_deleted, publish_updated_comments
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -35,6 +40,11 @@ class Page(models.Model):
     def __str__(self):
         return self.name
 class Permission(models.Model):
+    """
+    Per-user flags on one page. Where a row exists it overrides whatever the
+    user's roles grant on that page (an all-False row revokes); everything
+    else comes from roles (see permission_cache.compile_matrix).
+    """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='permissions')
     page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='permissions')
     can_view = models.BooleanField(default=False)
@@ -43,10 +53,192 @@ class Permission(models.Model):
     can_delete = models.BooleanField(default=False)
 
     class Meta:
-        unique_together = ('user', 'page')
+        unique_together = ('user', 'page')  # also the (user, page) index of a user's matrix
+        indexes = [
+            # covers "who holds flag X on page P" (accounts/permission_audit.py)
+            models.Index(
+                fields=['page', 'can_view', 'can_create', 'can_edit', 'can_delete', 'user'],
+                name='permission_page_flags_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} – {self.page.name}"
+
+
+class PageGroup(models.Model):
+    """
+    A named set of pages roles grant flags on.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    pages = models.ManyToManyField(Page, related_name='page_groups', blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Role(models.Model):
+    """
+    A bundle of flags on page groups. Users hold roles through UserRole; a
+    default role applies to every user, on top of any roles they hold.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    is_default = models.BooleanField(default=False, help_text='Applies to every user.')
+
+    def __str__(self):
+        return self.name
+
+
+class RoleGrant(models.Model):
+    role = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='grants')
+    page_group = models.ForeignKey(PageGroup, on_delete=models.CASCADE, related_name='grants')
+    flags = models.PositiveSmallIntegerField(
+        default=0, help_text='Bitmask: 1 view, 2 create, 4 edit, 8 delete.'
+    )
+
+    class Meta:
+        unique_together = ('role', 'page_group')
+
+    def __str__(self):
+        return f"{self.role.name} – {self.page_group.name}"
+
+
+class UserRole(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_roles')
+    role = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='members')
+
+    class Meta:
+        unique_together = ('user', 'role')
+
+    def __str__(self):
+        return f"{self.user.email} – {self.role.name}"
+
+
+# Fields the page activity aggregates depend on besides `content`.
+ACTIVITY_FIELDS = {'page', 'page_id', 'user', 'user_id', 'created_at'}
+
+
+def _page_activity():
+    from . import page_activity  # imports this module
+
+    return page_activity
+
+
+class CommentQuerySet(models.QuerySet):
+    """
+    Bulk writes that change `content` record CommentHistory rows with one
+    SELECT and one bulk INSERT, inside the same transaction as the UPDATE,
+    and refresh the full-text index for the rows they touched. The page
+    activity counters are adjusted in the same transaction, and stream
+    subscribers are told after the commit.
+    """
+
+    def update(self, **kwargs):
+        if not ACTIVITY_FIELDS.intersection(kwargs):
+            return self._update_content(**kwargs)
+        # Rows change page or author: recount the pages on both sides.
+        with transaction.atomic(using=self.db):
+            before = dict(self.values_list('id', 'page_id'))
+            updated = self._update_content(**kwargs)
+            self._moved(before)
+            return updated
+    update.alters_data = True
+
+    def _update_content(self, **kwargs):
+        if 'content' not in kwargs:
+            return super().update(**kwargs)
+        new_content = kwargs['content']
+        with transaction.atomic(using=self.db):
+            rows = self.values_list('id', 'content', 'user_id', 'page_id')
+            if isinstance(new_content, str):
+                rows = rows.exclude(content=new_content)
+            rows = list(rows)
+            histories = CommentHistory.objects.using(self.db).bulk_create([
+                CommentHistory(comment_id=pk, previous_content=content, modified_by_id=user_id)
+                for pk, content, user_id, _ in rows
+            ])
+            updated = super().update(**kwargs)
+            changed = self.model._base_manager.using(self.db).filter(
+                pk__in=[history.comment_id for history in histories]
+            ).only('id', 'content')
+            self._sync_search_index(histories, changed)
+            _page_activity().edits_added(Counter(page_id for *_, page_id in rows))
+            publish_updated_comments([history.comment_id for history in histories], using=self.db)
+            return updated
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if ACTIVITY_FIELDS.intersection(fields):
+            objs = list(objs)
+            with transaction.atomic(using=self.db):
+                before = dict(
+                    self.model._base_manager.using(self.db)
+                    .filter(pk__in=[obj.pk for obj in objs]).values_list('id', 'page_id')
+                )
+                updated = self._bulk_update_content(objs, fields, batch_size)
+                self._moved(before)
+                return updated
+        return self._bulk_update_content(objs, fields, batch_size)
+    bulk_update.alters_data = True
+
+    def _bulk_update_content(self, objs, fields, batch_size):
+        if 'content' not in fields:
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        objs = list(objs)
+        # Instances loaded from the database remember their original content;
+        # only the others need one query to find out.
+        unknown = [obj.pk for obj in objs if not hasattr(obj, '_loaded_content')]
+        fetched = {}
+        if unknown:
+            fetched = dict(
+                self.model._base_manager.using(self.db)
+                .filter(pk__in=unknown)
+                .values_list('id', 'content')
+            )
+        histories, edited_pages = [], Counter()
+        for obj in objs:
+            previous = getattr(obj, '_loaded_content', fetched.get(obj.pk))
+            if previous is not None and previous != obj.content:
+                histories.append(CommentHistory(
+                    comment_id=obj.pk, previous_content=previous, modified_by_id=obj.user_id,
+                ))
+                edited_pages[obj.page_id] += 1
+        with transaction.atomic(using=self.db):
+            CommentHistory.objects.using(self.db).bulk_create(histories, batch_size=batch_size)
+            # Plain QuerySet: bulk_update() is built on update(), whose
+            # history capture above would record every row a second time.
+            plain = models.QuerySet(self.model, using=self.db)
+            updated = plain.bulk_update(objs, fields, batch_size=batch_size)
+            self._sync_search_index(histories, objs)
+            _page_activity().edits_added(edited_pages)
+            publish_updated_comments([history.comment_id for history in histories], using=self.db)
+        for obj in objs:
+            obj._loaded_content = obj.content
+        return updated
+
+    def _moved(self, before):
+        # `before` maps comment id → page id ahead of an update that may have
+        # moved them: recount both sides and tell the old pages' subscribers.
+        after = dict(
+            self.model._base_manager.using(self.db).filter(pk__in=list(before)).values_list('id', 'page_id')
+        )
+        _page_activity().rebuild(set(before.values()) | set(after.values()))
+        for pk, page_id in before.items():
+            if after.get(pk, page_id) != page_id:
+                publish_deleted(pk, page_id, using=self.db)
+        publish_updated_comments(list(after), using=self.db)
+
+    def _sync_search_index(self, histories, comments):
+        # Bulk writes send no post_save, so the signal handlers that keep the
+        # full-text index current don't see them.
+        from .search import INDEXES, get_search_backend
+
+        backend = get_search_backend()
+        if not backend.maintains_index:
+            return
+        backend.index(INDEXES['comment_history'], [h for h in histories if h.pk is not None])
+        backend.index(INDEXES['comment'], comments)
+
+
 class Comment(models.Model):
     page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -54,26 +246,168 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a page's comments, newest first
+            models.Index(fields=['page', 'created_at', 'id'], name='comment_page_created_idx'),
+        ]
+
+    objects = CommentQuerySet.as_manager()
+
     def __str__(self):
         return f"[{self.page.name}] {self.user.email}"
 
+    # Remember the content (and page / author) as loaded so the pre_save
+    # signals can compare against them without re-fetching the row.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'content' in instance.__dict__:
+            instance._loaded_content = instance.content
+        if 'page_id' in instance.__dict__ and 'user_id' in instance.__dict__:
+            instance._loaded_owner = (instance.page_id, instance.user_id)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'content' in fields:
+            self._loaded_content = self.content
+        if fields is None:
+            self._loaded_owner = (self.page_id, self.user_id)
+
+    def save(self, *args, **kwargs):
+        # The history row written by the pre_save signal and the UPDATE
+        # commit (or roll back) together.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        self._loaded_content = self.content
+        self._loaded_owner = (self.page_id, self.user_id)
+
 class CommentHistory(models.Model):
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='histories')
     previous_content = models.TextField()
     modified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='modifications')
     modified_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of the history feed, newest first
+            models.Index(fields=['modified_at', 'id'], name='history_modified_idx'),
+        ]
+
     def __str__(self):
         return f"History for comment {self.comment.id} at {self.modified_at}"
 
+class CommentHistoryArchive(models.Model):
+    """
+    Locates archived CommentHistory rows of one comment: a gzip member of
+    `length` bytes at `offset` in the archive segment file `segment`
+    (see accounts/history_archive.py).
+    """
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='archived_histories')
+    segment = models.CharField(max_length=64)
+    offset = models.BigIntegerField()
+    length = models.PositiveIntegerField()
+    rows = models.PositiveIntegerField()
+    oldest = models.DateTimeField()
+    newest = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['comment', 'newest'], name='archive_comment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.rows} archived edit(s) of comment {self.comment_id} in {self.segment}"
+
+class PageActivity(models.Model):
+    """
+    Comment aggregates of one page, kept current in the same transaction as
+    the comment writes (see accounts/page_activity.py). `edit_count` counts
+    the edits of the page's live comments, archived ones included.
+    """
+    page = models.OneToOneField(Page, on_delete=models.CASCADE, primary_key=True, related_name='activity')
+    comment_count = models.PositiveIntegerField(default=0)
+    commenter_count = models.PositiveIntegerField(default=0)
+    edit_count = models.PositiveIntegerField(default=0)
+    last_comment_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the dashboard lists pages by recent activity
+            models.Index(fields=['-last_comment_at'], name='page_activity_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.comment_count} comment(s) on page {self.page_id}"
+
+class PageCommenter(models.Model):
+    """
+    How many comments `user` has on `page`; a row exists while that is
+    non-zero, which is what PageActivity.commenter_count counts.
+    """
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='commenters')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='commented_pages')
+    comments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('page', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} commented {self.comments} time(s) on page {self.page_id}"
+
 class PasswordResetOTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     otp = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'otp'], name='otp_user_code_idx'),
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
+
     def __str__(self):
         return f"OTP for {self.user.email}"
+class OutboundEmail(models.Model):
+    """
+    Outbox row for mail that is sent by the `send_queued_mail` worker
+    instead of inside the request (see accounts/outbox.py).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.TextField(help_text="Comma-separated recipient addresses")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker polls for due pending mail
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to} ({self.status})"
+
+    @property
+    def recipients(self):
+        return [address for address in self.to.split(',') if address]
 # accounts/models.py
 
 
@@ -82,7 +416,7 @@ class Product(models.Model):
     """
     A minimal Product model. Adjust fields as needed.
     """
-    name = models.CharField(max_length=200, help_text="Product name")
+    name = models.CharField(max_length=200, db_index=True, help_text="Product name")
     description = models.TextField(
         blank=True,
         help_text="Optional longer description of the product",
@@ -91,6 +425,7 @@ class Product(models.Model):
         max_digits=10,
         decimal_places=2,
         default=0.00,
+        db_index=True,
         help_text="Unit price in USD (or your currency)",
     )
 
@@ -99,6 +434,9 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(fields=['created_at'], name='product_created_idx'),
+        ]
         verbose_name = "Product"
         verbose_name_plural = "Products"
 
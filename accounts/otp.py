@@ -0,0 +1,156 @@
+# accounts/otp.py
+
+"""
+Storage backends for password-reset OTPs.
+
+PASSWORD_RESET_OTP["STORE"] selects the backend:
+
+- DatabaseOTPStore keeps PasswordResetOTP rows, looked up through the
+  (user, otp) index; `python manage.py purge_expired_otps` deletes expired
+  rows through the expires_at index.
+- CacheOTPStore keeps codes in the Django cache with a native TTL, so there
+  is nothing to purge.
+
+Both are wrapped by a per-email rate limit (see `check_rate_limit`).
+"""
+
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import Throttled
+
+from .models import PasswordResetOTP
+
+DEFAULTS = {
+    "STORE": "accounts.otp.DatabaseOTPStore",
+    "CACHE_ALIAS": "default",
+    "TTL": 900,
+    "RATE_LIMIT": 5,           # OTP requests per email per window
+    "VERIFY_RATE_LIMIT": 10,   # verify attempts per email per window
+    "RATE_WINDOW": 3600,
+}
+
+VALID = "valid"
+INVALID = "invalid"
+EXPIRED = "expired"
+
+
+def otp_setting(name):
+    return getattr(settings, "PASSWORD_RESET_OTP", {}).get(name, DEFAULTS[name])
+
+
+def generate_otp():
+    return secrets.randbelow(900000) + 100000
+
+
+class BaseOTPStore:
+    def issue(self, user, ttl):
+        """
+        Creates and stores a new code for `user`; returns it.
+        """
+        raise NotImplementedError
+
+    def check(self, user, otp):
+        """
+        Returns VALID, INVALID or EXPIRED without consuming the code.
+        """
+        raise NotImplementedError
+
+    def consume(self, user):
+        """
+        Invalidates every outstanding code of `user`.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """
+        Deletes expired codes; returns how many were removed.
+        """
+        return 0
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    def issue(self, user, ttl):
+        otp = generate_otp()
+        PasswordResetOTP.objects.create(
+            user=user, otp=otp, expires_at=timezone.now() + timedelta(seconds=ttl)
+        )
+        return otp
+
+    def check(self, user, otp):
+        expires = (
+            PasswordResetOTP.objects.filter(user=user, otp=otp)
+            .order_by("-expires_at")
+            .values_list("expires_at", flat=True)
+            .first()
+        )
+        if expires is None:
+            return INVALID
+        return VALID if expires >= timezone.now() else EXPIRED
+
+    def consume(self, user):
+        PasswordResetOTP.objects.filter(user=user).delete()
+
+    def purge_expired(self):
+        deleted, _ = PasswordResetOTP.objects.filter(expires_at__lt=timezone.now()).delete()
+        return deleted
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+    One cache entry per (user, code) expiring on its own, plus a per-user
+    generation number so consume() can drop all of a user's codes at once.
+    Expired codes simply vanish, so check() never reports EXPIRED.
+    """
+    KEY_PREFIX = "accounts:otp"
+
+    def __init__(self):
+        self.cache = caches[otp_setting("CACHE_ALIAS")]
+
+    def _generation(self, user):
+        return self.cache.get(f"{self.KEY_PREFIX}:gen:{user.pk}", 0)
+
+    def _key(self, user, otp):
+        return f"{self.KEY_PREFIX}:{user.pk}:{self._generation(user)}:{otp}"
+
+    def issue(self, user, ttl):
+        otp = generate_otp()
+        self.cache.set(self._key(user, otp), True, timeout=ttl)
+        return otp
+
+    def check(self, user, otp):
+        return VALID if self.cache.get(self._key(user, otp)) else INVALID
+
+    def consume(self, user):
+        key = f"{self.KEY_PREFIX}:gen:{user.pk}"
+        self.cache.set(key, self._generation(user) + 1, timeout=None)
+
+
+def get_otp_store():
+    return import_string(otp_setting("STORE"))()
+
+
+def check_rate_limit(email, action, limit):
+    """
+    Fixed-window counter per (action, email) in the cache. Raises Throttled
+    once `limit` calls were made within RATE_WINDOW seconds.
+    """
+    cache = caches[otp_setting("CACHE_ALIAS")]
+    window = otp_setting("RATE_WINDOW")
+    digest = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()[:32]
+    key = f"accounts:otp-rate:{action}:{digest}"
+    if cache.add(key, 1, timeout=window):
+        return
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # expired between add() and incr(): start a new window
+        cache.set(key, 1, timeout=window)
+        return
+    if count > limit:
+        raise Throttled(detail="Too many password reset attempts for this email. Try again later.")
@@ -0,0 +1,157 @@
+# accounts/outbox.py
+
+"""
+Outbound mail queue.
+
+Request code calls `enqueue_mail(...)` instead of `send_mail(...)`. Which
+outbox handles it is chosen by EMAIL_OUTBOX["BACKEND"]:
+
+- DatabaseOutbox (default) stores an OutboundEmail row; the
+  `send_queued_mail` management command drains the table in batches over
+  one reused EMAIL_BACKEND connection and retries failures with
+  exponential backoff.
+- ImmediateOutbox sends right away, like the old in-request send_mail().
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": "accounts.outbox.DatabaseOutbox",
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 5,
+    "RETRY_BACKOFF": 30,  # seconds; doubled after every failed attempt
+    "LEASE": 300,  # seconds a claimed batch is hidden from other workers
+}
+
+
+def outbox_setting(name):
+    return getattr(settings, "EMAIL_OUTBOX", {}).get(name, DEFAULTS[name])
+
+
+class BaseOutbox:
+    def enqueue(self, subject, message, from_email, recipient_list):
+        raise NotImplementedError
+
+
+class ImmediateOutbox(BaseOutbox):
+    """
+    Sends inside the caller, exactly like django.core.mail.send_mail().
+    """
+
+    def enqueue(self, subject, message, from_email, recipient_list):
+        send_mail(subject=subject, message=message, from_email=from_email, recipient_list=recipient_list)
+
+
+class DatabaseOutbox(BaseOutbox):
+    """
+    Stores the message for the `send_queued_mail` worker. One INSERT is all
+    the request pays for.
+    """
+
+    def enqueue(self, subject, message, from_email, recipient_list):
+        return OutboundEmail.objects.create(
+            subject=subject,
+            body=message,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=",".join(recipient_list),
+        )
+
+
+def get_outbox():
+    return import_string(outbox_setting("BACKEND"))()
+
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    return get_outbox().enqueue(subject, message, from_email, recipient_list)
+
+
+def _claim_batch(batch_size, lease):
+    """
+    Returns due pending rows and leases them: their next_attempt_at is pushed
+    `lease` seconds ahead so concurrent workers skip them while this one is
+    talking to the mail server (and pick them up again if it dies).
+    The claim is a short transaction; no lock is held while sending.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.filter(
+                status=OutboundEmail.STATUS_PENDING,
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at", "id")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[entry.pk for entry in batch]).update(
+                next_attempt_at=now + timedelta(seconds=lease)
+            )
+    return batch
+
+
+def drain_outbox(batch_size=None, max_attempts=None, backoff=None, connection=None):
+    """
+    Sends one batch of due mail over a single connection.
+    Returns (sent, failed) counts for the batch.
+    """
+    batch_size = batch_size or outbox_setting("BATCH_SIZE")
+    max_attempts = max_attempts or outbox_setting("MAX_ATTEMPTS")
+    backoff = backoff if backoff is not None else outbox_setting("RETRY_BACKOFF")
+
+    batch = _claim_batch(batch_size, lease=outbox_setting("LEASE"))
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+        open_error = None
+    except Exception as exc:
+        # Relay unreachable: count an attempt for the whole batch.
+        open_error = exc
+    try:
+        for entry in batch:
+            now = timezone.now()
+            entry.attempts += 1
+            try:
+                if open_error is not None:
+                    raise open_error
+                EmailMessage(
+                    subject=entry.subject,
+                    body=entry.body,
+                    from_email=entry.from_email,
+                    to=entry.recipients,
+                    connection=connection,
+                ).send()
+            except Exception as exc:
+                logger.warning("Sending outbox mail %s failed (attempt %s): %s", entry.pk, entry.attempts, exc)
+                entry.last_error = str(exc)
+                if entry.attempts >= max_attempts:
+                    entry.status = OutboundEmail.STATUS_FAILED
+                else:
+                    entry.next_attempt_at = now + timedelta(seconds=backoff * 2 ** (entry.attempts - 1))
+                failed += 1
+            else:
+                entry.status = OutboundEmail.STATUS_SENT
+                entry.sent_at = now
+                entry.last_error = ""
+                sent += 1
+    finally:
+        connection.close()
+
+    OutboundEmail.objects.bulk_update(
+        batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return sent, failed
@@ -0,0 +1,203 @@
+# accounts/page_activity.py
+
+"""
+Materialized per-page comment aggregates (PageActivity, PageCommenter).
+
+Every comment write adjusts the counters of its page with F() updates in
+the transaction of the write itself: Comment.save() and deletes run in one
+(see the receivers in accounts/signals.py), and CommentQuerySet.update() /
+bulk_update() call in here from their own atomic blocks. So the counters
+never disagree with committed comments, and concurrent writers serialise
+on the page's activity row rather than recounting.
+
+Comments written with bulk_create() send no signals: their writer calls
+comments_added() in the same transaction (accounts/comment_ingest.py
+does) or rebuild() for the pages involved (the benchmark seeder does), or
+run
+
+    python manage.py rebuild_page_activity [--page ID ...]
+
+which recomputes the rows from the comment tables.
+"""
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Subquery, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Comment, CommentHistory, CommentHistoryArchive, Page, PageActivity, PageCommenter
+
+REBUILD_BATCH_SIZE = 5000
+
+
+# ─── Incremental updates ───────────────────────────────────────────────────────
+def _count_commenter(page_id, user_id, n):
+    """
+    Adds `n` comments to the (page, user) row; returns 1 when it is new.
+    """
+    commenter = PageCommenter.objects.filter(page_id=page_id, user_id=user_id)
+    if commenter.update(comments=F('comments') + n):
+        return 0
+    try:
+        with transaction.atomic():
+            PageCommenter.objects.create(page_id=page_id, user_id=user_id, comments=n)
+        return 1
+    except IntegrityError:  # a concurrent first comment created it
+        commenter.update(comments=F('comments') + n)
+        return 0
+
+
+def comment_added(page_id, user_id, created_at, edits=0):
+    with transaction.atomic():
+        new_commenter = _count_commenter(page_id, user_id, 1)
+        updated = PageActivity.objects.filter(page_id=page_id).update(
+            comment_count=F('comment_count') + 1,
+            commenter_count=F('commenter_count') + new_commenter,
+            edit_count=F('edit_count') + edits,
+            last_comment_at=Case(
+                When(last_comment_at__gt=created_at, then=F('last_comment_at')),
+                default=Value(created_at),
+            ),
+        )
+        if not updated:
+            # page predates the activity rows (or was bulk-created)
+            rebuild([page_id])
+
+
+def comments_added(comments):
+    """
+    comment_added() for comments written with bulk_create(): one statement
+    per (page, author) pair and one per page instead of per comment.
+    """
+    pairs = Counter((comment.page_id, comment.user_id) for comment in comments)
+    latest = {}
+    for comment in comments:
+        if comment.page_id not in latest or comment.created_at > latest[comment.page_id]:
+            latest[comment.page_id] = comment.created_at
+    with transaction.atomic():
+        new_commenters = Counter()
+        for (page_id, user_id), n in pairs.items():
+            new_commenters[page_id] += _count_commenter(page_id, user_id, n)
+        added = Counter(page_id for page_id, _ in pairs.elements())
+        missing = []
+        for page_id, n in added.items():
+            updated = PageActivity.objects.filter(page_id=page_id).update(
+                comment_count=F('comment_count') + n,
+                commenter_count=F('commenter_count') + new_commenters[page_id],
+                last_comment_at=Case(
+                    When(last_comment_at__gt=latest[page_id], then=F('last_comment_at')),
+                    default=Value(latest[page_id]),
+                ),
+            )
+            if not updated:
+                missing.append(page_id)
+        if missing:
+            rebuild(missing)
+
+
+def _minus(field, n):
+    # PositiveIntegerField has a CHECK (>= 0) on PostgreSQL
+    return Greatest(F(field) - n, Value(0))
+
+
+def comment_removed(page_id, user_id, comment_id, edits=0):
+    """
+    Called before the comment row `comment_id` is deleted (or moved away).
+    Deletes of many comments at once rebuild() their pages instead (see
+    the receivers in accounts/signals.py).
+    """
+    with transaction.atomic():
+        # Clamped: counters that drifted to 0 (bulk writes) must not break the delete
+        PageCommenter.objects.filter(page_id=page_id, user_id=user_id).update(comments=_minus('comments', 1))
+        gone, _ = PageCommenter.objects.filter(page_id=page_id, user_id=user_id, comments__lte=0).delete()
+        latest = (
+            Comment._base_manager.filter(page_id=page_id).exclude(pk=comment_id)
+            .order_by('-created_at').values('created_at')[:1]
+        )
+        updated = PageActivity.objects.filter(page_id=page_id).update(
+            comment_count=_minus('comment_count', 1),
+            commenter_count=_minus('commenter_count', gone),
+            edit_count=_minus('edit_count', edits),
+            last_comment_at=Subquery(latest),
+        )
+        if not updated and Page.objects.filter(pk=page_id).exists():
+            rebuild([page_id])
+
+
+def edits_added(counts):
+    """
+    `counts` maps page id → number of new CommentHistory rows.
+    """
+    for page_id, n in counts.items():
+        if n:
+            PageActivity.objects.filter(page_id=page_id).update(edit_count=F('edit_count') + n)
+
+
+def edits_added_for_comment(comment_id, n=1):
+    # one UPDATE: the comment's page is looked up inside it
+    page = Comment._base_manager.filter(pk=comment_id).values('page_id')[:1]
+    PageActivity.objects.filter(page_id=Subquery(page)).update(edit_count=F('edit_count') + n)
+
+
+def edit_count(comment_id):
+    """
+    All edits of one comment: history rows still in the table plus archived ones.
+    """
+    live = CommentHistory.objects.filter(comment_id=comment_id).count()
+    archived = CommentHistoryArchive.objects.filter(comment_id=comment_id).aggregate(n=Sum('rows'))['n']
+    return live + (archived or 0)
+
+
+# ─── Rebuild ───────────────────────────────────────────────────────────────────
+def rebuild(page_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recomputes the activity and commenter rows of `page_ids` (default: every
+    page) from the comment tables. Returns the number of pages rebuilt.
+    """
+    pages, scope = Page.objects.all(), {}
+    if page_ids is not None:
+        page_ids = list(page_ids)
+        pages, scope = pages.filter(pk__in=page_ids), {'page_id__in': page_ids}
+    page_ids = list(pages.values_list('pk', flat=True))
+    comments = Comment._base_manager.filter(**scope).order_by()
+
+    with transaction.atomic():
+        PageCommenter.objects.filter(**scope).delete()
+        per_user = comments.values('page_id', 'user_id').annotate(n=Count('id')).iterator(chunk_size=batch_size)
+        batch = []
+        for row in per_user:
+            batch.append(PageCommenter(page_id=row['page_id'], user_id=row['user_id'], comments=row['n']))
+            if len(batch) >= batch_size:
+                PageCommenter.objects.bulk_create(batch)
+                batch = []
+        PageCommenter.objects.bulk_create(batch)
+
+        totals = {
+            row['page_id']: row
+            for row in comments.values('page_id').annotate(
+                comments=Count('id'), commenters=Count('user_id', distinct=True), last=Max('created_at'),
+            )
+        }
+        history_scope = {f'comment__{key}': value for key, value in scope.items()}
+        edits = Counter(dict(
+            CommentHistory.objects.filter(**history_scope)
+            .order_by().values('comment__page_id').annotate(n=Count('id')).values_list('comment__page_id', 'n')
+        ))
+        edits.update(dict(
+            CommentHistoryArchive.objects.filter(**history_scope)
+            .order_by().values('comment__page_id').annotate(n=Sum('rows')).values_list('comment__page_id', 'n')
+        ))
+
+        PageActivity.objects.filter(**scope).delete()
+        PageActivity.objects.bulk_create([
+            PageActivity(
+                page_id=page_id,
+                comment_count=totals.get(page_id, {}).get('comments', 0),
+                commenter_count=totals.get(page_id, {}).get('commenters', 0),
+                edit_count=edits.get(page_id, 0),
+                last_comment_at=totals.get(page_id, {}).get('last'),
+            )
+            for page_id in page_ids
+        ], batch_size=batch_size)
+    return len(page_ids)
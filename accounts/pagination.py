@@ -0,0 +1,227 @@
+# accounts/pagination.py
+
+"""
+Keyset (cursor) pagination.
+
+Pages are addressed by the sort key of the last row already seen, e.g.
+`WHERE (created_at, id) < (:created_at, :id) ORDER BY created_at DESC, id DESC
+LIMIT :n`, so with a matching index page N costs the same as page 1.
+
+Pagination is opt-in so existing clients that expect a plain JSON list keep
+working: a list request is paginated only when it carries `?limit=` or
+`?cursor=`. The cursor is an opaque base64 token; clients just follow `next`.
+
+A valid `?ordering=` (the view's OrderingFilter) replaces the paginator's
+own ordering, with `id` appended as the tiebreaker; the cursor then holds
+the values of those columns, so `next` must be followed with the same
+`?ordering=` (it is part of the link).
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from decimal import Decimal, InvalidOperation
+
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates on the columns listed in `ordering` (or the request's
+    `?ordering=`, see get_ordering()). Columns may sort in either direction;
+    the last one must be unique (normally `id`) and none may be nullable.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # ── opt-in ──
+    @staticmethod
+    def _params(request):
+        return getattr(request, 'query_params', request.GET)
+
+    def is_requested(self, request):
+        params = self._params(request)
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(self._params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # ── ordering helpers ──
+    def get_ordering(self, request, queryset, view):
+        """
+        The view's validated `?ordering=` terms followed by `id`, or
+        `ordering` when the request asks for none.
+        """
+        backend = next(
+            (b for b in getattr(view, 'filter_backends', ()) if issubclass(b, OrderingFilter)), None
+        )
+        if backend is None or not self._params(request).get(backend.ordering_param):
+            return self.ordering
+        terms = []
+        for term in backend().get_ordering(request, queryset, view) or ():
+            name = term.lstrip('-')
+            if name in ('id', 'pk'):
+                terms.append(term[:-len(name)] + 'id')
+                return tuple(terms)
+            if term not in terms:
+                terms.append(term)
+        if not terms:
+            return self.ordering
+        return (*terms, '-id' if terms[-1].startswith('-') else 'id')
+
+    @property
+    def fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    # ── cursor encoding ──
+    def encode_cursor(self, instance):
+        values = []
+        for name in self.fields:
+            value = getattr(instance, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, queryset, encoded):
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(urlsafe_b64decode(padded.encode('ascii')))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+
+        decoded = []
+        for name, value in zip(self.fields, values):
+            field = queryset.model._meta.get_field(name)
+            if isinstance(field, models.DateTimeField):
+                value = parse_datetime(value) if isinstance(value, str) else None
+            elif isinstance(field, models.DecimalField):
+                try:
+                    value = Decimal(value) if isinstance(value, str) else None
+                except InvalidOperation:
+                    value = None
+            elif isinstance(field, (models.CharField, models.TextField)):
+                value = value if isinstance(value, str) else None
+            elif not isinstance(value, int) or isinstance(value, bool):
+                value = None
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            decoded.append(value)
+        return decoded
+
+    def keyset_filter(self, values):
+        """
+        (a, b, c) < (x, y, z)  →  a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)
+
+        with `>` instead of `<` for the columns sorted ascending.
+        """
+        condition = Q()
+        for i, (term_name, name) in enumerate(zip(self.ordering, self.fields)):
+            lookup = 'lt' if term_name.startswith('-') else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        return condition
+
+    # ── BasePagination API ──
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        queryset, page_size = self._page_queryset(queryset, request, view)
+        return self._finish_page(list(queryset[:page_size + 1]), page_size)
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async variant for plain Django async views (request.GET instead of
+        DRF's request.query_params).
+        """
+        if not self.is_requested(request):
+            return None
+        queryset, page_size = self._page_queryset(queryset, request)
+        return self._finish_page([row async for row in queryset[:page_size + 1]], page_size)
+
+    def _page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = self._params(request).get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(queryset, encoded)))
+        return queryset, page_size
+
+    def _finish_page(self, rows, page_size):
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = self.encode_cursor(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class IdKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class AlwaysIdKeysetPagination(IdKeysetPagination):
+    """
+    For endpoints without a plain-list past: every request is paginated.
+    """
+    def is_requested(self, request):
+        return True
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """
+    Newest first; backed by the (page, created_at, id) index on comments.
+    """
+    ordering = ('-created_at', '-id')
+
+
+class ModifiedAtKeysetPagination(KeysetPagination):
+    """
+    Newest first; backed by the (modified_at, id) index on comment history.
+    """
+    ordering = ('-modified_at', '-id')
@@ -0,0 +1,93 @@
+# accounts/permission_audit.py
+
+"""
+Effective-permission queries for access audits (superuser only):
+
+    GET /api/permissions/who/?page_id=3&flag=edit     users who may edit page 3
+    GET /api/permissions/matrix/?user_id=7            what user 7 may do, per page
+
+Both answer with the permissions HasPagePermission enforces, i.e. role
+grants on page groups overridden by Permission rows (see
+permission_cache.compile_matrix), not the raw Permission table.
+Superusers pass every check and are left out of both. Results
+are keyset-paginated by id (`?limit=`, then follow `next`); with
+`?output=ndjson` the whole result is streamed instead.
+
+"who" costs one small query for the roles granting the flag on the page,
+then one query over users whose `pk IN (...)` terms are answered from the
+(page, can_view, can_create, can_edit, can_delete, user) covering index on
+Permission and the role index on UserRole. Only a default role granting
+the flag makes it a scan of the users table, since everybody without an
+override then qualifies. "matrix" reads the user's cached compiled matrix
+and looks up the page names and overrides of one result page at a time.
+"""
+
+from .models import Page, Permission, RoleGrant, User, UserRole
+from .permission_cache import FLAG_FIELDS, get_permission_matrix, unpack_flags
+
+# ?flag= value → (Permission column, bit)
+FLAGS = {field[len('can_'):]: (field, bit) for field, bit in FLAG_FIELDS}
+
+USER_FIELDS = ('id', 'username', 'email')
+MATRIX_FIELDS = ('page', 'name', 'can_view', 'can_create', 'can_edit', 'can_delete', 'override')
+
+
+def users_with(page_id, flag):
+    """
+    Users holding `flag` (a FLAGS key) on `page_id`, as a User queryset.
+    """
+    field, bit = FLAGS[flag]
+    granting, default = [], False
+    grants = RoleGrant.objects.filter(page_group__pages=page_id).values_list('role_id', 'role__is_default', 'flags')
+    for role_id, is_default, flags in grants:
+        if flags & bit:
+            granting.append(role_id)
+            default = default or is_default
+
+    overrides = Permission.objects.filter(page_id=page_id)
+    holders = User.objects.filter(pk__in=overrides.filter(**{field: True}).values('user_id'))
+    overridden = overrides.values('user_id')
+    if default:
+        holders |= User.objects.exclude(pk__in=overridden)
+    elif granting:
+        members = UserRole.objects.filter(role_id__in=granting).exclude(user_id__in=overridden)
+        holders |= User.objects.filter(pk__in=members.values('user_id'))
+    return holders.exclude(is_superuser=True).only(*USER_FIELDS)
+
+
+def user_pages(user_id):
+    """
+    (matrix, Page queryset of the pages the user holds any flag on).
+    """
+    matrix = get_permission_matrix(user_id)
+    return matrix, Page.objects.filter(pk__in=list(matrix.masks)).only('id', 'name')
+
+
+def matrix_rows(matrix, pages):
+    """
+    One MATRIX_FIELDS tuple per page of `pages`, with one query for the overrides.
+    """
+    pages = list(pages)
+    overridden = set(
+        Permission.objects.filter(user_id=matrix.user_id, page_id__in=[page.pk for page in pages])
+        .values_list('page_id', flat=True)
+    )
+    for page in pages:
+        flags = unpack_flags(matrix.mask_for(page.pk))
+        yield (
+            page.pk, page.name, flags['can_view'], flags['can_create'], flags['can_edit'], flags['can_delete'],
+            page.pk in overridden,
+        )
+
+
+def stream_matrix_rows(matrix, pages, batch_size=500):
+    """
+    matrix_rows() over a whole Page queryset, `batch_size` pages at a time.
+    """
+    batch = []
+    for page in pages.order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(page)
+        if len(batch) >= batch_size:
+            yield from matrix_rows(matrix, batch)
+            batch = []
+    yield from matrix_rows(matrix, batch)
@@ -0,0 +1,328 @@
+# accounts/permission_cache.py
+
+"""
+Compiled per-user page-permission matrix.
+
+Every user's permissions (their roles' grants on page groups, overridden
+per page by their own Permission rows) are resolved once into a
+{page_id: bitmask} dict and kept in a process-local LRU (and, optionally,
+a shared Django cache backend) so HasPagePermission can answer with a dict
+lookup instead of two queries per request.
+
+Entries are tagged with a version token. Saving or deleting a Permission or
+UserRole bumps the owning user's version; deleting a Page or changing a
+Role, RoleGrant or PageGroup bumps a global generation. A lookup whose
+stored token no longer matches the current one is treated as a miss and
+recompiled, which also covers a compile racing with an invalidation.
+
+Without a shared cache, invalidations only reach the process that made the
+write; other workers keep their entries until these are TIMEOUT seconds
+old.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+# ─── Flag bits ─────────────────────────────────────────────────────────────────
+VIEW = 1
+CREATE = 2
+EDIT = 4
+DELETE = 8
+
+FLAG_FIELDS = (
+    ('can_view', VIEW),
+    ('can_create', CREATE),
+    ('can_edit', EDIT),
+    ('can_delete', DELETE),
+)
+
+# DRF view actions → flag bit required to perform them
+ACTION_FLAGS = {
+    'list': VIEW,
+    'retrieve': VIEW,
+    'create': CREATE,
+    'update': EDIT,
+    'partial_update': EDIT,
+    'destroy': DELETE,
+}
+
+
+def pack_flags(can_view=False, can_create=False, can_edit=False, can_delete=False):
+    """
+    Packs the four boolean flags of a Permission row into one int.
+    """
+    return (
+        (VIEW if can_view else 0)
+        | (CREATE if can_create else 0)
+        | (EDIT if can_edit else 0)
+        | (DELETE if can_delete else 0)
+    )
+
+
+def unpack_flags(mask):
+    """
+    Inverse of pack_flags(): returns {'can_view': bool, ...}.
+    """
+    return {field: bool(mask & bit) for field, bit in FLAG_FIELDS}
+
+
+class PermissionMatrix:
+    """
+    Immutable page_id → flag bitmask mapping for a single user.
+    Pages without any granted flag are simply absent.
+    """
+    __slots__ = ('user_id', 'masks')
+
+    def __init__(self, user_id, masks):
+        self.user_id = user_id
+        self.masks = masks
+
+    def mask_for(self, page_id):
+        return self.masks.get(page_id, 0)
+
+    def allows(self, page_id, flag):
+        return bool(self.masks.get(page_id, 0) & flag)
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __repr__(self):
+        return f"<PermissionMatrix user={self.user_id} pages={len(self.masks)}>"
+
+
+def _matrix_queries(user_id):
+    from .models import Permission, Role, RoleGrant
+
+    roles = Role.objects.filter(Q(is_default=True) | Q(members__user_id=user_id)).values('pk')
+    grants = RoleGrant.objects.filter(role__in=roles, page_group__pages__isnull=False).values_list(
+        'page_group__pages', 'flags'
+    )
+    overrides = Permission.objects.filter(user_id=user_id).values_list(
+        'page_id', 'can_view', 'can_create', 'can_edit', 'can_delete'
+    )
+    return grants, overrides
+
+
+def resolve_masks(grants, overrides):
+    """
+    Effective {page_id: mask}: the union of the role grants on each page,
+    replaced by the user's own Permission row where there is one.
+    """
+    masks = {}
+    for page_id, flags in grants:
+        masks[page_id] = masks.get(page_id, 0) | flags
+    for page_id, can_view, can_create, can_edit, can_delete in overrides:
+        masks[page_id] = pack_flags(can_view, can_create, can_edit, can_delete)
+    return {page_id: mask for page_id, mask in masks.items() if mask}
+
+
+def compile_matrix(user_id):
+    """
+    Resolves the permissions of `user_id` from their roles and Permission
+    overrides, in two queries.
+    """
+    grants, overrides = _matrix_queries(user_id)
+    return PermissionMatrix(user_id, resolve_masks(grants, overrides))
+
+
+async def acompile_matrix(user_id):
+    """
+    compile_matrix() for async callers, using the async ORM.
+    """
+    grants, overrides = _matrix_queries(user_id)
+    grants = [row async for row in grants]
+    overrides = [row async for row in overrides]
+    return PermissionMatrix(user_id, resolve_masks(grants, overrides))
+
+
+# ─── Cache ─────────────────────────────────────────────────────────────────────
+class PermissionMatrixCache:
+    """
+    Two-level cache of compiled matrices.
+
+    Without `cache_alias` everything lives in this process: the LRU holds the
+    matrices and a plain dict holds the version counters. With `cache_alias`
+    the version counters and the compiled matrices are also stored in that
+    Django cache so several worker processes share invalidations.
+
+    LRU entries expire after `timeout` seconds either way: in process-local
+    mode that is how a change made in another worker reaches this one.
+    """
+
+    KEY_PREFIX = 'accounts:perm-matrix'
+
+    def __init__(self, maxsize=10000, cache_alias=None, timeout=3600):
+        self.maxsize = maxsize
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._user_versions = {}
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    # ── version tokens ──
+    def _generation_key(self):
+        return f'{self.KEY_PREFIX}:generation'
+
+    def _user_version_key(self, user_id):
+        return f'{self.KEY_PREFIX}:version:{user_id}'
+
+    def _matrix_key(self, user_id, token):
+        return f'{self.KEY_PREFIX}:matrix:{user_id}:{token[0]}:{token[1]}'
+
+    def _token(self, user_id):
+        shared = self.shared
+        if shared is None:
+            with self._lock:
+                return (self._generation, self._user_versions.get(user_id, 0))
+        gen_key, ver_key = self._generation_key(), self._user_version_key(user_id)
+        values = shared.get_many([gen_key, ver_key])
+        return (values.get(gen_key, 0), values.get(ver_key, 0))
+
+    @staticmethod
+    def _bump(shared, key):
+        try:
+            shared.incr(key)
+        except ValueError:
+            # Missing key: start a fresh counter. add() loses to a concurrent
+            # writer, in which case the key now exists and incr() succeeds.
+            if not shared.add(key, 1, timeout=None):
+                shared.incr(key)
+
+    # ── public API ──
+    def get(self, user_id):
+        """
+        Returns the compiled PermissionMatrix of `user_id`, compiling it on a miss.
+        """
+        token = self._token(user_id)
+
+        matrix = self._local(user_id, token)
+        if matrix is not None:
+            return matrix
+
+        shared = self.shared
+        matrix = None
+        if shared is not None:
+            masks = shared.get(self._matrix_key(user_id, token))
+            if masks is not None:
+                matrix = PermissionMatrix(user_id, masks)
+
+        if matrix is None:
+            matrix = compile_matrix(user_id)
+            if shared is not None:
+                shared.set(self._matrix_key(user_id, token), matrix.masks, self.timeout)
+
+        self._store(user_id, token, matrix)
+        return matrix
+
+    async def aget(self, user_id):
+        """
+        get() for async callers: shared-cache round trips and the compile
+        query go through the async cache / ORM APIs.
+        """
+        shared = self.shared
+        if shared is None:
+            token = self._token(user_id)
+        else:
+            gen_key, ver_key = self._generation_key(), self._user_version_key(user_id)
+            values = await shared.aget_many([gen_key, ver_key])
+            token = (values.get(gen_key, 0), values.get(ver_key, 0))
+
+        matrix = self._local(user_id, token)
+        if matrix is not None:
+            return matrix
+
+        matrix = None
+        if shared is not None:
+            masks = await shared.aget(self._matrix_key(user_id, token))
+            if masks is not None:
+                matrix = PermissionMatrix(user_id, masks)
+
+        if matrix is None:
+            matrix = await acompile_matrix(user_id)
+            if shared is not None:
+                await shared.aset(self._matrix_key(user_id, token), matrix.masks, self.timeout)
+
+        self._store(user_id, token, matrix)
+        return matrix
+
+    def _local(self, user_id, token):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != token:
+                return None
+            if entry[2] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def _store(self, user_id, token, matrix):
+        with self._lock:
+            self._entries[user_id] = (token, matrix, time.monotonic() + self.timeout)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        shared = self.shared
+        with self._lock:
+            self._entries.pop(user_id, None)
+            if shared is None:
+                self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+        if shared is not None:
+            self._bump(shared, self._user_version_key(user_id))
+
+    def invalidate_all(self):
+        shared = self.shared
+        with self._lock:
+            self._entries.clear()
+            if shared is None:
+                self._generation += 1
+                self._user_versions.clear()
+        if shared is not None:
+            self._bump(shared, self._generation_key())
+
+    def clear_local(self):
+        """
+        Drops the in-process entries only (used by tests).
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def _build_cache():
+    options = getattr(settings, 'PAGE_PERMISSION_CACHE', {})
+    return PermissionMatrixCache(
+        maxsize=options.get('MAXSIZE', 10000),
+        cache_alias=options.get('CACHE_ALIAS'),
+        timeout=options.get('TIMEOUT', 3600),
+    )
+
+
+matrix_cache = _build_cache()
+
+
+def get_permission_matrix(user_id):
+    return matrix_cache.get(user_id)
+
+
+async def aget_permission_matrix(user_id):
+    return await matrix_cache.aget(user_id)
+
+
+def invalidate_user(user_id):
+    matrix_cache.invalidate_user(user_id)
+
+
+def invalidate_all():
+    matrix_cache.invalidate_all()
@@ -1,11 +1,15 @@
 from rest_framework import permissions
-from .models import Permission as UserPermission, Page
+from .permission_cache import ACTION_FLAGS, get_permission_matrix
 
 class HasPagePermission(permissions.BasePermission):
     """
     Checks if the authenticated user has the appropriate permission
     (view/create/edit/delete) for the Page specified in the request.
     Expecting 'page_id' in URL kwargs or request data.
+
+    The check is a lookup in the user's compiled permission matrix
+    (see accounts/permission_cache.py), so it does not touch the database
+    once the matrix is cached.
     """
 
     def has_permission(self, request, view):
@@ -15,6 +19,10 @@ class HasPagePermission(permissions.BasePermission):
 
         # Determine action: map DRF view actions to our permission flags
         action = view.action  # e.g., 'list', 'retrieve', 'create', 'update', 'destroy'
+        flag = ACTION_FLAGS.get(action)
+        if flag is None:
+            return False
+
         page_id = None
 
         # We expect the view to provide page_id either via URL kwarg or query param
@@ -28,22 +36,14 @@ class HasPagePermission(permissions.BasePermission):
             return False  # cannot check permissions without knowing the page
 
         try:
-            page = Page.objects.get(pk=page_id)
-        except Page.DoesNotExist:
+            page_id = int(page_id)
+        except (TypeError, ValueError):
             return False
 
-        try:
-            perm = UserPermission.objects.get(user=request.user, page=page)
-        except UserPermission.DoesNotExist:
-            return False
-
-        if action == 'list' or action == 'retrieve':
-            return perm.can_view
-        elif action == 'create':
-            return perm.can_create
-        elif action in ('update', 'partial_update'):
-            return perm.can_edit
-        elif action == 'destroy':
-            return perm.can_delete
-
-        return False
+        # A deleted page cascades to its Permission rows, so an unknown page
+        # simply has no flags in the matrix. Token-backed users bring their
+        # matrix along in the token claims.
+        matrix = getattr(request.user, 'permission_matrix', None)
+        if matrix is None:
+            matrix = get_permission_matrix(request.user.pk)
+        return matrix.allows(page_id, flag)
@@ -0,0 +1,115 @@
+# accounts/query_planning.py
+
+"""
+Derives select_related / prefetch_related / only() from a serializer's
+declared fields so nested serializers don't issue one query per row.
+
+    plan_queryset(Comment.objects.filter(page_id=1), CommentSerializer)
+
+walks CommentSerializer: the nested `user` becomes select_related('user'),
+`histories` becomes a Prefetch whose own queryset is planned recursively
+(so `histories.modified_by` is joined in the same prefetch query), and the
+plain fields are collected for only().
+"""
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+
+
+class _Plan:
+    __slots__ = ('select', 'prefetch', 'only', 'can_defer')
+
+    def __init__(self):
+        self.select = []        # select_related() paths
+        self.prefetch = []      # (path, child model, child serializer class, fk name)
+        self.only = []          # only() paths
+        self.can_defer = True   # False when a field reads something we can't see
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _walk(plan, model, serializer, prefix):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        source = field.source
+        if source == '*' or '.' in source:
+            plan.can_defer = False
+            continue
+        model_field = _model_field(model, source)
+        path = prefix + source
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            if model_field is None or not isinstance(child, serializers.ModelSerializer):
+                plan.can_defer = False
+                continue
+            # Reverse FK: the child query must keep the FK back to us.
+            fk_name = model_field.field.name if model_field.one_to_many else None
+            plan.prefetch.append((path, child.Meta.model, type(child), fk_name))
+            continue
+
+        if model_field is None or not model_field.concrete:
+            # Properties / methods on the instance: leave the row whole.
+            plan.can_defer = False
+            continue
+
+        plan.only.append(path)
+        if isinstance(field, serializers.ModelSerializer) and model_field.is_relation:
+            plan.select.append(path)
+            _walk(plan, model_field.related_model, field, path + '__')
+
+
+@lru_cache(maxsize=None)
+def build_plan(model, serializer_class):
+    """
+    Returns the (cached) plan for serializing `model` rows with `serializer_class`.
+    """
+    plan = _Plan()
+    _walk(plan, model, serializer_class(), '')
+    return plan
+
+
+def plan_queryset(queryset, serializer_class, defer_unused=True, extra_only=()):
+    """
+    Applies the plan of `serializer_class` to `queryset`.
+    With `defer_unused`, columns the serializer never reads are left out.
+    """
+    plan = build_plan(queryset.model, serializer_class)
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    for path, child_model, child_class, fk_name in plan.prefetch:
+        child_qs = plan_queryset(
+            child_model._default_manager.all(),
+            child_class,
+            defer_unused=defer_unused,
+            extra_only=(fk_name,) if fk_name else (),
+        )
+        queryset = queryset.prefetch_related(Prefetch(path, queryset=child_qs))
+    if defer_unused and plan.can_defer and plan.only:
+        queryset = queryset.only(*plan.only, *extra_only)
+    return queryset
+
+
+class QueryPlanningMixin:
+    """
+    View mixin that plans the queryset from the view's serializer.
+    Columns are only deferred for safe (read) requests so that saving an
+    instance fetched through the planned queryset never skips a field.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return plan_queryset(
+            queryset,
+            self.get_serializer_class(),
+            defer_unused=self.request.method in permissions.SAFE_METHODS,
+        )
@@ -0,0 +1,251 @@
+# accounts/realtime.py
+
+"""
+Push channel for comment changes: Server-Sent Events per page.
+
+    GET /api/comments/stream/?page_id=3        (requires can_view on the page)
+    Authorization: Bearer <access token>
+    Last-Event-ID: <id>  or  ?cursor=<id>     resume after a reconnect
+
+After the commit of every comment create, edit (including the bulk
+CommentQuerySet paths) and delete, one event is published to the page's
+channel:
+
+    id: 5f3a9c01:1042
+    event: comment.created | comment.updated | comment.deleted
+    data: {"id": 7, "page": 3, ...}          (deleted: {"id": 7, "page": 3})
+
+The broker keeps the last REALTIME["BUFFER_SIZE"] events of every page, so
+a client that reconnects with the id of the last event it saw gets what it
+missed. When that is no longer possible (the events were evicted, the
+process restarted, or the client read too slowly) the stream sends
+`event: resync` with a fresh id instead: the client refetches the list
+once and carries on from there. A `: keep-alive` comment goes out every
+REALTIME["HEARTBEAT"] seconds, and the page permission is re-checked at
+the same time; a revoked viewer gets `event: revoked` and the stream ends.
+
+LocalBroker lives in the server process, so every subscriber of a page
+must be served by the process that handles the page's writes: one ASGI
+worker, or a shared broker (REALTIME["BROKER"] is the seam for one). The
+stream needs an ASGI server; WSGI servers would buffer it whole. Browsers'
+EventSource can't send an Authorization header, so the frontend reads the
+stream with fetch().
+"""
+
+import asyncio
+import json
+import secrets
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    "ENABLED": True,
+    "BROKER": "accounts.realtime.LocalBroker",
+    "BUFFER_SIZE": 200,  # events kept per page for resuming
+    "QUEUE_SIZE": 1000,  # undelivered events per subscriber before it must resync
+    "HEARTBEAT": 15,  # seconds between keep-alives / permission re-checks
+    "RETRY_MS": 3000,  # reconnect delay suggested to clients
+}
+
+CREATED = "comment.created"
+UPDATED = "comment.updated"
+DELETED = "comment.deleted"
+
+
+def realtime_setting(name):
+    return getattr(settings, "REALTIME", {}).get(name, DEFAULTS[name])
+
+
+# ─── Broker ────────────────────────────────────────────────────────────────────
+class Event:
+    __slots__ = ("seq", "frame")
+
+    def __init__(self, seq, frame):
+        self.seq = seq
+        self.frame = frame
+
+
+def sse_frame(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {data}\n\n".encode()
+
+
+class Subscription:
+    """
+    One stream's view of a page channel. `backlog` holds the buffered
+    events after the requested cursor; when some of them can't be replayed
+    `resync` is set and `cursor` is where the subscription starts instead.
+    A None in the queue means the subscriber fell QUEUE_SIZE events behind.
+    """
+
+    def __init__(self, page_id, loop, limit):
+        self.page_id = page_id
+        self.loop = loop
+        self.limit = limit
+        self.queue = asyncio.Queue()
+        self.backlog = []
+        self.resync = False
+        self.cursor = None
+        self.overflowed = False
+
+    def offer(self, event):
+        # runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.limit:
+            self.overflowed = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+
+
+class LocalBroker:
+    """
+    In-process fan-out with a per-page ring buffer. Events are numbered
+    with one sequence per process; ids are "<epoch>:<seq>", where the epoch
+    is random per broker so ids from before a restart are recognised.
+    """
+
+    def __init__(self, buffer_size=None, queue_size=None):
+        self.buffer_size = buffer_size or realtime_setting("BUFFER_SIZE")
+        self.queue_size = queue_size or realtime_setting("QUEUE_SIZE")
+        self.epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._buffers = {}  # page id → deque of Event
+        self._evicted = {}  # page id → seq of the newest event dropped from its buffer
+        self._subscribers = {}  # page id → set of Subscription
+
+    def cursor(self):
+        with self._lock:
+            return f"{self.epoch}:{self._seq}"
+
+    def publish(self, page_id, name, data):
+        """
+        Thread-safe; `data` is the JSON text of the event.
+        """
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, sse_frame(f"{self.epoch}:{self._seq}", name, data))
+            buffer = self._buffers.get(page_id)
+            if buffer is None:
+                buffer = self._buffers[page_id] = deque()
+            buffer.append(event)
+            if len(buffer) > self.buffer_size:
+                self._evicted[page_id] = buffer.popleft().seq
+            subscribers = list(self._subscribers.get(page_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:  # loop closed under a stream that never cleaned up
+                self.unsubscribe(subscription)
+
+    def subscribe(self, page_id, cursor):
+        """
+        Registers a subscription on the running event loop; events after
+        `cursor` that are still buffered become its backlog.
+        """
+        subscription = Subscription(page_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            after = self._parse(cursor)
+            if after is None or after < self._evicted.get(page_id, 0):
+                subscription.resync = True
+                subscription.cursor = f"{self.epoch}:{self._seq}"
+            else:
+                subscription.backlog = [e for e in self._buffers.get(page_id, ()) if e.seq > after]
+            self._subscribers.setdefault(page_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.page_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.page_id]
+
+    def subscriber_count(self, page_id):
+        with self._lock:
+            return len(self._subscribers.get(page_id, ()))
+
+    def _parse(self, cursor):
+        # seq after which to replay, or None when the cursor can't be honoured
+        epoch, _, seq = (cursor or "").partition(":")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(realtime_setting("BROKER"))()
+    return _broker
+
+
+def reset_broker():
+    """
+    Drops the broker and everything buffered in it (used by tests).
+    """
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+# ─── Publishing ────────────────────────────────────────────────────────────────
+def comment_payload(comment):
+    from .serializers import CommentEventSerializer
+
+    return json.dumps(CommentEventSerializer(comment).data, separators=(",", ":"), default=str)
+
+
+def publish_on_commit(page_id, name, data, using=None):
+    """
+    Publishes once the current transaction commits; rolled back writes
+    never reach subscribers.
+    """
+    if realtime_setting("ENABLED"):
+        transaction.on_commit(lambda: get_broker().publish(page_id, name, data), using=using)
+
+
+def publish_comment(comment, name, using=None):
+    # serialized after the commit: the save itself stays query-free even
+    # when the author isn't loaded
+    if realtime_setting("ENABLED"):
+        transaction.on_commit(
+            lambda: get_broker().publish(comment.page_id, name, comment_payload(comment)), using=using
+        )
+
+
+def publish_deleted(comment_id, page_id, using=None):
+    if realtime_setting("ENABLED"):
+        data = json.dumps({"id": comment_id, "page": page_id}, separators=(",", ":"))
+        publish_on_commit(page_id, DELETED, data, using)
+
+
+def publish_updated_comments(pks, using=None):
+    """
+    For the bulk paths: after the commit, loads the comments once and
+    publishes an update for each.
+    """
+    if not realtime_setting("ENABLED") or not pks:
+        return
+    pks = list(pks)
+
+    def publish():
+        from .models import Comment
+
+        broker = get_broker()
+        for comment in Comment._base_manager.using(using).filter(pk__in=pks).select_related("user"):
+            broker.publish(comment.page_id, UPDATED, comment_payload(comment))
+
+    transaction.on_commit(publish, using=using)
@@ -0,0 +1,138 @@
+# accounts/response_cache.py
+
+"""
+Cached list responses with strong ETags.
+
+Each cached model has a version counter in the cache that is bumped after
+every committed save/delete (see accounts/signals.py). CachedListMixin
+derives the ETag from (view, query params, permission scope, versions), so:
+
+- `If-None-Match` with the current ETag → 304, no query, no serialization;
+- otherwise the rendered JSON bytes are served from the cache when present,
+  and rendered + stored once when not.
+
+Stale entries are never invalidated explicitly; a bump changes the key and
+they age out after RESPONSE_CACHE["TIMEOUT"].
+
+A bump in a process-local LocMemCache never reaches the other workers,
+which would keep answering 304 with the old ETag; so nothing is cached or
+revalidated from one unless RESPONSE_CACHE["SINGLE_PROCESS"] says one
+process serves every request.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+    "SINGLE_PROCESS": False,  # True lets a LocMemCache back the versions
+}
+
+VERSION_KEY_PREFIX = "accounts:model-version"
+RESPONSE_KEY_PREFIX = "accounts:response"
+
+
+def response_cache_setting(name):
+    return getattr(settings, "RESPONSE_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[response_cache_setting("CACHE_ALIAS")]
+
+
+def cache_trusted():
+    """
+    False when a bump would only reach this process: the versions are in a
+    LocMemCache and SINGLE_PROCESS isn't set.
+    """
+    return response_cache_setting("SINGLE_PROCESS") or not isinstance(_cache(), LocMemCache)
+
+
+def _version_key(model):
+    return f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}"
+
+
+def model_versions(models):
+    """
+    Current version of each model, starting missing counters at the current
+    time in ms so a lost counter never reuses an old value.
+    """
+    cache = _cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def bump_model_version(model):
+    """
+    Bumps `model`'s version once the current transaction commits, so no
+    reader can cache pre-commit data under the new version.
+    """
+    def bump():
+        try:
+            _cache().incr(_version_key(model))
+        except ValueError:
+            pass  # no counter yet: the next reader starts a fresh one
+    transaction.on_commit(bump)
+
+
+class CachedListMixin:
+    """
+    Caches JSON list responses of the view. Set `cache_models` to every
+    model whose rows appear in the response.
+    """
+    cache_models = ()
+
+    def get_cache_scope(self, request):
+        # The lists cached so far don't depend on page permissions, only on
+        # whether the caller is a superuser.
+        return "superuser" if request.user.is_superuser else "user"
+
+    def list(self, request, *args, **kwargs):
+        if getattr(request.accepted_renderer, "format", None) != "json" or not cache_trusted():
+            return super().list(request, *args, **kwargs)
+
+        material = json.dumps([
+            type(self).__name__,
+            request.get_host(),  # pagination links are absolute URLs
+            sorted(request.query_params.lists()),
+            self.get_cache_scope(request),
+            model_versions(self.cache_models),
+        ])
+        digest = hashlib.sha256(material.encode("utf-8")).hexdigest()[:40]
+        etag = f'"{digest}"'
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            key = f"{RESPONSE_KEY_PREFIX}:{digest}"
+            content = _cache().get(key)
+            if content is None:
+                rendered = super().list(request, *args, **kwargs)
+                if rendered.status_code != 200:
+                    return rendered
+                content = JSONRenderer().render(rendered.data)
+                _cache().set(key, content, response_cache_setting("TIMEOUT"))
+            response = HttpResponse(content, content_type="application/json")
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Authorization",))
+        return response
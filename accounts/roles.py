@@ -0,0 +1,190 @@
+# accounts/roles.py
+
+"""
+Moving per-user Permission rows into roles.
+
+Effective permissions are resolved by permission_cache.compile_matrix():
+the union of the user's role grants (default roles included) on each page,
+replaced by the user's own Permission row where one exists. compact()
+rewrites the Permission table into that model without changing what
+anybody may do:
+
+- a row equal to what the user's roles already grant is dropped;
+- a row that only adds flags to the roles' is "liftable". Users whose
+  liftable rows are identical share a role ("auto:<digest>") granting
+  them, over one page group per distinct mask, and their rows go away;
+- a row that takes flags away from the roles' stays, as an override.
+
+Permission rows are streamed twice, ordered by user: once to count the
+distinct liftable matrices, once to collect the users of the matrices
+shared by at least `min_users` of them. Run it with writes paused
+(`python manage.py compact_permissions`); everything happens in one
+transaction.
+"""
+
+import hashlib
+from collections import defaultdict
+from itertools import groupby
+
+from django.db import transaction
+
+from . import permission_cache
+from .models import PageGroup, Permission, Role, RoleGrant, UserRole
+from .permission_cache import pack_flags
+
+AUTO_PREFIX = "auto:"
+
+
+def _digest(items):
+    return hashlib.blake2b(repr(items).encode(), digest_size=8).hexdigest()
+
+
+def _role_masks():
+    """
+    ({page_id: mask} of the default roles, {role_id: {page_id: mask}} of the others).
+    """
+    defaults, roles = {}, defaultdict(dict)
+    rows = RoleGrant.objects.filter(page_group__pages__isnull=False).values_list(
+        'role_id', 'role__is_default', 'page_group__pages', 'flags'
+    )
+    for role_id, is_default, page_id, flags in rows.iterator():
+        masks = defaults if is_default else roles[role_id]
+        masks[page_id] = masks.get(page_id, 0) | flags
+    return defaults, roles
+
+
+def _user_roles():
+    user_roles = defaultdict(list)
+    for user_id, role_id in UserRole.objects.values_list('user_id', 'role_id').iterator():
+        user_roles[user_id].append(role_id)
+    return user_roles
+
+
+def _classify(defaults, roles, user_roles):
+    """
+    Yields (user_id, liftable {page_id: mask}, redundant row pks) per user with Permission rows.
+    """
+    rows = Permission.objects.order_by('user_id', 'page_id').values_list(
+        'pk', 'user_id', 'page_id', 'can_view', 'can_create', 'can_edit', 'can_delete'
+    )
+    for user_id, user_rows in groupby(rows.iterator(), key=lambda row: row[1]):
+        granted = [roles[role_id] for role_id in user_roles.get(user_id, ())]
+        liftable, redundant = {}, []
+        for pk, _, page_id, *flags in user_rows:
+            mask = pack_flags(*flags)
+            base = defaults.get(page_id, 0)
+            for masks in granted:
+                base |= masks.get(page_id, 0)
+            if mask == base:
+                redundant.append(pk)
+            elif base & ~mask == 0:
+                liftable[page_id] = mask
+            # else: the row revokes flags a role grants; it stays
+        yield user_id, liftable, redundant
+
+
+def compact(min_users=2, batch_size=500, dry_run=False):
+    """
+    Returns {"users", "roles", "page_groups", "lifted", "redundant", "kept"}:
+    users moved onto roles, roles and page groups created, and Permission
+    rows lifted into roles / dropped / left in place.
+    """
+    with transaction.atomic():
+        defaults, roles = _role_masks()
+        user_roles = _user_roles()
+
+        counts = defaultdict(int)
+        for _, liftable, _ in _classify(defaults, roles, user_roles):
+            if liftable:
+                counts[_digest(sorted(liftable.items()))] += 1
+
+        shared = {}  # digest → (matrix, [user_id])
+        redundant = []
+        lifted = 0
+        for user_id, liftable, user_redundant in _classify(defaults, roles, user_roles):
+            redundant.extend(user_redundant)
+            if not liftable:
+                continue
+            digest = _digest(sorted(liftable.items()))
+            if counts[digest] < min_users:
+                continue
+            shared.setdefault(digest, (liftable, []))[1].append(user_id)
+            lifted += len(liftable)
+
+        total = Permission.objects.count()
+        stats = {
+            "users": sum(len(user_ids) for _, user_ids in shared.values()),
+            "roles": len(shared),
+            "page_groups": 0,
+            "lifted": lifted,
+            "redundant": len(redundant),
+            "kept": total - lifted - len(redundant),
+        }
+
+        grants = {}  # digest → {mask: frozenset(page_ids)}
+        for digest, (matrix, _) in shared.items():
+            by_mask = defaultdict(set)
+            for page_id, mask in matrix.items():
+                by_mask[mask].add(page_id)
+            grants[digest] = {mask: frozenset(page_ids) for mask, page_ids in by_mask.items()}
+        groups = {
+            AUTO_PREFIX + _digest(sorted(page_ids)): page_ids
+            for by_mask in grants.values() for page_ids in by_mask.values()
+        }
+        new_groups = set(groups) - set(PageGroup.objects.filter(name__in=groups).values_list('name', flat=True))
+        stats["page_groups"] = len(new_groups)
+        if dry_run:
+            return stats
+
+        _write(shared, grants, groups, new_groups, batch_size)
+        for start in range(0, len(redundant), batch_size):
+            _delete(Permission.objects.filter(pk__in=redundant[start:start + batch_size]))
+        # effective permissions are unchanged, but compiled matrices are
+        # dropped anyway; token claims stay valid
+        transaction.on_commit(permission_cache.invalidate_all)
+        return stats
+
+
+def _delete(queryset):
+    # A plain DELETE. QuerySet.delete() would load every row to send
+    # Permission's post_delete signal, whose receivers queue a matrix
+    # invalidation and an auth-version bump per row; compact() changes no
+    # effective permission and invalidates the matrices once instead.
+    # Nothing references Permission, so there is no cascade to miss.
+    return queryset._raw_delete(queryset.db)
+
+
+def _write(shared, grants, groups, new_groups, batch_size):
+    PageGroup.objects.bulk_create([PageGroup(name=name) for name in new_groups], batch_size=batch_size)
+    group_ids = dict(PageGroup.objects.filter(name__in=groups).values_list('name', 'pk'))
+    Through = PageGroup.pages.through
+    Through.objects.bulk_create(
+        [Through(pagegroup_id=group_ids[name], page_id=page_id) for name in new_groups for page_id in groups[name]],
+        batch_size=batch_size,
+    )
+
+    role_names = {AUTO_PREFIX + digest: digest for digest in shared}
+    Role.objects.bulk_create([Role(name=name) for name in role_names], batch_size=batch_size, ignore_conflicts=True)
+    role_ids = dict(Role.objects.filter(name__in=role_names).values_list('name', 'pk'))
+    RoleGrant.objects.bulk_create(
+        [
+            RoleGrant(
+                role_id=role_ids[name], page_group_id=group_ids[AUTO_PREFIX + _digest(sorted(page_ids))], flags=mask
+            )
+            for name, digest in role_names.items()
+            for mask, page_ids in grants[digest].items()
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+    for name, digest in role_names.items():
+        matrix, user_ids = shared[digest]
+        UserRole.objects.bulk_create(
+            [UserRole(user_id=user_id, role_id=role_ids[name]) for user_id in user_ids],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        pages = list(matrix)
+        for start in range(0, len(user_ids), batch_size):
+            _delete(Permission.objects.filter(user_id__in=user_ids[start:start + batch_size], page_id__in=pages))
@@ -0,0 +1,189 @@
+# accounts/search.py
+
+"""
+Text search over comments, comment history and products.
+
+SEARCH["BACKEND"] picks the implementation:
+
+- LikeSearchBackend (default) filters with `icontains` on the indexed
+  fields; it needs no index and works on every database.
+- SQLiteFTS5Backend matches against FTS5 virtual tables
+  (`accounts_<index>_fts`, rowid = primary key) created by migrations
+  0006 and 0007.
+  They are kept in sync by the signals in accounts/signals.py while the
+  backend is enabled; `python manage.py rebuild_search_index` re-populates
+  them after enabling it or after bulk writes that bypass signals.
+
+`filter()` narrows a queryset (the ?search= filter, the admin search box);
+`search()` returns one page of primary keys best match first, for the
+ranked /api/comments/search/ endpoint.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    "BACKEND": "accounts.search.LikeSearchBackend",
+}
+
+
+class SearchIndex:
+    """
+    Describes what gets indexed for one model.
+    """
+
+    def __init__(self, name, model_label, fields):
+        self.name = name
+        self.model_label = model_label
+        self.fields = tuple(fields)
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model(self.model_label)
+
+    @property
+    def table(self):
+        return f"accounts_{self.name}_fts"
+
+
+INDEXES = {
+    "comment": SearchIndex("comment", "accounts.Comment", ["content"]),
+    "comment_history": SearchIndex("comment_history", "accounts.CommentHistory", ["previous_content"]),
+    "product": SearchIndex("product", "accounts.Product", ["name", "description"]),
+}
+
+
+def index_for_model(model):
+    for index in INDEXES.values():
+        if index.model_label == model._meta.label:
+            return index
+    return None
+
+
+def fts5_query(term):
+    """
+    Turns free text into a safe FTS5 query: every word is quoted (so FTS
+    operators in user input are inert), prefix-matched and AND-ed.
+    """
+    words = re.findall(r"\w+", term)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class BaseSearchBackend:
+    #: True when the backend keeps its own index that writes must update
+    maintains_index = False
+
+    def filter(self, queryset, index, term):
+        """
+        Narrows `queryset` to rows of `index` matching `term`.
+        """
+        raise NotImplementedError
+
+    def search(self, queryset, index, term, limit, offset=0):
+        """
+        One page of `queryset` rows matching `term`, best match first, as a
+        list of (pk, score) pairs; a higher score is a better match.
+        """
+        raise NotImplementedError
+
+    def index(self, index, objs):
+        pass
+
+    def remove(self, index, pks):
+        pass
+
+    def rebuild(self, index, batch_size=1000):
+        return 0
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    def filter(self, queryset, index, term):
+        condition = Q()
+        for word in term.split():
+            any_field = Q()
+            for field in index.fields:
+                any_field |= Q(**{f"{field}__icontains": word})
+            condition &= any_field
+        return queryset.filter(condition)
+
+    def search(self, queryset, index, term, limit, offset=0):
+        # no relevance to rank by: newest first
+        pks = self.filter(queryset, index, term).order_by("-pk").values_list("pk", flat=True)
+        return [(pk, None) for pk in pks[offset:offset + limit]]
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    maintains_index = True
+
+    def _connection(self, index):
+        return connections[router.db_for_write(index.model)]
+
+    def filter(self, queryset, index, term):
+        query = fts5_query(term)
+        if not query:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s", [query]
+        ))
+
+    def search(self, queryset, index, term, limit, offset=0):
+        query = fts5_query(term)
+        if not query:
+            return []
+        # Rank inside the FTS table, restricted to the rows `queryset` allows;
+        # bm25() is negative and lower is better.
+        allowed_sql, allowed_params = queryset.values("pk").query.sql_with_params()
+        sql = (
+            f"SELECT rowid, bm25({index.table}) AS rank FROM {index.table} "
+            f"WHERE {index.table} MATCH %s AND rowid IN ({allowed_sql}) "
+            f"ORDER BY rank, rowid DESC LIMIT %s OFFSET %s"
+        )
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, [query, *allowed_params, limit, offset])
+            return [(pk, -rank) for pk, rank in cursor.fetchall()]
+
+    def index(self, index, objs):
+        objs = list(objs)
+        if not objs:
+            return
+        self.remove(index, [obj.pk for obj in objs])
+        columns = ", ".join(index.fields)
+        placeholders = ", ".join(["%s"] * (len(index.fields) + 1))
+        with self._connection(index).cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {index.table} (rowid, {columns}) VALUES ({placeholders})",
+                [[obj.pk, *(getattr(obj, field) or "" for field in index.fields)] for obj in objs],
+            )
+
+    def remove(self, index, pks):
+        pks = list(pks)
+        if not pks:
+            return
+        with self._connection(index).cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {index.table} WHERE rowid = %s", [[pk] for pk in pks])
+
+    def rebuild(self, index, batch_size=1000):
+        with self._connection(index).cursor() as cursor:
+            cursor.execute(f"DELETE FROM {index.table}")
+        count = 0
+        batch = []
+        for obj in index.model._base_manager.only("pk", *index.fields).iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                self.index(index, batch)
+                count += len(batch)
+                batch = []
+        self.index(index, batch)
+        return count + len(batch)
+
+
+def get_search_backend():
+    path = getattr(settings, "SEARCH", {}).get("BACKEND", DEFAULTS["BACKEND"])
+    return import_string(path)()
+
@@ -1,5 +1,15 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import User, Permission, Page, Comment, CommentHistory
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import User, Permission, Page, PageActivity, Comment, CommentHistory
+from . import comment_ingest, login_throttle, permission_cache
+from . import otp as otp_store
+from .authentication import bump_auth_version, stamp_claims
+from .outbox import enqueue_mail
+from .token_blacklist import BlacklistRefreshToken
 from django.contrib.auth.password_validation import validate_password
 
 # accounts/serializers.py
@@ -23,19 +33,61 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = BlacklistRefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
 
-        # Add custom claims
-        token["username"] = user.username
-        token["is_superuser"] = user.is_superuser
-        # (Optionally add any other fields you need here)
+        # Add custom claims: username, is_superuser, plus the auth version and
+        # compiled page permissions used by StatelessJWTAuthentication
+        stamp_claims(token, user)
         return token
 
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-stamps the claims on the new access token: the refresh token still
+    carries the ones from login, which may be stale by now. The old refresh
+    token is blacklisted and the new one recorded in one transaction (see
+    accounts/token_blacklist.py).
+    """
+    token_class = BlacklistRefreshToken
+
+    def validate(self, attrs):
+        try:
+            with transaction.atomic():
+                data = super().validate(attrs)
+                access = AccessToken(data["access"], verify=False)
+                user = User.objects.get(**{jwt_settings.USER_ID_FIELD: access[jwt_settings.USER_ID_CLAIM]})
+        except User.DoesNotExist:
+            # deleted since the token was issued (simplejwt's own lookup
+            # raises this too): the rotation is rolled back
+            raise AuthenticationFailed("User not found.", code="user_not_found")
+        access.payload.pop("perms", None)
+        stamp_claims(access, user)
+        data["access"] = str(access)
+        return data
+
 class MyTokenObtainPairView(TokenObtainPairView):
+    """
+    Failed logins are throttled per username and client IP before any
+    password is hashed (see accounts/login_throttle.py); a stored hash
+    older than the configured hasher profile is upgraded by authenticate().
+    """
     serializer_class = MyTokenObtainPairSerializer
 
+    def post(self, request, *args, **kwargs):
+        username = request.data.get(User.USERNAME_FIELD)
+        username = username if isinstance(username, str) else ""
+        login_throttle.check(request, username)
+        try:
+            response = super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            login_throttle.record_failure(request, username)
+            raise
+        login_throttle.record_success(request, username)
+        return response
+
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -84,6 +136,15 @@ class PageSerializer(serializers.ModelSerializer):
         model = Page
         fields = ('id', 'name')
 
+class PageActivitySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='page_id', read_only=True)
+    name = serializers.CharField(source='page.name', read_only=True)
+
+    class Meta:
+        model = PageActivity
+        fields = ('id', 'name', 'comment_count', 'commenter_count', 'edit_count', 'last_comment_at')
+        read_only_fields = fields
+
 class PermissionSerializer(serializers.ModelSerializer):
     page = PageSerializer(read_only=True)
     page_id = serializers.PrimaryKeyRelatedField(
@@ -95,6 +156,90 @@ class PermissionSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'page', 'page_id', 'can_view', 'can_create', 'can_edit', 'can_delete')
         read_only_fields = ('id', 'user', 'page')
 
+class PermissionGrantSerializer(serializers.Serializer):
+    """
+    One block of a bulk grant: every user in `users` × every page in `pages`.
+    Flags that are left out keep their current value (False for new rows).
+    """
+    users = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    pages = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    can_view = serializers.BooleanField(required=False)
+    can_create = serializers.BooleanField(required=False)
+    can_edit = serializers.BooleanField(required=False)
+    can_delete = serializers.BooleanField(required=False)
+
+
+class PermissionBulkSerializer(serializers.Serializer):
+    """
+    Applies a users × pages × flags matrix with a single upsert against the
+    unique (user, page) constraint, inside one transaction.
+    """
+    FLAGS = ('can_view', 'can_create', 'can_edit', 'can_delete')
+    MAX_ROWS = 100000
+
+    grants = PermissionGrantSerializer(many=True, allow_empty=False)
+
+    def validate_grants(self, value):
+        total = sum(len(block['users']) * len(block['pages']) for block in value)
+        if total > self.MAX_ROWS:
+            raise serializers.ValidationError(f"At most {self.MAX_ROWS} (user, page) pairs per request.")
+        return value
+
+    def save(self):
+        grants = self.validated_data['grants']
+        user_ids = {u for block in grants for u in block['users']}
+        page_ids = {p for block in grants for p in block['pages']}
+        known_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        known_pages = set(Page.objects.filter(pk__in=page_ids).values_list('pk', flat=True))
+
+        # Merge the blocks in order: later blocks win for the flags they set.
+        requested = {}
+        for block in grants:
+            flags = {name: block[name] for name in self.FLAGS if name in block}
+            for user_id in block['users']:
+                for page_id in block['pages']:
+                    requested.setdefault((user_id, page_id), {}).update(flags)
+
+        valid = {
+            pair: flags for pair, flags in requested.items()
+            if pair[0] in known_users and pair[1] in known_pages
+        }
+
+        results = []
+        with transaction.atomic():
+            existing = {
+                (row[0], row[1]): dict(zip(self.FLAGS, row[2:]))
+                for row in Permission.objects.select_for_update()
+                .filter(user_id__in={u for u, _ in valid}, page_id__in={p for _, p in valid})
+                .values_list('user_id', 'page_id', *self.FLAGS)
+            }
+            rows = []
+            for (user_id, page_id), flags in requested.items():
+                result = {'user': user_id, 'page': page_id}
+                if user_id not in known_users:
+                    result.update(status='error', detail='Unknown user.')
+                elif page_id not in known_pages:
+                    result.update(status='error', detail='Unknown page.')
+                else:
+                    current = existing.get((user_id, page_id), dict.fromkeys(self.FLAGS, False))
+                    rows.append(Permission(user_id=user_id, page_id=page_id, **{**current, **flags}))
+                    result['status'] = 'updated' if (user_id, page_id) in existing else 'created'
+                results.append(result)
+            Permission.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['user', 'page'],
+                update_fields=list(self.FLAGS),
+            )
+            # bulk_create() sends no signals; drop the affected matrices and
+            # token claims ourselves.
+            for user_id in {u for u, _ in valid}:
+                transaction.on_commit(lambda user_id=user_id: permission_cache.invalidate_user(user_id))
+                transaction.on_commit(lambda user_id=user_id: bump_auth_version(user_id))
+
+        return results
+
+
 class CommentHistorySerializer(serializers.ModelSerializer):
     modified_by = UserSerializer(read_only=True)
 
@@ -111,17 +256,42 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ('id', 'page', 'user', 'content', 'created_at', 'updated_at', 'histories')
         read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'histories')
 
-# accounts/serializers.py (continued)
+class CommentEventSerializer(CommentSerializer):
+    """
+    A comment as pushed to stream subscribers: no history, so publishing
+    costs no queries once the author is loaded.
+    """
+    class Meta(CommentSerializer.Meta):
+        fields = ('id', 'page', 'user', 'content', 'created_at', 'updated_at')
+        read_only_fields = fields
 
-import random
-from django.core.mail import send_mail
-from django.utils import timezone
-from datetime import timedelta
+class CommentBatchItemSerializer(serializers.Serializer):
+    """
+    One item of a batch; the page is checked by comment_ingest with one
+    query for the whole batch.
+    """
+    page = serializers.IntegerField(min_value=1)
+    content = serializers.CharField()
+
+class CommentBatchSerializer(serializers.Serializer):
+    """
+    Creates many comments with one insert (accounts/comment_ingest.py);
+    invalid or forbidden items are reported per item.
+    """
+    MAX_ITEMS = 1000
+
+    comments = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=MAX_ITEMS)
+
+    def save(self, user):
+        return comment_ingest.ingest(user, self.validated_data['comments'], CommentBatchItemSerializer)
+
+# accounts/serializers.py (continued)
 
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
     def validate_email(self, value):
+        otp_store.check_rate_limit(value, 'request', otp_store.otp_setting('RATE_LIMIT'))
         if not User.objects.filter(email=value).exists():
             raise serializers.ValidationError("User with this email does not exist.")
         return value
@@ -129,22 +299,20 @@ class PasswordResetRequestSerializer(serializers.Serializer):
     def save(self):
         email = self.validated_data['email']
         user = User.objects.get(email=email)
-        otp = random.randint(100000, 999999)
 
-        # store OTP & expiry in a simple model or cache
-        # For simplicity, use a one‐time model:
+        # store OTP & expiry in the configured OTP store (DB table or cache)
+        ttl = otp_store.otp_setting('TTL')
+        otp = otp_store.get_otp_store().issue(user, ttl)
 
-        from .models import PasswordResetOTP
-        otp_entry = PasswordResetOTP.objects.create(user=user, otp=otp,
-                           expires_at=timezone.now() + timedelta(minutes=15))
-        # Send email – configure your EMAIL_* settings in settings.py
-        send_mail(
+        # Queue the email – the `send_queued_mail` worker delivers it using
+        # the EMAIL_* settings in settings.py
+        enqueue_mail(
             subject="Your password reset OTP",
-            message=f"Your OTP is {otp}. It expires in 15 minutes.",
+            message=f"Your OTP is {otp}. It expires in {ttl // 60} minutes.",
             from_email="no‐reply@yourdomain.com",
             recipient_list=[email]
         )
-        return otp_entry
+        return otp
 
 class PasswordResetVerifySerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -154,19 +322,17 @@ class PasswordResetVerifySerializer(serializers.Serializer):
     def validate(self, attrs):
         email = attrs.get('email')
         otp = attrs.get('otp')
+        otp_store.check_rate_limit(email, 'verify', otp_store.otp_setting('VERIFY_RATE_LIMIT'))
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
             raise serializers.ValidationError("Invalid email or OTP.")
-        from .models import PasswordResetOTP
-        try:
-            otp_entry = PasswordResetOTP.objects.get(user=user, otp=otp)
-        except PasswordResetOTP.DoesNotExist:
+        result = otp_store.get_otp_store().check(user, otp)
+        if result == otp_store.INVALID:
             raise serializers.ValidationError("Invalid OTP.")
-        if otp_entry.expires_at < timezone.now():
+        if result == otp_store.EXPIRED:
             raise serializers.ValidationError("OTP has expired.")
         attrs['user'] = user
-        attrs['otp_entry'] = otp_entry
         return attrs
 
     def save(self):
@@ -175,6 +341,6 @@ class PasswordResetVerifySerializer(serializers.Serializer):
         validate_password(new_password)  # run Django’s password validators
         user.set_password(new_password)
         user.save()
-        # Delete OTP entry
-        self.validated_data['otp_entry'].delete()
+        # Invalidate every outstanding OTP of this user
+        otp_store.get_otp_store().consume(user)
         return user
@@ -1,19 +1,226 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Comment, CommentHistory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import page_activity, permission_cache, realtime, token_blacklist
+from .authentication import bump_auth_generation, bump_auth_version
+from .metrics import install_execute_wrapper, metrics_setting
+from .models import (
+    Comment, CommentHistory, Page, PageActivity, PageGroup, Permission, Product, Role, RoleGrant, User, UserRole,
+)
+from .response_cache import bump_model_version
+from .search import get_search_backend, index_for_model
 
 @receiver(pre_save, sender=Comment)
-def track_comment_edit(sender, instance, **kwargs):
+def track_comment_edit(sender, instance, update_fields=None, **kwargs):
     if not instance.pk:
         return  # New comment; no history yet
-    try:
-        original = Comment.objects.get(pk=instance.pk)
-    except Comment.DoesNotExist:
+    if update_fields is not None and 'content' not in update_fields:
         return
-    if original.content != instance.content:
+    if hasattr(instance, '_loaded_content'):
+        previous = instance._loaded_content
+    else:
+        # Instance wasn't loaded from the database (or content was deferred):
+        # fall back to reading just the stored content.
+        previous = (
+            Comment._base_manager.filter(pk=instance.pk)
+            .values_list('content', flat=True)
+            .first()
+        )
+        if previous is None:
+            return
+    if previous != instance.content:
         # Create history before saving the new content
         CommentHistory.objects.create(
-            comment=original,
-            previous_content=original.content,
-            modified_by=instance.user,  # assumes `user` on instance is the editor
+            comment_id=instance.pk,
+            previous_content=previous,
+            modified_by_id=instance.user_id,  # assumes `user` on instance is the editor
+        )
+
+
+# ─── Permission matrix invalidation ────────────────────────────────────────────
+# Invalidation waits for the commit: a request compiling the matrix between
+# the bump and the commit would read the old rows and cache them under the
+# new version.
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permission_matrix(sender, instance, using=None, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: permission_cache.invalidate_user(user_id), using=using)
+    transaction.on_commit(lambda: bump_auth_version(user_id), using=using)  # token-embedded permissions too
+
+
+@receiver(post_delete, sender=Page)
+def invalidate_all_permission_matrices(sender, instance, using=None, **kwargs):
+    # Deleting a page cascades to Permission rows of many users at once;
+    # bump the global generation instead of chasing every user.
+    transaction.on_commit(permission_cache.invalidate_all, using=using)
+
+
+# ─── Roles and page groups ─────────────────────────────────────────────────────
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def invalidate_user_role(sender, instance, using=None, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: permission_cache.invalidate_user(user_id), using=using)
+    transaction.on_commit(lambda: bump_auth_version(user_id), using=using)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=RoleGrant)
+@receiver(post_delete, sender=RoleGrant)
+@receiver(post_delete, sender=PageGroup)
+def invalidate_role_matrices(sender, using=None, **kwargs):
+    # A role or page group may reach every user (default roles always do):
+    # bump the global generations rather than look up its members.
+    transaction.on_commit(permission_cache.invalidate_all, using=using)
+    transaction.on_commit(bump_auth_generation, using=using)
+
+
+@receiver(m2m_changed, sender=PageGroup.pages.through)
+def invalidate_page_group_pages(sender, action, using=None, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(permission_cache.invalidate_all, using=using)
+        transaction.on_commit(bump_auth_generation, using=using)
+
+
+# ─── Token claim invalidation ──────────────────────────────────────────────────
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_token_claims(sender, instance, using=None, **kwargs):
+    # is_superuser / is_active / username may have changed: tokens minted
+    # before this point must be re-checked against the database.
+    user_id = instance.pk
+    transaction.on_commit(lambda: bump_auth_version(user_id), using=using)
+
+
+# ─── Response cache versions ───────────────────────────────────────────────────
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_response_cache_version(sender, instance, **kwargs):
+    bump_model_version(sender)
+
+
+# ─── Full-text index sync ──────────────────────────────────────────────────────
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=CommentHistory)
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend.maintains_index:
+        backend.index(index_for_model(sender), [instance])
+
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=CommentHistory)
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend.maintains_index:
+        backend.remove(index_for_model(sender), [instance.pk])
+
+
+# ─── Request metrics ───────────────────────────────────────────────────────────
+@receiver(connection_created)
+def install_metrics_execute_wrapper(sender, connection, **kwargs):
+    if metrics_setting("ENABLED"):
+        install_execute_wrapper(connection)
+
+
+# ─── Page activity counters ────────────────────────────────────────────────────
+@receiver(post_save, sender=Page)
+def create_page_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        PageActivity.objects.get_or_create(page=instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    # Comment.save() is atomic: the counters commit with the row
+    if created and not raw:
+        page_activity.comment_added(instance.page_id, instance.user_id, instance.created_at)
+
+
+@receiver(pre_save, sender=Comment)
+def move_comment_activity(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Registered after track_comment_edit, so an edit recorded by this same
+    # save is already counted on the old page and moves along with the rest.
+    if not instance.pk or raw:
+        return
+    if update_fields is not None and not {'page', 'user'}.intersection(update_fields):
+        return
+    owner = getattr(instance, '_loaded_owner', None)
+    if owner is None:
+        owner = Comment._base_manager.filter(pk=instance.pk).values_list('page_id', 'user_id').first()
+        if owner is None:
+            return
+    if owner == (instance.page_id, instance.user_id):
+        return
+    edits = page_activity.edit_count(instance.pk)
+    page_activity.comment_removed(*owner, instance.pk, edits=edits)
+    page_activity.comment_added(instance.page_id, instance.user_id, instance.created_at, edits=edits)
+
+
+@receiver(post_save, sender=CommentHistory)
+def count_comment_edit(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        page_activity.edits_added_for_comment(instance.comment_id)
+
+
+@receiver(pre_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    # Deletes run in one transaction with their pre_delete signals; the
+    # comment's edits are counted here, before the cascade removes them.
+    if origin is None or origin is instance:
+        page_activity.comment_removed(
+            instance.page_id, instance.user_id, instance.pk, edits=page_activity.edit_count(instance.pk)
         )
+        return
+    if isinstance(origin, Page) or getattr(origin, 'model', None) is Page:
+        return  # the page's activity rows are deleted along with it
+    # A queryset delete or a cascade (e.g. from a user): every pre_delete is
+    # sent before the first row goes, every post_delete after the comment
+    # rows are gone, so the pages are rebuilt once, after the last one.
+    pending = origin.__dict__.setdefault('_page_activity_pending', [0, set()])
+    pending[0] += 1
+    pending[1].add(instance.page_id)
+
+
+@receiver(post_delete, sender=Comment)
+def recount_deleted_comments(sender, instance, origin=None, **kwargs):
+    pending = getattr(origin, '_page_activity_pending', None)
+    if pending is None:
+        return
+    pending[0] -= 1
+    if not pending[0]:
+        del origin._page_activity_pending
+        page_activity.rebuild(pending[1])
+
+
+# ─── Comment stream events ─────────────────────────────────────────────────────
+@receiver(post_save, sender=Comment)
+def publish_comment_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    old_page_id = getattr(instance, '_loaded_owner', (instance.page_id,))[0]
+    if not created and old_page_id != instance.page_id:
+        realtime.publish_deleted(instance.pk, old_page_id, using)
+    realtime.publish_comment(instance, realtime.CREATED if created else realtime.UPDATED, using)
+
+
+@receiver(post_delete, sender=Comment)
+def publish_comment_deleted(sender, instance, using=None, **kwargs):
+    realtime.publish_deleted(instance.pk, instance.page_id, using)
+
+
+# ─── Refresh-token blacklist ───────────────────────────────────────────────────
+@receiver(post_save, sender=BlacklistedToken)
+def announce_blacklisted_token(sender, instance, created, raw=False, using=None, **kwargs):
+    # Other processes load the new row into their bloom filters on their next check.
+    if created and not raw:
+        transaction.on_commit(token_blacklist.bump_epoch, using=using)
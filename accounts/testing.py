@@ -0,0 +1,54 @@
+# accounts/testing.py
+
+"""
+Test helpers for keeping query counts in check.
+
+    class CommentListTests(QueryCountAssertionsMixin, APITestCase):
+        def test_no_n_plus_one(self):
+            self.assertQueryCountConstant(
+                lambda: self.client.get("/api/comments/?page_id=1"),
+                grow=lambda: make_comments(10),
+            )
+"""
+
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin with query-budget assertions.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, limit, using=DEFAULT_DB_ALIAS):
+        """
+        Fails when the block runs more than `limit` queries.
+        """
+        with CaptureQueriesContext(connections[using]) as captured:
+            yield captured
+        executed = len(captured.captured_queries)
+        if executed > limit:
+            queries = "\n".join(
+                f"{i}. {q['sql']}" for i, q in enumerate(captured.captured_queries, start=1)
+            )
+            self.fail(f"{executed} queries executed, at most {limit} expected.\nCaptured queries were:\n{queries}")
+
+    def assertQueryCountConstant(self, func, grow, using=DEFAULT_DB_ALIAS):
+        """
+        Runs `func`, calls `grow()` to add more rows, runs `func` again and
+        fails if the second run needed more queries: the signature of an N+1.
+        """
+        with CaptureQueriesContext(connections[using]) as before:
+            func()
+        grow()
+        with CaptureQueriesContext(connections[using]) as after:
+            func()
+        self.assertEqual(
+            len(after.captured_queries),
+            len(before.captured_queries),
+            "Query count grew with the number of rows:\n"
+            + "\n".join(q["sql"] for q in after.captured_queries),
+        )
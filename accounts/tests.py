@@ -1,3 +1,1437 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.database import database_config
+from backend.passwords import hasher_costs, password_hashers
+
+from .models import (
+    User, Page, PageActivity, Permission, Comment, CommentHistory, OutboundEmail, PasswordResetOTP, Product,
+    PageGroup, Role, RoleGrant, UserRole,
+)
+from . import bulk_import, comment_ingest, page_activity, realtime, roles, token_blacklist
+from .group_commit import GroupCommitter
+from .outbox import drain_outbox
+from . import metrics
+from . import otp as otp_store
+from .permission_cache import (
+    CREATE, DELETE, EDIT, VIEW, PermissionMatrixCache, compile_matrix, matrix_cache, pack_flags,
+)
+from .permissions import HasPagePermission
+from .testing import QueryCountAssertionsMixin
+
+
+class PermissionMatrixCacheTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.other_page = Page.objects.create(name="Users")
+
+    def _check(self, action, page_id):
+        request = APIRequestFactory().get("/", {"page_id": page_id})
+        request.user = self.user
+        request.parser_context = {"kwargs": {"page_id": page_id}}
+        request.data = {}
+        return HasPagePermission().has_permission(request, SimpleNamespace(action=action))
+
+    def test_pack_flags(self):
+        self.assertEqual(pack_flags(True, False, True, False), VIEW | EDIT)
+
+    def test_check_is_served_from_cache(self):
+        Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.assertTrue(self._check("list", self.page.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(self._check("retrieve", self.page.id))
+            self.assertFalse(self._check("create", self.page.id))
+            self.assertFalse(self._check("list", self.other_page.id))
+
+    def test_permission_change_invalidates(self):
+        perm = Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.assertFalse(self._check("create", self.page.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            perm.can_create = True
+            perm.save()
+            # not before the commit: a concurrent compile would cache the old rows
+            self.assertFalse(self._check("create", self.page.id))
+        self.assertTrue(self._check("create", self.page.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            perm.delete()
+        self.assertFalse(self._check("list", self.page.id))
+
+    def test_page_delete_invalidates(self):
+        Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.assertTrue(self._check("list", self.page.id))
+        page_id = self.page.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.delete()
+        self.assertFalse(self._check("list", page_id))
+
+    def test_lru_eviction(self):
+        cache = PermissionMatrixCache(maxsize=1)
+        other = User.objects.create_user(username="bob", email="bob@example.com", password="x")
+        Permission.objects.create(user=other, page=self.page, can_create=True)
+        cache.get(self.user.id)
+        self.assertTrue(cache.get(other.id).allows(self.page.id, CREATE))
+        self.assertEqual(list(cache._entries), [other.id])
+
+    def test_local_entries_expire(self):
+        # Two process-local caches stand in for two workers without a shared cache.
+        first = PermissionMatrixCache(timeout=60)
+        second = PermissionMatrixCache(timeout=60)
+        perm = Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.assertTrue(second.get(self.user.id).allows(self.page.id, VIEW))
+        perm.delete()
+        first.invalidate_user(self.user.id)
+        self.assertTrue(second.get(self.user.id).allows(self.page.id, VIEW))
+        with mock.patch("accounts.permission_cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertFalse(second.get(self.user.id).allows(self.page.id, VIEW))
+
+    def test_shared_cache_invalidation_reaches_other_processes(self):
+        # Two cache instances stand in for two worker processes sharing "default".
+        first = PermissionMatrixCache(cache_alias="default")
+        second = PermissionMatrixCache(cache_alias="default")
+        perm = Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.assertFalse(second.get(self.user.id).allows(self.page.id, EDIT))
+        perm.can_edit = True
+        perm.save()
+        first.invalidate_user(self.user.id)
+        self.assertTrue(second.get(self.user.id).allows(self.page.id, EDIT))
+
+
+class RolePermissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        matrix_cache.clear_local()
+        self.users = [
+            User.objects.create_user(username=name, email=f"{name}@example.com", password="x")
+            for name in ("alice", "bob", "carol")
+        ]
+        self.pages = [Page.objects.create(name=f"Page {i}") for i in range(4)]
+        self.group = PageGroup.objects.create(name="Catalog")
+        self.group.pages.set(self.pages[:2])
+        self.editor = Role.objects.create(name="Editor")
+        RoleGrant.objects.create(role=self.editor, page_group=self.group, flags=VIEW | EDIT)
+
+    def test_roles_defaults_and_overrides_resolve(self):
+        alice, bob, _ = self.users
+        UserRole.objects.create(user=alice, role=self.editor)
+        everyone = Role.objects.create(name="Everyone", is_default=True)
+        public = PageGroup.objects.create(name="Public")
+        public.pages.add(self.pages[3])
+        RoleGrant.objects.create(role=everyone, page_group=public, flags=VIEW)
+        Permission.objects.create(user=alice, page=self.pages[1])  # revokes the role's flags
+        Permission.objects.create(user=alice, page=self.pages[2], can_create=True)
+        self.assertEqual(compile_matrix(alice.id).masks, {
+            self.pages[0].id: VIEW | EDIT, self.pages[2].id: CREATE, self.pages[3].id: VIEW,
+        })
+        self.assertEqual(compile_matrix(bob.id).masks, {self.pages[3].id: VIEW})
+
+    @override_settings(STATELESS_JWT={"SINGLE_PROCESS": True})
+    def test_role_changes_invalidate_matrices_and_claims(self):
+        alice = self.users[0]
+        UserRole.objects.create(user=alice, role=self.editor)
+        self.assertTrue(matrix_cache.get(alice.id).allows(self.pages[0].id, EDIT))
+        client = APIClient()
+        token = client.post("/api/token/", {"username": "alice", "password": "x"}, format="json").data["access"]
+        self.assertEqual(AccessToken(token)["perms"], f"{self.pages[0].id}:{VIEW | EDIT},{self.pages[1].id}:{VIEW | EDIT}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.pages.add(self.pages[2])
+            self.assertFalse(matrix_cache.get(alice.id).allows(self.pages[2].id, VIEW))  # until the commit
+        self.assertTrue(matrix_cache.get(alice.id).allows(self.pages[2].id, VIEW))
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get("/api/comments/", {"page_id": self.pages[2].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(captured.captured_queries), 2)  # stale claims: user row + comments
+        with self.captureOnCommitCallbacks(execute=True):
+            RoleGrant.objects.get(role=self.editor).delete()
+        self.assertFalse(matrix_cache.get(alice.id).allows(self.pages[0].id, VIEW))
+
+    def test_compaction_keeps_effective_permissions(self):
+        alice, bob, carol = self.users
+        UserRole.objects.create(user=carol, role=self.editor)
+        for user in (alice, bob):
+            Permission.objects.create(user=user, page=self.pages[0], can_view=True, can_delete=True)
+            Permission.objects.create(user=user, page=self.pages[2], can_view=True)
+            Permission.objects.create(user=user, page=self.pages[3], can_view=True)
+        Permission.objects.create(user=alice, page=self.pages[1])  # nothing to revoke: redundant
+        Permission.objects.create(user=carol, page=self.pages[0], can_view=True)  # revokes EDIT: kept
+        Permission.objects.create(user=carol, page=self.pages[1], can_view=True, can_edit=True)  # redundant
+        before = {user.id: compile_matrix(user.id).masks for user in self.users}
+
+        self.assertEqual(roles.compact(dry_run=True)["lifted"], 6)
+        self.assertEqual(Permission.objects.count(), 9)
+        with self.captureOnCommitCallbacks() as callbacks:
+            stats = roles.compact()
+        self.assertEqual(len(callbacks), 1)  # one invalidate_all, no per-row receivers
+        self.assertEqual((stats["users"], stats["roles"], stats["redundant"], stats["kept"]), (2, 1, 2, 1))
+        self.assertEqual(Permission.objects.count(), 1)
+        self.assertEqual({user.id: compile_matrix(user.id).masks for user in self.users}, before)
+        self.assertEqual(before[alice.id][self.pages[0].id], VIEW | DELETE)
+        self.assertEqual(roles.compact()["lifted"], 0)  # idempotent
+
+
+class PermissionAuditTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.users = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@example.com", password="x")
+            for i in range(4)
+        ]
+        self.pages = [Page.objects.create(name=f"Page {i}") for i in range(3)]
+        group = PageGroup.objects.create(name="Catalog")
+        group.pages.set(self.pages[:2])
+        editor = Role.objects.create(name="Editor")
+        RoleGrant.objects.create(role=editor, page_group=group, flags=VIEW | EDIT)
+        UserRole.objects.create(user=self.users[0], role=editor)
+        UserRole.objects.create(user=self.users[1], role=editor)
+        Permission.objects.create(user=self.users[1], page=self.pages[0], can_view=True)  # no EDIT here
+        Permission.objects.create(user=self.users[2], page=self.pages[0], can_view=True, can_edit=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_who_resolves_roles_and_overrides(self):
+        with self.assertNumQueries(3):  # page, granting roles, users
+            response = self.client.get("/api/permissions/who/", {"page_id": self.pages[0].id, "flag": "edit"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["username"] for row in response.data["results"]], ["user0", "user2"])
+        self.assertIsNone(response.data["next"])
+
+        everyone = Role.objects.create(name="Everyone", is_default=True)
+        public = PageGroup.objects.create(name="Public")
+        public.pages.add(self.pages[2])
+        RoleGrant.objects.create(role=everyone, page_group=public, flags=VIEW)
+        response = self.client.get("/api/permissions/who/", {"page_id": self.pages[2].id, "limit": 3})
+        self.assertEqual([row["username"] for row in response.data["results"]], ["user0", "user1", "user2"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([row["username"] for row in response.data["results"]], ["user3"])
+
+    def test_who_streams_ndjson(self):
+        response = self.client.get(
+            "/api/permissions/who/", {"page_id": self.pages[1].id, "flag": "edit", "output": "ndjson"}
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["username"] for row in rows], ["user0", "user1"])
+        self.assertEqual(
+            self.client.get("/api/permissions/who/", {"page_id": self.pages[0].id, "flag": "own"}).status_code, 400
+        )
+
+    def test_user_matrix(self):
+        response = self.client.get("/api/permissions/matrix/", {"user_id": self.users[1].id, "limit": 1})
+        self.assertEqual(response.data["results"], [{
+            "page": self.pages[0].id, "name": "Page 0", "can_view": True, "can_create": False,
+            "can_edit": False, "can_delete": False, "override": True,
+        }])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([(row["page"], row["can_edit"], row["override"]) for row in response.data["results"]],
+                         [(self.pages[1].id, True, False)])
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(self.client.get("/api/permissions/matrix/", {"user_id": 999}).status_code, 404)
+
+
+class CommentQueryPlanningTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _add_comments(self, count):
+        for i in range(count):
+            comment = Comment.objects.create(page=self.page, user=self.user, content=f"comment {i}")
+            comment.content = f"edited {i}"
+            comment.save()
+
+    def _list(self):
+        response = self.client.get("/api/comments/", {"page_id": self.page.id})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_comment_list_has_no_n_plus_one(self):
+        self._add_comments(2)
+        self.assertQueryCountConstant(self._list, grow=lambda: self._add_comments(5))
+
+    def test_comment_list_query_budget(self):
+        self._add_comments(3)
+        # comments joined with their authors + one prefetch for histories/editors
+        with self.assertMaxQueries(2):
+            response = self._list()
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]["histories"][0]["modified_by"]["username"], "alice")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.comments = [
+            Comment.objects.create(page=self.page, user=self.user, content=f"comment {i}") for i in range(5)
+        ]
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get("/api/comments/", {"page_id": self.page.id})
+        self.assertEqual(len(response.data), 5)
+
+    def test_follow_next_links(self):
+        seen = []
+        url = f"/api/comments/?page_id={self.page.id}&limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, [c.id for c in reversed(self.comments)])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/comments/", {"page_id": self.page.id, "cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentHistoryCaptureTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.comment = Comment.objects.create(page=self.page, user=self.user, content="first")
+
+    def _selects(self, captured):
+        return [q["sql"] for q in captured.captured_queries if q["sql"].startswith("SELECT")]
+
+    def test_save_records_history_without_refetch(self):
+        comment = Comment.objects.get(pk=self.comment.pk)
+        comment.content = "second"
+        with CaptureQueriesContext(connection) as captured:
+            comment.save()
+        self.assertEqual(self._selects(captured), [])
+        history = CommentHistory.objects.get(comment=comment)
+        self.assertEqual(history.previous_content, "first")
+        self.assertEqual(history.modified_by, self.user)
+
+        # the saved content becomes the new baseline
+        comment.content = "third"
+        comment.save()
+        self.assertEqual(
+            list(comment.histories.order_by("id").values_list("previous_content", flat=True)),
+            ["first", "second"],
+        )
+
+    def test_unchanged_save_records_nothing(self):
+        comment = Comment.objects.get(pk=self.comment.pk)
+        comment.save()
+        self.assertFalse(CommentHistory.objects.exists())
+
+    def test_queryset_update_records_history_in_bulk(self):
+        Comment.objects.create(page=self.page, user=self.user, content="other")
+        with CaptureQueriesContext(connection) as captured:
+            Comment.objects.filter(page=self.page).update(content="redacted")
+        # one SELECT of the old content, one bulk INSERT, one UPDATE
+        self.assertEqual(len(self._selects(captured)), 1)
+        self.assertEqual(sum(q["sql"].startswith("INSERT") for q in captured.captured_queries), 1)
+        self.assertEqual(
+            sorted(CommentHistory.objects.values_list("previous_content", flat=True)),
+            ["first", "other"],
+        )
+
+    def test_bulk_update_records_history(self):
+        comments = list(Comment.objects.all())
+        for comment in comments:
+            comment.content = "bulk"
+        Comment.objects.bulk_update(comments, ["content"])
+        self.assertEqual(list(CommentHistory.objects.values_list("previous_content", flat=True)), ["first"])
+
+
+class PermissionBulkTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.users = [
+            User.objects.create_user(username=f"u{i}", email=f"u{i}@example.com", password="x") for i in range(3)
+        ]
+        self.pages = [Page.objects.create(name=f"page {i}") for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_bulk_grant_upserts_and_reports_rows(self):
+        Permission.objects.create(user=self.users[0], page=self.pages[0], can_delete=True)
+        payload = {"grants": [
+            {"users": [u.id for u in self.users] + [9999], "pages": [p.id for p in self.pages], "can_view": True},
+            {"users": [self.users[1].id], "pages": [self.pages[1].id], "can_edit": True},
+        ]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/permissions/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["applied"], 6)
+        self.assertEqual(response.data["errors"], 2)
+        statuses = {(r["user"], r["page"]): r["status"] for r in response.data["results"]}
+        self.assertEqual(statuses[(self.users[0].id, self.pages[0].id)], "updated")
+        self.assertEqual(statuses[(9999, self.pages[0].id)], "error")
+
+        # omitted flags keep their stored value
+        kept = Permission.objects.get(user=self.users[0], page=self.pages[0])
+        self.assertTrue(kept.can_view and kept.can_delete)
+        merged = Permission.objects.get(user=self.users[1], page=self.pages[1])
+        self.assertTrue(merged.can_view and merged.can_edit)
+        self.assertEqual(Permission.objects.count(), 6)
+
+    def test_bulk_revoke_invalidates_matrix(self):
+        Permission.objects.create(user=self.users[0], page=self.pages[0], can_view=True)
+        self.assertTrue(matrix_cache.get(self.users[0].id).allows(self.pages[0].id, VIEW))
+        payload = {"grants": [{"users": [self.users[0].id], "pages": [self.pages[0].id], "can_view": False}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/permissions/bulk/", payload, format="json")
+        self.assertFalse(matrix_cache.get(self.users[0].id).allows(self.pages[0].id, VIEW))
+
+    def test_requires_superuser(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post("/api/permissions/bulk/", {"grants": []}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class FailingEmailBackend(LocmemEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("relay down")
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+
+    def _request_reset(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post("/api/password-reset/request/", {"email": "alice@example.com"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_only_enqueues(self):
+        self._request_reset()
+        self.assertEqual(len(mail.outbox), 0)
+        entry = OutboundEmail.objects.get()
+        self.assertEqual(entry.recipients, ["alice@example.com"])
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    def test_file_backend_delivery(self):
+        with tempfile.TemporaryDirectory() as outdir:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.filebased.EmailBackend", EMAIL_FILE_PATH=outdir,
+            ):
+                self._request_reset()
+                self._request_reset()
+                self.assertEqual(drain_outbox(), (2, 0))
+            written = "".join(path.read_text() for path in Path(outdir).iterdir())
+        self.assertEqual(written.count("Your password reset OTP"), 2)
+
+    def test_failure_backs_off_then_gives_up(self):
+        self._request_reset()
+        entry = OutboundEmail.objects.get()
+        with self.assertLogs("accounts.outbox", "WARNING"):
+            self.assertEqual(drain_outbox(connection=FailingEmailBackend(), backoff=0, max_attempts=2), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), (OutboundEmail.STATUS_PENDING, 1))
+        self.assertIn("relay down", entry.last_error)
+        with self.assertLogs("accounts.outbox", "WARNING"):
+            self.assertEqual(drain_outbox(connection=FailingEmailBackend(), backoff=0, max_attempts=2), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, OutboundEmail.STATUS_FAILED)
+
+
+class PasswordResetOTPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _request(self):
+        return self.client.post("/api/password-reset/request/", {"email": "alice@example.com"}, format="json")
+
+    def _verify(self, otp):
+        return self.client.post(
+            "/api/password-reset/verify/",
+            {"email": "alice@example.com", "otp": otp, "new_password": "a-Much-better-passw0rd"},
+            format="json",
+        )
+
+    def _issued_otp(self):
+        return int(OutboundEmail.objects.latest("id").body.split()[3].rstrip("."))
+
+    def _round_trip(self):
+        self.assertEqual(self._request().status_code, 200)
+        otp = self._issued_otp()
+        self.assertEqual(self._verify(otp + 1 if otp < 999999 else otp - 1).status_code, 400)
+        self.assertEqual(self._verify(otp).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("a-Much-better-passw0rd"))
+        # consumed: the same code cannot be used twice
+        self.assertEqual(self._verify(otp).status_code, 400)
+
+    def test_database_store_round_trip(self):
+        self._round_trip()
+        self.assertFalse(PasswordResetOTP.objects.exists())
+
+    @override_settings(PASSWORD_RESET_OTP={"STORE": "accounts.otp.CacheOTPStore"})
+    def test_cache_store_round_trip(self):
+        self._round_trip()
+        self.assertFalse(PasswordResetOTP.objects.exists())
+
+    def test_purge_expired(self):
+        store = otp_store.DatabaseOTPStore()
+        expired = store.issue(self.user, ttl=-1)
+        store.issue(self.user, ttl=600)
+        self.assertEqual(store.check(self.user, expired), otp_store.EXPIRED)
+        call_command("purge_expired_otps", stdout=StringIO())
+        self.assertEqual(PasswordResetOTP.objects.count(), 1)
+
+    @override_settings(PASSWORD_RESET_OTP={"RATE_LIMIT": 2})
+    def test_requests_are_rate_limited_per_email(self):
+        self.assertEqual(self._request().status_code, 200)
+        self.assertEqual(self._request().status_code, 200)
+        self.assertEqual(self._request().status_code, 429)
+
+    def test_requires_login(self):
+        response = APIClient().post("/api/password-reset/request/", {"email": "alice@example.com"}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.product = Product.objects.create(name="Widget", price="9.99")
+        Comment.objects.create(page=self.page, user=self.user, content="hello")
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.client = AsyncClient()
+
+    async def test_requires_token(self):
+        response = await AsyncClient().get("/api/async/products/")
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get("/api/async/products/", headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_product_list_and_detail(self):
+        response = await self.client.get("/api/async/products/", headers=self.auth)
+        self.assertEqual(response.json(), [{"id": self.product.id, "name": "Widget", "description": "", "price": "9.99"}])
+        response = await self.client.get(f"/api/async/products/{self.product.id}/", headers=self.auth)
+        self.assertEqual(response.json()["name"], "Widget")
+        response = await self.client.get("/api/async/products/999/", headers=self.auth)
+        self.assertEqual(response.status_code, 404)
+        response = await self.client.get("/api/async/products/", {"limit": 1}, headers=self.auth)
+        self.assertEqual(response.json()["next"], None)
+
+    async def test_comment_list_checks_page_permission(self):
+        response = await self.client.get("/api/async/comments/", {"page_id": self.page.id}, headers=self.auth)
+        self.assertEqual(response.status_code, 403)
+        await sync_to_async(self._grant_view)()
+        response = await self.client.get("/api/async/comments/", {"page_id": self.page.id}, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["user"]["username"], "alice")
+
+    def _grant_view(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Permission.objects.create(user=self.user, page=self.page, can_view=True)
+
+    async def test_page_list(self):
+        response = await self.client.get("/api/async/pages/", headers=self.auth)
+        self.assertEqual(response.json(), [{"id": self.page.id, "name": "Products"}])
+
+
+@override_settings(STATELESS_JWT={"SINGLE_PROCESS": True})  # the test cache is a LocMemCache
+class StatelessJWTTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        matrix_cache.clear_local()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="pw-alice-123")
+        self.page = Page.objects.create(name="Products")
+        Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.client = APIClient()
+        response = self.client.post("/api/token/", {"username": "alice", "password": "pw-alice-123"}, format="json")
+        self.tokens = response.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def test_token_carries_claims(self):
+        token = AccessToken(self.tokens["access"])
+        self.assertEqual(token["username"], "alice")
+        self.assertEqual(token["perms"], f"{self.page.id}:{VIEW}")
+
+    def test_reads_skip_the_user_query(self):
+        with self.assertMaxQueries(1):  # just the (empty) comment list
+            response = self.client.get("/api/comments/", {"page_id": self.page.id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_permission_change_makes_claims_stale(self):
+        Permission.objects.filter(user=self.user).update(can_view=False)  # no signal...
+        with self.assertMaxQueries(1):
+            self.client.get("/api/comments/", {"page_id": self.page.id})  # ...so the claims are still trusted
+        perm = Permission.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            perm.save()  # signal bumps the auth version once committed
+            with self.assertMaxQueries(1):
+                self.client.get("/api/comments/", {"page_id": self.page.id})
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get("/api/comments/", {"page_id": self.page.id})
+        self.assertEqual(len(captured.captured_queries), 2)  # user row + comments
+
+    def test_refresh_restamps_claims(self):
+        perm = Permission.objects.get(user=self.user)
+        perm.can_edit = True
+        with self.captureOnCommitCallbacks(execute=True):
+            perm.save()
+        response = APIClient().post("/api/token/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data["access"])["perms"], f"{self.page.id}:{VIEW | EDIT}")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        with self.assertMaxQueries(1):
+            self.client.get("/api/comments/", {"page_id": self.page.id})
+
+    def test_refresh_for_deleted_user_is_rejected(self):
+        self.user.delete()
+        response = APIClient().post("/api/token/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_process_local_counters_are_not_trusted(self):
+        with override_settings(STATELESS_JWT={"SINGLE_PROCESS": False}):
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get("/api/comments/", {"page_id": self.page.id})
+        self.assertEqual(len(captured.captured_queries), 2)  # user row + comments
+
+    def test_writes_load_the_user(self):
+        response = self.client.post("/api/comments/", {"page": self.page.id, "content": "hi"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.get().user, self.user)
+
+
+@override_settings(RESPONSE_CACHE={"SINGLE_PROCESS": True})  # the test cache is a LocMemCache
+class ResponseCacheTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        Product.objects.create(name="Widget", price="9.99")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get("/api/products/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()[0]["name"], "Widget")
+        with self.assertMaxQueries(0):
+            second = self.client.get("/api/products/")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/api/pages/")["ETag"]
+        with self.assertMaxQueries(0):
+            response = self.client.get("/api/pages/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get("/api/products/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Gadget", price="1.00")
+        response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_query_params_are_part_of_the_key(self):
+        Product.objects.create(name="Gadget", price="1.00")
+        self.assertEqual(len(self.client.get("/api/products/").json()), 2)
+        self.assertEqual(len(self.client.get("/api/products/", {"limit": 1}).json()["results"]), 1)
+
+    def test_process_local_versions_are_not_trusted(self):
+        with override_settings(RESPONSE_CACHE={"SINGLE_PROCESS": False}):
+            response = self.client.get("/api/pages/")
+            self.assertNotIn("ETag", response)
+            self.assertEqual(self.client.get("/api/pages/", HTTP_IF_NONE_MATCH='"x"').status_code, 200)
+
+
+class FilterSearchOrderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.other = User.objects.create_user(username="bob", email="bob@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        Product.objects.create(name="Widget", description="blue steel widget", price="9.99")
+        Product.objects.create(name="Wrench", description="heavy tool", price="25.00")
+        Product.objects.create(name="Gadget", description="blue plastic", price="50.00")
+        Comment.objects.create(page=self.page, user=self.user, content="Refund requested for order")
+        Comment.objects.create(page=self.page, user=self.other, content="Shipping was fast")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _names(self, **params):
+        response = self.client.get("/api/products/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["name"] for row in response.json()]
+
+    def test_product_filters_and_ordering(self):
+        self.assertEqual(self._names(price_min="10", price_max="50"), ["Wrench", "Gadget"])
+        self.assertEqual(self._names(name_prefix="w"), ["Widget", "Wrench"])
+        self.assertEqual(self._names(ordering="-price"), ["Gadget", "Wrench", "Widget"])
+        self.assertEqual(self._names(created_after="2000-01-01", created_before="2000-01-02"), [])
+
+    def test_ordering_with_keyset_pagination(self):
+        Product.objects.create(name="Sprocket", price="25.00")
+        seen = []
+        url = "/api/products/?ordering=-price&limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertLessEqual(len(response.json()["results"]), 2)
+            seen.extend(row["name"] for row in response.json()["results"])
+            url = response.json()["next"]
+        # equal prices fall back to id order
+        self.assertEqual(seen, ["Gadget", "Sprocket", "Wrench", "Widget"])
+        response = self.client.get("/api/products/", {"ordering": "name", "limit": 2})
+        self.assertEqual([row["name"] for row in response.json()["results"]], ["Gadget", "Sprocket"])
+
+    def test_invalid_filter_value(self):
+        response = self.client.get("/api/products/", {"price_min": "cheap"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("price_min", response.json())
+
+    def test_comment_author_and_search(self):
+        response = self.client.get("/api/comments/", {"page_id": self.page.id, "author": self.other.id})
+        self.assertEqual([c["content"] for c in response.json()], ["Shipping was fast"])
+        response = self.client.get("/api/comments/", {"page_id": self.page.id, "search": "refund"})
+        self.assertEqual([c["user"]["username"] for c in response.json()], ["alice"])
+
+    @override_settings(SEARCH={"BACKEND": "accounts.search.SQLiteFTS5Backend"})
+    def test_fts5_search(self):
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self._names(search="blue"), ["Widget", "Gadget"])
+        self.assertEqual(self._names(search='blu"'), ["Widget", "Gadget"])  # prefix match, operators inert
+        Product.objects.create(name="Bluetooth speaker", price="30.00")  # kept in sync by signals
+        self.assertEqual(self._names(search="blue", ordering="name"), ["Bluetooth speaker", "Gadget", "Widget"])
+        response = self.client.get("/api/comments/", {"page_id": self.page.id, "search": "shipping fast"})
+        self.assertEqual(len(response.json()), 1)
+
+
+@override_settings(SEARCH={"BACKEND": "accounts.search.SQLiteFTS5Backend"})
+class CommentSearchTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.hidden = Page.objects.create(name="Users")
+        Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.strong = Comment.objects.create(page=self.page, user=self.user, content="refund refund refund please")
+        self.weak = Comment.objects.create(page=self.page, user=self.user, content="asking about a refund and shipping times")
+        Comment.objects.create(page=self.hidden, user=self.admin, content="refund policy draft")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _search(self, **params):
+        response = self.client.get("/api/comments/search/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_ranked_and_restricted_to_visible_pages(self):
+        body = self._search(q="refund")
+        self.assertEqual([row["id"] for row in body["results"]], [self.strong.id, self.weak.id])
+        self.assertGreater(body["results"][0]["score"], body["results"][1]["score"])
+        self.assertIsNone(body["next"])
+
+    def test_offset_pagination(self):
+        body = self._search(q="refund", limit=1)
+        self.assertEqual([row["id"] for row in body["results"]], [self.strong.id])
+        self.assertIn("offset=1", body["next"])
+        body = self.client.get(body["next"]).json()
+        self.assertEqual([row["id"] for row in body["results"]], [self.weak.id])
+
+    def test_bulk_update_keeps_index_in_sync(self):
+        Comment.objects.filter(pk=self.weak.pk).update(content="moved to billing")
+        self.assertEqual([row["id"] for row in self._search(q="billing")["results"]], [self.weak.id])
+        self.assertEqual([row["id"] for row in self._search(q="shipping")["results"]], [])
+
+        self.client.force_authenticate(self.admin)
+        hits = self._search(q="shipping", **{"in": "history"})["results"]
+        self.assertEqual([row["comment"] for row in hits], [self.weak.id])
+
+    def test_history_scope_is_superuser_only_and_q_required(self):
+        self.assertEqual(self.client.get("/api/comments/search/", {"q": "x", "in": "history"}).status_code, 403)
+        self.assertEqual(self.client.get("/api/comments/search/").status_code, 400)
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(self.admin)
+        response = self.client.get("/admin/accounts/comment/", {"q": "shipping"})
+        self.assertContains(response, "1 result")
+
+
+class CommentHistoryArchiveTests(TestCase):
+    def setUp(self):
+        self.archive = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive.cleanup)
+        override = override_settings(COMMENT_HISTORY_ARCHIVE={"DIR": self.archive.name, "MEMBER_BYTES": 64})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.comments = [
+            Comment.objects.create(page=self.page, user=self.admin, content=f"comment {i} v0") for i in range(3)
+        ]
+        for version in range(1, 4):
+            for comment in self.comments:
+                comment.content = f"comment {comment.pk} v{version}"
+                comment.save()
+        old = timezone.now() - timedelta(days=400)
+        # the first two edits of every comment are old
+        for comment in self.comments:
+            first_two = comment.histories.order_by("id").values_list("id", flat=True)[:2]
+            CommentHistory.objects.filter(pk__in=list(first_two)).update(modified_at=old)
+
+    def test_archives_old_rows_and_reads_them_back(self):
+        before = {
+            comment.pk: list(comment.histories.order_by("-modified_at", "-id").values_list("id", "previous_content"))
+            for comment in self.comments
+        }
+        out = StringIO()
+        call_command("archive_comment_history", "--older-than", "365", "--batch-size", "4", stdout=out)
+        self.assertIn("Archived 6", out.getvalue())
+        self.assertEqual(CommentHistory.objects.count(), 3)
+        self.assertEqual(len(list(Path(self.archive.name).glob("*.jsonl.gz"))), 1)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for comment in self.comments:
+            response = client.get("/api/comment-history/", {"comment_id": comment.pk})
+            rows = response.json()
+            self.assertEqual(
+                sorted((row["id"], row["previous_content"]) for row in rows), sorted(before[comment.pk])
+            )
+            self.assertEqual([row["archived"] for row in rows], [False, True, True])
+            self.assertEqual(rows[1]["modified_by"]["username"], "root")
+
+    def test_dry_run_moves_nothing(self):
+        out = StringIO()
+        call_command("archive_comment_history", "--older-than", "365", "--dry-run", stdout=out)
+        self.assertIn("6 history row(s)", out.getvalue())
+        self.assertEqual(CommentHistory.objects.count(), 9)
+
+
+class PageActivityTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.other = Page.objects.create(name="Users")
+        Permission.objects.create(user=self.user, page=self.page, can_view=True)
+
+    def _activity(self, page):
+        activity = PageActivity.objects.get(page=page)
+        return activity.comment_count, activity.commenter_count, activity.edit_count, activity.last_comment_at
+
+    def _assert_matches_rebuild(self):
+        maintained = {page.pk: self._activity(page) for page in (self.page, self.other)}
+        page_activity.rebuild()
+        self.assertEqual({page.pk: self._activity(page) for page in (self.page, self.other)}, maintained)
+
+    def test_counters_follow_comment_writes(self):
+        first = Comment.objects.create(page=self.page, user=self.user, content="a")
+        second = Comment.objects.create(page=self.page, user=self.user, content="b")
+        last = Comment.objects.create(page=self.page, user=self.admin, content="c")
+        first.content = "a2"
+        first.save()
+        self.assertEqual(self._activity(self.page), (3, 2, 1, last.created_at))
+
+        last.delete()
+        self.assertEqual(self._activity(self.page), (2, 1, 1, second.created_at))
+        first.delete()
+        self.assertEqual(self._activity(self.page)[:3], (1, 1, 0))
+        self._assert_matches_rebuild()
+
+    def test_bulk_writes_and_moves(self):
+        comments = [Comment.objects.create(page=self.page, user=self.user, content=f"c{i}") for i in range(3)]
+        Comment.objects.filter(page=self.page).update(content="same")
+        self.assertEqual(self._activity(self.page)[2], 3)
+
+        Comment.objects.filter(pk=comments[0].pk).update(page=self.other)
+        moved = comments[1]
+        moved.refresh_from_db()
+        moved.page = self.other
+        moved.content = "edited while moving"
+        moved.save()
+        self.assertEqual(self._activity(self.page)[:3], (1, 1, 1))
+        self.assertEqual(self._activity(self.other)[:3], (2, 1, 3))
+        self._assert_matches_rebuild()
+
+    def test_endpoint_is_one_query_and_respects_visibility(self):
+        Comment.objects.create(page=self.other, user=self.admin, content="x")
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            rows = client.get("/api/pages/activity/").json()
+        self.assertEqual([(row["name"], row["comment_count"]) for row in rows], [("Users", 1), ("Products", 0)])
+
+        client.force_authenticate(self.user)
+        self.assertEqual([row["id"] for row in client.get("/api/pages/activity/").json()], [self.page.pk])
+
+    def test_bulk_and_cascading_deletes_rebuild_once_per_delete(self):
+        for i in range(4):
+            Comment.objects.create(page=self.page, user=self.user, content=f"a{i}")
+            Comment.objects.create(page=self.other, user=self.admin, content=f"b{i}")
+        keep = Comment.objects.create(page=self.page, user=self.admin, content="kept")
+        keep.content = "kept, edited"
+        keep.save()
+        # counted once per delete, not once per comment
+        with mock.patch.object(page_activity, "comment_removed") as removed, \
+                mock.patch.object(page_activity, "rebuild", wraps=page_activity.rebuild) as rebuilt:
+            self.user.delete()
+            Comment.objects.filter(page=self.other, content__in=["b0", "b1"]).delete()
+        removed.assert_not_called()
+        self.assertEqual([set(call.args[0]) for call in rebuilt.call_args_list], [{self.page.pk}, {self.other.pk}])
+        self.assertEqual(self._activity(self.page), (1, 1, 1, keep.created_at))
+        self.assertEqual(self._activity(self.other)[:2], (2, 1))
+        self._assert_matches_rebuild()
+        other_id = self.other.pk
+        self.other.delete()
+        self.assertFalse(PageActivity.objects.filter(page_id=other_id).exists())
+
+    def test_drifted_counters_do_not_go_negative(self):
+        comment = Comment.objects.create(page=self.page, user=self.user, content="a")
+        PageActivity.objects.filter(page=self.page).update(comment_count=0, commenter_count=0)
+        comment.delete()
+        self.assertEqual(self._activity(self.page)[:3], (0, 0, 0))
+
+    def test_rebuild_command(self):
+        Comment.objects.bulk_create([Comment(page=self.page, user=self.user, content="bulk")])
+        self.assertEqual(self._activity(self.page)[0], 0)
+        out = StringIO()
+        call_command("rebuild_page_activity", "--page", str(self.page.pk), stdout=out)
+        self.assertIn("1 page(s)", out.getvalue())
+        self.assertEqual(self._activity(self.page)[:2], (1, 1))
+
+
+class CommentStreamTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        realtime.reset_broker()
+        self.addCleanup(realtime.reset_broker)
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.permission = Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.client = AsyncClient()
+
+    async def _frames(self, response, count):
+        frames = []
+        async for chunk in response.streaming_content:
+            frames.append(chunk.decode())
+            if len(frames) == count:
+                return frames
+
+    def _write_comments(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Comment.objects.create(page=self.page, user=self.user, content="first")
+        cursor = realtime.get_broker().cursor()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.content = "first, edited"
+            first.save()
+            second = Comment.objects.create(page=self.page, user=self.user, content="second")
+            second_id = second.pk
+            second.delete()
+        return cursor, first, second_id
+
+    async def test_resumes_after_last_event_id(self):
+        cursor, first, second_id = await sync_to_async(self._write_comments)()
+        response = await self.client.get(
+            "/api/comments/stream/", {"page_id": self.page.id}, headers=dict(self.auth, **{"Last-Event-ID": cursor})
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = await self._frames(response, 4)
+        self.assertTrue(frames[0].startswith("retry:"))
+        self.assertEqual(
+            [frame.split("\n")[1] for frame in frames[1:]],
+            ["event: comment.updated", "event: comment.created", "event: comment.deleted"],
+        )
+        self.assertIn('"content":"first, edited"', frames[1])
+        self.assertIn(f'data: {{"id":{second_id},"page":{self.page.pk}}}', frames[3])
+
+    async def test_live_events_and_unknown_cursor(self):
+        response = await self.client.get(
+            "/api/comments/stream/", {"page_id": self.page.id, "cursor": "0000:1"}, headers=self.auth
+        )
+        frames = response.streaming_content
+        self.assertTrue((await anext(frames)).startswith(b"retry:"))
+        self.assertIn(b"event: resync", await anext(frames))
+        realtime.get_broker().publish(self.page.id, realtime.CREATED, '{"id":1}')
+        self.assertIn(b'data: {"id":1}', await anext(frames))
+
+    def _commit(self, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+
+    async def test_requires_view_permission_and_revokes(self):
+        await sync_to_async(self._commit)(self.permission.delete)
+        response = await self.client.get("/api/comments/stream/", {"page_id": self.page.id}, headers=self.auth)
+        self.assertEqual(response.status_code, 403)
+
+        await sync_to_async(self._commit)(
+            lambda: Permission.objects.create(user=self.user, page=self.page, can_view=True)
+        )
+        with override_settings(REALTIME={"HEARTBEAT": 0.01}):
+            response = await self.client.get("/api/comments/stream/", {"page_id": self.page.id}, headers=self.auth)
+            frames = response.streaming_content
+            await anext(frames)
+            self.assertEqual(await anext(frames), b": keep-alive\n\n")
+            await sync_to_async(self._commit)(Permission.objects.filter(user=self.user).delete)
+            self.assertIn(b"event: revoked", await anext(frames))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        Product.objects.create(name="Widget, large", description='say "hi"\nnewline', price="9.99")
+        Product.objects.create(name="Gadget", price="50.00")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _get(self, resource, **params):
+        response = self.client.get(f"/api/export/{resource}/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_round_trips_awkward_values(self):
+        response, body = self._get("products")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(StringIO(body.decode("utf-8"))))
+        self.assertEqual([row["name"] for row in rows], ["Widget, large", "Gadget"])
+        self.assertEqual(rows[0]["description"], 'say "hi"\nnewline')
+        self.assertEqual(rows[1]["price"], "50.00")
+
+    def test_csv_neutralises_formulas(self):
+        Product.objects.create(name="=HYPERLINK(\"http://x\")", description="@SUM(A1)", price="-1.00")
+        _, body = self._get("products")
+        row = list(csv.DictReader(StringIO(body.decode("utf-8"))))[-1]
+        self.assertEqual((row["name"], row["description"]), ("'=HYPERLINK(\"http://x\")", "'@SUM(A1)"))
+        self.assertEqual(row["price"], "-1.00")  # numbers are left alone
+        _, body = self._get("products", output="ndjson")
+        self.assertEqual(json.loads(body.splitlines()[-1])["name"], '=HYPERLINK("http://x")')
+
+    def test_gzipped_ndjson(self):
+        response, body = self._get("users", output="ndjson", gzip="1")
+        self.assertIn('users.ndjson.gz', response["Content-Disposition"])
+        rows = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+        self.assertEqual([row["username"] for row in rows], ["root"])
+        self.assertNotIn("password", rows[0])
+
+    def test_bench_export_rolls_back_its_seed(self):
+        out = StringIO()
+        call_command("bench_export", "products", "--seed", "5", stdout=out)
+        self.assertIn("products     csv                 7", out.getvalue())
+        self.assertEqual(Product.objects.count(), 2)
+        with self.assertRaises(CommandError):
+            call_command("bench_export", "nope", stdout=StringIO())
+
+    @override_settings(EXPORT={"CHUNK_BYTES": 1})
+    async def test_streams_asynchronously_under_asgi(self):
+        auth = {"Authorization": f"Bearer {AccessToken.for_user(self.admin)}"}
+        response = await AsyncClient().get("/api/export/products/", headers=auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)  # Django would otherwise buffer the body with sync_to_async(list)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)  # header + one chunk per row
+        rows = list(csv.DictReader(StringIO(b"".join(chunks).decode("utf-8"))))
+        self.assertEqual([row["name"] for row in rows], ["Widget, large", "Gadget"])
+
+    def test_superuser_only_and_unknown_resource(self):
+        self.assertEqual(self.client.get("/api/export/pages/").status_code, 404)
+        self.assertEqual(self.client.get("/api/export/products/", {"output": "xml"}).status_code, 400)
+        self.client.force_authenticate(User.objects.create_user(username="a", email="a@example.com", password="x"))
+        self.assertEqual(self.client.get("/api/export/products/").status_code, 403)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        User.objects.create_user(username="taken", email="taken@example.com", password="x")
+
+    def _write(self, name, text):
+        path = Path(self.tmp.name) / name
+        path.write_text(text)
+        return str(path)
+
+    def test_command_reports_bad_rows_and_resumes(self):
+        source = self._write("users.csv", "\n".join([
+            "username,email,password,first_name",
+            "ann,ann@example.com,Correct-Horse-1,Ann",
+            "bad user!,bad@example.com,Correct-Horse-1,",
+            "ann2,ann@example.com,Correct-Horse-1,",       # duplicate within the file
+            "taken,new@example.com,Correct-Horse-1,",      # already in the table
+            "ben,ben@example.com,,Ben",                    # no password → unusable
+        ]) + "\n")
+        report = str(Path(self.tmp.name) / "errors.ndjson")
+        checkpoint = str(Path(self.tmp.name) / "users.ckpt")
+        call_command("import_records", "users", source, "--chunk-size", "2", "--workers", "2",
+                     "--report", report, "--checkpoint", checkpoint, stdout=StringIO())
+
+        ann = User.objects.get(username="ann")
+        self.assertTrue(ann.check_password("Correct-Horse-1"))
+        self.assertEqual(ann.first_name, "Ann")
+        self.assertFalse(User.objects.get(username="ben").has_usable_password())
+        with open(report) as fh:
+            self.assertEqual([json.loads(line)["line"] for line in fh], [3, 4, 5])
+        with open(checkpoint) as fh:
+            self.assertEqual(json.load(fh)["last_line"], 6)
+
+        # a re-run resumes after the checkpoint and imports nothing twice
+        out = StringIO()
+        call_command("import_records", "users", source, "--checkpoint", checkpoint, stdout=out)
+        self.assertIn("Resuming after line 6", out.getvalue())
+        self.assertEqual(User.objects.filter(username__in=["ann", "ben"]).count(), 2)
+
+    def test_endpoint_imports_ndjson_products(self):
+        admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        client = APIClient()
+        client.force_authenticate(admin)
+        body = "\n".join([
+            json.dumps({"name": "Widget", "price": "9.99"}),
+            json.dumps({"name": "", "price": "1"}),
+            "{not json",
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/import/products/", body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual([row["line"] for row in response.json()["errors"]], [2, 3])
+        self.assertEqual(list(Product.objects.values_list("name", flat=True)), ["Widget"])
+
+        upload = SimpleUploadedFile("products.csv", b"name,price\nGadget,5\n", content_type="text/csv")
+        response = client.post("/api/import/products/", {"file": upload}, format="multipart")
+        self.assertEqual(response.json()["created"], 1)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_raw_body_is_not_capped_by_upload_memory_limit(self):
+        admin = User.objects.create_superuser(username="root", email="root@example.com", password="x")
+        client = APIClient()
+        client.force_authenticate(admin)
+        body = "name,price\n" + "".join(f"Part {i},{i}\n" for i in range(50))
+        response = client.post("/api/import/products/", body, content_type="text/csv")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["created"], 50)
+
+    def test_hashing_pool_is_reused(self):
+        self.assertIsNone(bulk_import.hashing_pool(1))
+        self.assertIs(bulk_import.hashing_pool(2), bulk_import.hashing_pool(2))
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_profile_tunes_pragmas(self):
+        config = database_config(Path("/srv"), {"SQLITE_BUSY_TIMEOUT": "9"})
+        self.assertEqual(config["NAME"], Path("/srv/db.sqlite3"))
+        self.assertIn("PRAGMA journal_mode=WAL", config["OPTIONS"]["init_command"])
+        self.assertEqual(config["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(config["OPTIONS"]["timeout"], 9)
+
+    def test_postgres_pool_disables_persistent_connections(self):
+        persistent = database_config(Path("/srv"), {"DB_PROFILE": "postgres"})
+        self.assertEqual(persistent["CONN_MAX_AGE"], 60)
+        self.assertTrue(persistent["CONN_HEALTH_CHECKS"])
+        pooled = database_config(Path("/srv"), {"DB_PROFILE": "postgres", "DB_POOL": "1", "DB_POOL_MAX_SIZE": "5"})
+        self.assertEqual(pooled["CONN_MAX_AGE"], 0)
+        self.assertEqual(pooled["OPTIONS"]["pool"]["max_size"], 5)
+        with self.assertRaises(ImproperlyConfigured):
+            database_config(Path("/srv"), {"DB_PROFILE": "oracle"})
+
+
+class LoginPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="right-Pa55")
+        self.client = APIClient()
+
+    def _login(self, password, username="alice", ip="10.0.0.1"):
+        return self.client.post(
+            "/api/token/", {"username": username, "password": password}, REMOTE_ADDR=ip, format="json"
+        )
+
+    def test_hasher_profiles(self):
+        self.assertEqual(password_hashers({})[0], "accounts.hashers.PBKDF2PasswordHasher")
+        hashers = password_hashers({"PASSWORD_HASHER_PROFILE": "scrypt"})
+        self.assertEqual(hashers[0], "accounts.hashers.ScryptPasswordHasher")
+        self.assertIn("accounts.hashers.PBKDF2PasswordHasher", hashers)
+        self.assertEqual(hasher_costs({"PBKDF2_ITERATIONS": "5000", "SCRYPT_WORK_FACTOR": ""}), {"PBKDF2_ITERATIONS": 5000})
+        with self.assertRaises(ImproperlyConfigured):
+            password_hashers({"PASSWORD_HASHER_PROFILE": "md5"})
+
+    def test_login_upgrades_hasher_and_cost(self):
+        scrypt = password_hashers({"PASSWORD_HASHER_PROFILE": "scrypt"})
+        with override_settings(PASSWORD_HASHERS=scrypt, PASSWORD_HASHER_COST={"SCRYPT_WORK_FACTOR": 2 ** 10}):
+            self.assertEqual(self._login("right-Pa55").status_code, 200)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith("scrypt$1024$"))
+        with override_settings(PASSWORD_HASHER_COST={"PBKDF2_ITERATIONS": 1000}):
+            self.assertEqual(self._login("right-Pa55").status_code, 200)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    @override_settings(LOGIN_THROTTLE={"USER_FAILURES": 2, "IP_FAILURES": 3})
+    def test_failed_logins_are_throttled_before_hashing(self):
+        self.assertEqual(self._login("wrong").status_code, 401)
+        self.assertEqual(self._login("right-Pa55").status_code, 200)  # clears the username count
+        self.assertEqual(self._login("wrong").status_code, 401)
+        self.assertEqual(self._login("wrong").status_code, 401)
+        with mock.patch("django.contrib.auth.hashers.PBKDF2PasswordHasher.verify") as verify:
+            self.assertEqual(self._login("right-Pa55").status_code, 429)
+        verify.assert_not_called()
+        # the address has used up its failures too, for every username
+        self.assertEqual(self._login("x", username="bob").status_code, 429)
+        self.assertEqual(self._login("right-Pa55", ip="10.0.0.2").status_code, 429)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_blacklist.reset_filter()
+        User.objects.create_user(username="alice", email="alice@example.com", password="pw-alice-123")
+        self.client = APIClient()
+        response = self.client.post("/api/token/", {"username": "alice", "password": "pw-alice-123"}, format="json")
+        self.refresh = response.data["refresh"]
+
+    def _refresh(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/token/refresh/", {"refresh": token}, format="json")
+
+    def test_rotated_token_cannot_be_reused(self):
+        response = self._refresh(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._refresh(self.refresh).status_code, 401)
+        self.assertEqual(self._refresh(response.data["refresh"]).status_code, 200)
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+    def test_stale_filter_still_rejects_reuse(self):
+        token_blacklist.get_filter().sync()
+        self.client.post("/api/token/refresh/", {"refresh": self.refresh}, format="json")  # epoch not bumped
+        self.assertEqual(self._refresh(self.refresh).status_code, 401)  # the unique row decides
+
+    def test_unrevoked_token_is_checked_without_a_query(self):
+        token = token_blacklist.BlacklistRefreshToken(self.refresh)
+        with self.assertNumQueries(0):
+            token.check_blacklist()
+        self._refresh(self.refresh)
+        with self.assertRaises(TokenError):
+            token.check_blacklist()
+
+    def test_prune_removes_expired_tokens(self):
+        jti = token_blacklist.BlacklistRefreshToken(self.refresh)["jti"]
+        self._refresh(self.refresh)
+        OutstandingToken.objects.filter(jti=jti).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        out = StringIO()
+        call_command("prune_token_blacklist", "--dry-run", stdout=out)
+        self.assertIn("Would delete 1 expired outstanding token(s), 1 of them blacklisted", out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        call_command("prune_token_blacklist", stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        Comment.objects.create(page=self.page, user=self.user, content="hello")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _sample(self, text, metric, route):
+        for line in text.splitlines():
+            if line.startswith(f'{metric}{{route="{route}",method="GET",status="200"}}'):
+                return float(line.rsplit(" ", 1)[1])
+        self.fail(f"{metric} for {route} not exposed:\n{text}")
+
+    @override_settings(METRICS={"PUBLIC": True})
+    def test_route_histograms_are_exposed(self):
+        self.client.get("/api/comments/", {"page_id": self.page.id})
+        self.client.get("/api/comments/", {"page_id": self.page.id})
+        text = self.client.get("/metrics").content.decode()
+        route = "api/comments/"
+        self.assertEqual(self._sample(text, "http_request_duration_seconds_count", route), 2)
+        self.assertGreater(self._sample(text, "http_request_queries_sum", route), 0)
+        self.assertGreater(self._sample(text, "http_request_serializer_seconds_sum", route), 0)
+        self.assertGreater(self._sample(text, "http_response_bytes_sum", route), 0)
+        self.assertIn('# TYPE http_request_db_seconds histogram', text)
+
+    @override_settings(METRICS={"TOKEN": "s3cret"})
+    def test_token_or_staff_session_required(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(User.objects.create_user(username="ops", email="ops@example.com", password="x",
+                                                         is_staff=True))
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_slow_requests_are_logged_with_sql(self):
+        middleware = metrics.MetricsMiddleware(lambda request: HttpResponse("ok"))
+        middleware.slow_ms, middleware.keep_sql = 0, 10
+        with self.assertLogs("accounts.metrics.slow", "WARNING") as logs:
+            request = APIRequestFactory().get("/anything/")
+            sample = metrics.RequestSample(keep_sql=10)
+            sample.add_query('SELECT 1', 0.002)
+            middleware.record(request, HttpResponse("ok"), sample, 0.5)
+        self.assertIn("SELECT 1", logs.output[0])
+
+    @override_settings(METRICS={})
+    def test_slow_log_is_on_by_default(self):
+        middleware = metrics.MetricsMiddleware(lambda request: HttpResponse("ok"))
+        self.assertEqual((middleware.slow_ms, middleware.keep_sql), (1000, 50))
+
+
+class LoadTestSuiteTests(TestCase):
+    def test_seed_then_run_and_compare(self):
+        call_command(
+            "seed_benchmark_data", "--users", "6", "--pages", "3", "--permissions", "12",
+            "--comments", "40", "--products", "5", "--batch-size", "10", stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.filter(username__startswith="bench-user-").count(), 6)
+        self.assertEqual(Permission.objects.count(), 12)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(CommentHistory.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command("seed_benchmark_data", "--users", "1", stdout=StringIO())
+
+        results = tempfile.TemporaryDirectory()
+        self.addCleanup(results.cleanup)
+        scenarios = "comment_list,comment_create,comment_edit,permission_check,product_list,token_refresh"
+        out = StringIO()
+        call_command("loadtest", "--scenarios", scenarios, "--iterations", "3",
+                     "--results-dir", results.name, stdout=out)
+        saved = list(Path(results.name).glob("*.json"))
+        self.assertEqual(len(saved), 1)
+        payload = json.loads(saved[0].read_text())
+        for name in scenarios.split(","):
+            self.assertEqual(payload["scenarios"][name]["errors"], 0, (name, out.getvalue()))
+        self.assertGreater(payload["scenarios"]["comment_list"]["queries_per_request"], 0)
+
+        out = StringIO()
+        call_command("loadtest", "--scenarios", "product_list", "--iterations", "2", "--no-save",
+                     "--results-dir", results.name, "--compare", str(saved[0]), stdout=out)
+        self.assertIn("product_list", out.getvalue().split("Compared with")[1])
+
+
+class CommentBatchTests(TestCase):
+    def setUp(self):
+        matrix_cache.clear_local()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.page = Page.objects.create(name="Products")
+        self.locked = Page.objects.create(name="Users")
+        Permission.objects.create(user=self.user, page=self.page, can_view=True, can_create=True)
+        Permission.objects.create(user=self.user, page=self.locked, can_view=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_creates_valid_items_and_reports_the_rest(self):
+        payload = {"comments": [
+            {"page": self.page.id, "content": "refund please"},
+            {"page": self.locked.id, "content": "not allowed"},
+            {"page": 9999, "content": "no such page"},
+            {"page": self.page.id},
+            {"page": self.page.id, "content": "second"},
+        ]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/comments/batch/", payload, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data["created"], response.data["errors"]), (2, 3))
+        results = response.data["results"]
+        self.assertEqual([row["status"] for row in results], ["created", "error", "error", "error", "created"])
+        self.assertIn("content", results[3]["errors"])
+        self.assertEqual(
+            set(Comment.objects.values_list("id", flat=True)), {results[0]["id"], results[4]["id"]}
+        )
+
+        # bulk_create() skips the signals; the counters and index are kept anyway
+        activity = PageActivity.objects.get(page=self.page)
+        self.assertEqual((activity.comment_count, activity.commenter_count), (2, 1))
+        body = self.client.get("/api/comments/search/", {"q": "refund"}).json()
+        self.assertEqual([row["id"] for row in body["results"]], [results[0]["id"]])
+
+    def test_rejects_oversized_batch(self):
+        items = [{"page": self.page.id, "content": "x"}] * 1001
+        response = self.client.post("/api/comments/batch/", {"comments": items}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(GROUP_COMMIT={"ENABLED": True, "TIMEOUT": 0})
+    def test_queued_write_is_accepted_not_failed(self):
+        queued = []
+        committer = SimpleNamespace(submit=lambda rows: queued.append(rows) or Future())
+        with mock.patch.object(comment_ingest, "get_committer", return_value=committer):
+            response = self.client.post(
+                "/api/comments/batch/", {"comments": [{"page": self.page.id, "content": "later"}]}, format="json"
+            )
+            self.assertEqual(response.status_code, 202, response.content)
+            self.assertEqual(response.data["results"], [{"index": 0, "status": "pending"}])
+            response = self.client.post("/api/comments/", {"page": self.page.id, "content": "later"}, format="json")
+            self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(len(queued), 2)  # handed to the writer once each; nothing to retry
+
+    def test_retried_write_gets_fresh_ids(self):
+        comment = Comment(page=self.page, user=self.user, content="retried")
+        with mock.patch.object(page_activity, "comments_added", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                comment_ingest.write_comments([[comment]])
+        # the rolled-back id is taken by another writer before the retry
+        other = Comment.objects.create(page=self.page, user=self.user, content="other")
+        comment_ingest.write_comments([[comment]])
+        self.assertNotEqual(comment.pk, other.pk)
+        self.assertEqual(Comment.objects.get(pk=comment.pk).content, "retried")
+
+    def test_group_committer_coalesces_and_isolates_failures(self):
+        written = []
+
+        def write(batches):
+            if any("bad" in rows for rows in batches):
+                raise ValueError("bad row")
+            written.append(batches)
+
+        committer = GroupCommitter(write, max_batch=100, max_wait_ms=50)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = list(pool.map(committer.submit, [[i] for i in range(8)] + [["bad"]]))
+        self.assertEqual(sorted(f.result(timeout=5)[0] for f in futures[:8]), list(range(8)))
+        with self.assertRaises(ValueError):
+            futures[8].result(timeout=5)
+        self.assertLess(committer.flushes, 9)
+        self.assertEqual(sorted(rows[0] for batches in written for rows in batches), list(range(8)))
@@ -0,0 +1,248 @@
+# accounts/token_blacklist.py
+
+"""
+Refresh-token blacklist with an in-memory negative cache.
+
+With ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION every refresh checks
+the presented token against `token_blacklist_blacklistedtoken` and then
+writes it there. BlacklistRefreshToken keeps the database as the source of
+truth but does less work per refresh:
+
+- "is this jti blacklisted?" asks a per-process bloom filter first. Only a
+  "maybe" goes to the database, so a token that was never blacklisted (the
+  normal case) costs no query. The filter is split into generations by
+  token expiry (REFRESH_TOKEN_LIFETIME / TOKEN_BLACKLIST["GENERATIONS"]),
+  and generations whose tokens have all expired are dropped whole: an
+  expired token is rejected by its `exp` anyway.
+- Processes learn about new blacklist rows through a counter in the cache,
+  bumped after every BlacklistedToken insert commits (accounts/signals.py).
+  When it moved, the rows added since the last load (by primary key) are
+  read into the filter, so each process only ever loads the delta.
+- Blacklisting inserts the BlacklistedToken row directly; its unique
+  constraint makes a second refresh with the same token fail, even when
+  two of them race past the filter at the same moment.
+- No user row is fetched to record outstanding tokens; the id is in the
+  token.
+
+Rows of expired tokens are removed by `python manage.py
+prune_token_blacklist`, run from cron (daily is plenty). With more than
+one worker process TOKEN_BLACKLIST["CACHE_ALIAS"] must be a shared cache.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+DEFAULTS = {
+    "ENABLED": True,  # False: every check goes to the database
+    "CACHE_ALIAS": "default",
+    "GENERATIONS": 8,  # bloom filters per REFRESH_TOKEN_LIFETIME
+    "CAPACITY": 100_000,  # expected blacklisted tokens per generation
+    "FALSE_POSITIVE_RATE": 0.001,
+}
+
+EPOCH_KEY = "accounts:token-blacklist:epoch"
+
+
+def blacklist_setting(name):
+    return getattr(settings, "TOKEN_BLACKLIST", {}).get(name, DEFAULTS[name])
+
+
+# ─── Bloom filter ──────────────────────────────────────────────────────────────
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate):
+        self.size = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # double hashing: h1 + i*h2 from one 128-bit digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BlacklistFilter:
+    """
+    Generations of bloom filters over the blacklisted jtis of this process.
+    """
+
+    def __init__(self):
+        lifetime = jwt_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        self.span = max(1, int(lifetime // blacklist_setting("GENERATIONS")))
+        self.capacity = blacklist_setting("CAPACITY")
+        self.false_positive_rate = blacklist_setting("FALSE_POSITIVE_RATE")
+        self.generations = {}  # exp // span → BloomFilter
+        self.last_id = None  # highest BlacklistedToken pk loaded
+        self.epoch = None  # cache epoch the load corresponds to
+        self._lock = threading.Lock()
+
+    def _generation(self, exp):
+        return int(exp) // self.span
+
+    def add(self, jti, exp):
+        generation = self._generation(exp)
+        bloom = self.generations.get(generation)
+        if bloom is None:
+            bloom = self.generations[generation] = BloomFilter(self.capacity, self.false_positive_rate)
+        bloom.add(jti)
+
+    def might_contain(self, jti, exp):
+        bloom = self.generations.get(self._generation(exp))
+        return bloom is not None and jti in bloom
+
+    def sync(self):
+        """
+        Loads the rows blacklisted since the last sync when the cache epoch moved.
+        """
+        epoch = current_epoch()
+        if epoch == self.epoch and self.last_id is not None:
+            return
+        with self._lock:
+            if epoch == self.epoch and self.last_id is not None:
+                return
+            now = time.time()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            if self.last_id is not None:
+                rows = rows.filter(pk__gt=self.last_id)
+            last_id = self.last_id or 0
+            for pk, jti, expires_at in rows.values_list("pk", "token__jti", "token__expires_at").iterator():
+                self.add(jti, expires_at.timestamp())
+                last_id = max(last_id, pk)
+            oldest = self._generation(now)
+            for generation in [g for g in self.generations if g < oldest]:
+                del self.generations[generation]
+            self.last_id, self.epoch = last_id, epoch
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                _filter = BlacklistFilter()
+    return _filter
+
+
+def reset_filter():
+    """
+    Forgets this process's filter (used by tests).
+    """
+    global _filter
+    with _filter_lock:
+        _filter = None
+
+
+# ─── Cache epoch ───────────────────────────────────────────────────────────────
+def _cache():
+    return caches[blacklist_setting("CACHE_ALIAS")]
+
+
+def current_epoch():
+    # Starts at the current time in ms, so a counter lost to eviction never
+    # comes back at a value a process already synced to.
+    cache = _cache()
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        cache.add(EPOCH_KEY, int(time.time() * 1000), timeout=None)
+        epoch = cache.get(EPOCH_KEY)
+    return epoch
+
+
+def bump_epoch():
+    try:
+        _cache().incr(EPOCH_KEY)
+    except ValueError:
+        pass  # no counter: every process reloads on its next check anyway
+
+
+# ─── Token class ───────────────────────────────────────────────────────────────
+class BlacklistRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        jti = self.payload[jwt_settings.JTI_CLAIM]
+        if blacklist_setting("ENABLED"):
+            blacklist = get_filter()
+            blacklist.sync()
+            if not blacklist.might_contain(jti, self.payload["exp"]):
+                return
+        # maybe blacklisted (or no filter): the database decides
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_("Token is blacklisted"))
+
+    def _outstanding_defaults(self):
+        return {
+            "user_id": self.payload.get(jwt_settings.USER_ID_CLAIM),
+            "created_at": self.current_time,
+            "token": str(self),
+            "expires_at": datetime_from_epoch(self.payload["exp"]),
+        }
+
+    def blacklist(self):
+        """
+        Raises TokenError when the token was blacklisted already, so of two
+        concurrent refreshes with one token only the first succeeds.
+        """
+        with transaction.atomic():
+            outstanding = OutstandingToken.objects.get_or_create(
+                jti=self.payload[jwt_settings.JTI_CLAIM], defaults=self._outstanding_defaults()
+            )[0]
+            try:
+                with transaction.atomic():
+                    return BlacklistedToken.objects.create(token=outstanding)
+            except IntegrityError:
+                raise TokenError(_("Token is blacklisted"))
+
+    def outstand(self):
+        # a fresh jti (set_jti() just ran): nothing to look up
+        return OutstandingToken.objects.create(
+            jti=self.payload[jwt_settings.JTI_CLAIM], **self._outstanding_defaults()
+        )
+
+
+# ─── Pruning ───────────────────────────────────────────────────────────────────
+def expired_tokens(before=None):
+    return OutstandingToken.objects.filter(expires_at__lte=before or timezone.now())
+
+
+def prune(before=None, batch_size=5000, dry_run=False):
+    """
+    Deletes outstanding tokens that expired before `before` (default: now)
+    and their blacklist rows, in batches. Returns (outstanding, blacklisted).
+    """
+    before = before or timezone.now()
+    if dry_run:
+        return (
+            expired_tokens(before).count(),
+            BlacklistedToken.objects.filter(token__expires_at__lte=before).count(),
+        )
+    outstanding = blacklisted = 0
+    while True:
+        pks = list(expired_tokens(before).order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return outstanding, blacklisted
+        with transaction.atomic():
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=pks).delete()[0]
+            outstanding += OutstandingToken.objects.filter(pk__in=pks).delete()[0]
@@ -4,13 +4,18 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from . import async_views
 from .views import (
     UserViewSet,
     PermissionViewSet,
     CommentViewSet,
     PageListView,  ProductViewSet,  
+    PageActivityListView,
     PasswordResetRequestView,
     PasswordResetVerifyView,
+    CommentHistoryListView,
+    ExportView,
+    ImportView,
 )
 # We already registered “token/” in backend/urls.py, so no need to do it here.
 from .serializers import MyTokenObtainPairView  # only imported if you ever wanted a second token endpoint here
@@ -30,13 +35,31 @@ router.register(r"comments",    CommentViewSet,    basename="comment")
 router.register(r"products", ProductViewSet, basename="product")
 
 urlpatterns = [
+    # 0) Server-Sent Events of a page's comment changes: → GET /api/comments/stream/?page_id=1
+    #    (before the router, whose comments/<pk>/ route would match "stream")
+    path("comments/stream/", async_views.comment_stream, name="comment-stream"),
+
     # 1) All router‐generated endpoints: /api/users/, /api/permissions/, /api/comments/, (maybe /api/products/)
     path("", include(router.urls)),
 
     # 2) Read-only list of pages: → GET /api/pages/
     path("pages/", PageListView.as_view(), name="page-list"),
+    #    Per-page comment counts and last activity: → GET /api/pages/activity/
+    path("pages/activity/", PageActivityListView.as_view(), name="page-activity"),
 
     # 3) Comment history (superuser only): → GET /api/comment-history/
+    path("comment-history/", CommentHistoryListView.as_view(), name="comment-history"),
+
+    # 3a) Streaming CSV / NDJSON export (superuser only): → GET /api/export/users/?output=ndjson&gzip=1
+    path("export/<slug:resource>/", ExportView.as_view(), name="export"),
+    #     Bulk CSV / NDJSON import (superuser only): → POST /api/import/users/
+    path("import/<slug:resource>/", ImportView.as_view(), name="import"),
+
+    # 3b) ASGI-native read endpoints (see accounts/async_views.py):
+    path("async/pages/", async_views.page_list, name="async-page-list"),
+    path("async/products/", async_views.product_list, name="async-product-list"),
+    path("async/products/<int:pk>/", async_views.product_detail, name="async-product-detail"),
+    path("async/comments/", async_views.comment_list, name="async-comment-list"),
 
     # 4) Password reset endpoints (optional):
     path("password-reset/request/", PasswordResetRequestView.as_view(), name="password_reset_request"),
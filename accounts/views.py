@@ -1,7 +1,16 @@
 # accounts/views.py
 
+import shutil
+import tempfile
+
+from django.db.models import F
 from rest_framework import generics, status, viewsets, permissions   # <-- Add viewsets & permissions here
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 
 # Import your serializers:
 from .serializers import (
@@ -10,8 +19,11 @@ from .serializers import (
     UserSerializer,
     UserCreateSerializer,
     PermissionSerializer,
+    PermissionBulkSerializer,
     PageSerializer,
+    PageActivitySerializer,
     CommentSerializer,
+    CommentBatchSerializer,
     CommentHistorySerializer,
     ProductSerializer     # <-- Import ProductSerializer
 )
@@ -22,18 +34,57 @@ from .models import (
     User,
     Permission,
     Page,
+    PageActivity,
     Comment,
     CommentHistory
 )
+from .metrics import SerializerMetricsMixin
+from .response_cache import CachedListMixin
+from .bulk_import import IMPORTERS, INPUTS, guess_input, import_setting, read_records, run_import
+from .export import EXPORTS, OUTPUTS, export_filename, export_setting, stream_export, stream_rows, streaming_response
+from .filters import (
+    DEFAULT_FILTER_BACKENDS,
+    QueryFilter,
+    parse_decimal,
+    parse_int,
+    parse_moment,
+)
+from .pagination import (
+    AlwaysIdKeysetPagination,
+    CreatedAtKeysetPagination,
+    IdKeysetPagination,
+    ModifiedAtKeysetPagination,
+)
+from .permission_cache import VIEW, get_permission_matrix
+from . import comment_ingest, permission_audit
+from .group_commit import group_commit_setting
+from .history_archive import load_comment_history
+from .query_planning import QueryPlanningMixin, plan_queryset
+from .search import INDEXES, get_search_backend
 
 # ─── 1) PRODUCT VIEWSET ────────────────────────────────────────────────────────
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SerializerMetricsMixin, CachedListMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     """
     All authenticated users can see the product list. Adjust permissions as needed.
+    The list response is cached and served with an ETag (see response_cache.py).
     """
+    cache_models = (Product,)
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdKeysetPagination
+
+    # GET /api/products/?price_min=10&price_max=50&name_prefix=wid&search=blue&ordering=-price
+    filter_backends = DEFAULT_FILTER_BACKENDS
+    query_filters = {
+        'price_min': QueryFilter('price', 'gte', parse_decimal),
+        'price_max': QueryFilter('price', 'lte', parse_decimal),
+        'name_prefix': QueryFilter('name', 'istartswith'),
+        'created_after': QueryFilter('created_at', 'gte', parse_moment),
+        'created_before': QueryFilter('created_at', 'lt', parse_moment),
+    }
+    search_index = 'product'
+    ordering_fields = ['id', 'name', 'price', 'created_at']
 
 
 # ─── 2) PASSWORD RESET VIEWS ───────────────────────────────────────────────────
@@ -63,10 +114,11 @@ class IsSuperuser(permissions.BasePermission):
         return bool(request.user and request.user.is_superuser)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializerMetricsMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated, IsSuperuser]
+    pagination_class = IdKeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -75,27 +127,135 @@ class UserViewSet(viewsets.ModelViewSet):
 
 
 # ─── 4) PERMISSION VIEWSET ─────────────────────────────────────────────────────
-class PermissionViewSet(viewsets.ModelViewSet):
+class PermissionViewSet(SerializerMetricsMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
     permission_classes = [permissions.IsAuthenticated, IsSuperuser]
+    pagination_class = IdKeysetPagination
 
     def perform_create(self, serializer):
         user_id = self.request.data.get('user_id')
         serializer.save(user_id=user_id)
 
+    # POST /api/permissions/bulk/
+    #   {"grants": [{"users": [1, 2], "pages": [3, 4], "can_view": true, "can_edit": false}, ...]}
+    @action(detail=False, methods=['post'], url_path='bulk', serializer_class=PermissionBulkSerializer)
+    def bulk(self, request):
+        serializer = PermissionBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        errors = sum(1 for row in results if row['status'] == 'error')
+        return Response(
+            {"applied": len(results) - errors, "errors": errors, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+    # Effective permissions (roles + overrides), see accounts/permission_audit.py:
+    # GET /api/permissions/who/?page_id=3&flag=edit[&output=ndjson]
+    @action(detail=False, methods=['get'], url_path='who')
+    def who(self, request):
+        page_id = self._required_int(request, 'page_id')
+        flag = request.query_params.get('flag', 'view')
+        if flag not in permission_audit.FLAGS:
+            raise ValidationError({'flag': [f'Choose from: {", ".join(permission_audit.FLAGS)}.']})
+        if not Page.objects.filter(pk=page_id).exists():
+            raise NotFound('Unknown page.')
+        users = permission_audit.users_with(page_id, flag)
+        fields = permission_audit.USER_FIELDS
+        if self._streamed(request):
+            rows = users.order_by('pk').values_list(*fields).iterator(chunk_size=export_setting('CHUNK_SIZE'))
+            return self._stream(request, stream_rows(fields, rows, 'ndjson'))
+        return self._paginated(request, users, lambda user: {name: getattr(user, name) for name in fields})
+
+    # GET /api/permissions/matrix/?user_id=7[&output=ndjson]
+    @action(detail=False, methods=['get'], url_path='matrix')
+    def matrix(self, request):
+        user_id = self._required_int(request, 'user_id')
+        user = User.objects.filter(pk=user_id).only('id', 'is_superuser').first()
+        if user is None:
+            raise NotFound('Unknown user.')
+        if user.is_superuser:
+            raise ValidationError({'user_id': ['Superusers may do everything on every page.']})
+        matrix, pages = permission_audit.user_pages(user_id)
+        fields = permission_audit.MATRIX_FIELDS
+        if self._streamed(request):
+            return self._stream(request, stream_rows(fields, permission_audit.stream_matrix_rows(matrix, pages), 'ndjson'))
+        paginator = AlwaysIdKeysetPagination()
+        page = paginator.paginate_queryset(pages, request, view=self)
+        rows = [dict(zip(fields, row)) for row in permission_audit.matrix_rows(matrix, page)]
+        return paginator.get_paginated_response(rows)
+
+    @staticmethod
+    def _required_int(request, name):
+        value = request.query_params.get(name)
+        if not value:
+            raise ValidationError({name: ['This parameter is required.']})
+        try:
+            return parse_int(value)
+        except ValueError:
+            raise ValidationError({name: ['A valid integer is required.']})
+
+    @staticmethod
+    def _streamed(request):
+        output = request.query_params.get('output', 'json')
+        if output not in ('json', 'ndjson'):
+            raise ValidationError({'output': ['Choose from: json, ndjson.']})
+        return output == 'ndjson'
+
+    @staticmethod
+    def _stream(request, chunks):
+        return streaming_response(request, chunks, 'application/x-ndjson')
+
+    def _paginated(self, request, queryset, to_row):
+        paginator = AlwaysIdKeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response([to_row(row) for row in page])
+
 
 # ─── 5) PAGE LIST VIEW ─────────────────────────────────────────────────────────
-class PageListView(generics.ListAPIView):
+def visible_page_ids(user):
+    """
+    Pages `user` may view, from the (cached) permission matrix.
+    """
+    matrix = getattr(user, 'permission_matrix', None)
+    if matrix is None:
+        matrix = get_permission_matrix(user.pk)
+    return [page_id for page_id, mask in matrix.masks.items() if mask & VIEW]
+
+
+class PageListView(SerializerMetricsMixin, CachedListMixin, generics.ListAPIView):
+    cache_models = (Page,)
     queryset = Page.objects.all()
     serializer_class = PageSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
+class PageActivityListView(SerializerMetricsMixin, generics.ListAPIView):
+    """
+    GET /api/pages/activity/
+    Comment count, distinct commenters, edit count and last comment time per
+    page, most recently active first: one query over the maintained
+    PageActivity rows (see accounts/page_activity.py). Non-superusers only
+    see the pages they may view.
+    """
+    serializer_class = PageActivitySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = PageActivity.objects.select_related('page').order_by(
+            F('last_comment_at').desc(nulls_last=True), 'page_id'
+        )
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(page_id__in=visible_page_ids(self.request.user))
+        return queryset
+
+
 # ─── 6) COMMENT VIEWSET ────────────────────────────────────────────────────────
 from rest_framework import mixins
 
 class CommentViewSet(
+    SerializerMetricsMixin,
+    QueryPlanningMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -105,6 +265,19 @@ class CommentViewSet(
 ):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
+
+    # GET /api/comments/?page_id=1&author=3&created_after=2025-06-01&search=refund&ordering=created_at
+    filter_backends = DEFAULT_FILTER_BACKENDS
+    query_filters = {
+        'author': QueryFilter('user_id', 'exact', parse_int),
+        'created_after': QueryFilter('created_at', 'gte', parse_moment),
+        'created_before': QueryFilter('created_at', 'lt', parse_moment),
+    }
+    search_index = 'comment'
+    ordering_fields = ['id', 'created_at', 'updated_at']
+    search_page_size = 20
+    search_max_page_size = 100
 
     def get_queryset(self):
         page_id = self.request.query_params.get("page_id")
@@ -113,11 +286,195 @@ class CommentViewSet(
         return Comment.objects.filter(page_id=page_id).order_by("-created_at")
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        if group_commit_setting("ENABLED"):
+            comment = Comment(user=self.request.user, **serializer.validated_data)
+            if not comment_ingest.save_comments([comment]):
+                raise comment_ingest.WriteQueued()
+            serializer.instance = comment
+        else:
+            serializer.save(user=self.request.user)
+
+    # POST /api/comments/batch/   {"comments": [{"page": 1, "content": "..."}, ...]}
+    #   → {"created": 2, "pending": 0, "errors": 1, "results": [{"index": 0, "status": "created", "id": 41}, ...]}
+    #   202 instead of 200 when group commit timed out and items are "pending"
+    @action(detail=False, methods=['post'], url_path='batch', serializer_class=CommentBatchSerializer)
+    def batch(self, request):
+        serializer = CommentBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save(request.user)
+        counts = {state: sum(1 for row in results if row['status'] == state) for state in ('created', 'pending')}
+        errors = len(results) - counts['created'] - counts['pending']
+        return Response(
+            {**counts, "errors": errors, "results": results},
+            status=status.HTTP_202_ACCEPTED if counts['pending'] else status.HTTP_200_OK,
+        )
+
+    # GET /api/comments/search/?q=refund&page_id=1&limit=20&offset=20
+    # GET /api/comments/search/?q=refund&in=history      (superuser only)
+    #   → {"next": ..., "results": [{..., "score": 4.1}, ...]}, best match first
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        params = request.query_params
+        term = params.get('q', '').strip()
+        scope = params.get('in', 'comments')
+        errors = {}
+        if not term:
+            errors['q'] = ['This parameter is required.']
+        if scope not in ('comments', 'history'):
+            errors['in'] = ['Must be "comments" or "history".']
+        numbers = {'limit': self.search_page_size, 'offset': 0, 'page_id': None}
+        for name in numbers:
+            if params.get(name):
+                try:
+                    numbers[name] = parse_int(params[name])
+                except ValueError:
+                    errors[name] = ['A valid integer is required.']
+        if errors:
+            raise ValidationError(errors)
+        limit = max(1, min(numbers['limit'], self.search_max_page_size))
+        offset = max(0, numbers['offset'])
+        page_id = numbers['page_id']
+
+        if scope == 'history':
+            if not request.user.is_superuser:
+                raise PermissionDenied()
+            queryset, page_field = CommentHistory.objects.all(), 'comment__page_id'
+            serializer_class, index = CommentHistorySerializer, INDEXES['comment_history']
+        else:
+            queryset, page_field = Comment.objects.all(), 'page_id'
+            serializer_class, index = CommentSerializer, INDEXES['comment']
+        if page_id is not None:
+            queryset = queryset.filter(**{page_field: page_id})
+        if not request.user.is_superuser:
+            queryset = queryset.filter(**{f'{page_field}__in': visible_page_ids(request.user)})
+
+        hits = get_search_backend().search(queryset, index, term, limit + 1, offset)
+        has_next, hits = len(hits) > limit, hits[:limit]
+        rows = plan_queryset(queryset.model.objects.filter(pk__in=[pk for pk, _ in hits]), serializer_class)
+        by_pk = {row.pk: row for row in rows}
+        results = []
+        for pk, score in hits:
+            if pk not in by_pk:
+                continue  # deleted since the index was read
+            data = serializer_class(by_pk[pk], context=self.get_serializer_context()).data
+            if scope == 'history':
+                data['comment'] = by_pk[pk].comment_id
+            data['score'] = score
+            results.append(data)
+
+        next_link = None
+        if has_next:
+            next_link = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({'next': next_link, 'results': results})
 
 
 # ─── 7) COMMENT HISTORY VIEW ───────────────────────────────────────────────────
-class CommentHistoryListView(generics.ListAPIView):
+class CommentHistoryListView(SerializerMetricsMixin, QueryPlanningMixin, generics.ListAPIView):
+    """
+    The hot history table, newest first. With ?comment_id= it returns that
+    comment's complete history instead, archived edits included and marked
+    `"archived": true` (see accounts/history_archive.py).
+    """
     queryset = CommentHistory.objects.all().order_by('-modified_at')
     serializer_class = CommentHistorySerializer
     permission_classes = [permissions.IsAuthenticated, IsSuperuser]
+    pagination_class = ModifiedAtKeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        comment_id = request.query_params.get('comment_id')
+        if not comment_id:
+            return super().list(request, *args, **kwargs)
+        try:
+            comment_id = parse_int(comment_id)
+        except ValueError:
+            raise ValidationError({'comment_id': ['A valid integer is required.']})
+        return Response([
+            dict(CommentHistorySerializer(history).data, archived=archived)
+            for history, archived in load_comment_history(comment_id)
+        ])
+
+
+# ─── 8) STREAMING EXPORT ───────────────────────────────────────────────────────
+class ExportView(APIView):
+    """
+    GET /api/export/<resource>/?output=csv|ndjson&gzip=1
+    Streams the whole table (see accounts/export.py); superuser only.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSuperuser]
+
+    def get(self, request, resource):
+        if resource not in EXPORTS:
+            raise NotFound(f'Unknown export "{resource}". Choose from: {", ".join(sorted(EXPORTS))}.')
+        output = request.query_params.get('output', 'csv')
+        if output not in OUTPUTS:
+            raise ValidationError({'output': [f'Choose from: {", ".join(sorted(OUTPUTS))}.']})
+        compress = request.query_params.get('gzip') in ('1', 'true')
+
+        response = streaming_response(
+            request,
+            stream_export(resource, output, compress),
+            content_type='application/gzip' if compress else OUTPUTS[output][0],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(resource, output, compress)}"'
+        return response
+
+
+# ─── 9) BULK IMPORT ────────────────────────────────────────────────────────────
+class ImportView(APIView):
+    """
+    POST /api/import/<users|products>/
+    Body: a multipart `file` upload, or the raw CSV / NDJSON itself
+    (Content-Type text/csv or application/x-ndjson). ?input= overrides the
+    detected format, ?gzip=1 marks a gzipped body. Superuser only.
+
+    Neither form is held in memory or capped by DATA_UPLOAD_MAX_MEMORY_SIZE:
+    uploads over FILE_UPLOAD_MAX_MEMORY_SIZE go to a temporary file, and
+    a raw body is copied to one as it arrives.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSuperuser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, resource):
+        if resource not in IMPORTERS:
+            raise NotFound(f'Unknown import "{resource}". Choose from: {", ".join(sorted(IMPORTERS))}.')
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                raise ValidationError({'file': ['No file was submitted.']})
+            input_format, compressed = guess_input(upload.name)
+            upload = upload.file
+        else:
+            upload = self._spool_body(request)
+            input_format = 'ndjson' if 'ndjson' in request.content_type else 'csv'
+            compressed = False
+        with upload:
+            return self._import(request, resource, upload, input_format, compressed)
+
+    @staticmethod
+    def _spool_body(request):
+        spooled = tempfile.TemporaryFile()
+        if request.stream is not None:
+            shutil.copyfileobj(request.stream, spooled, 64 * 1024)
+        spooled.seek(0)
+        return spooled
+
+    def _import(self, request, resource, upload, input_format, compressed):
+        input_format = request.query_params.get('input', input_format)
+        if input_format not in INPUTS:
+            raise ValidationError({'input': [f'Choose from: {", ".join(INPUTS)}.']})
+        compressed = compressed or request.query_params.get('gzip') in ('1', 'true')
+
+        limit = import_setting('MAX_REPORTED_ERRORS')
+        errors = []
+
+        def on_error(line, row_errors):
+            if len(errors) < limit:
+                errors.append({'line': line, 'errors': row_errors})
+
+        result = run_import(resource, read_records(upload, input_format, compressed), on_error=on_error)
+        return Response({
+            'created': result.created,
+            'failed': result.failed,
+            'errors': errors,
+            'errors_truncated': result.failed > len(errors),
+        }, status=status.HTTP_200_OK)
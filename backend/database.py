@@ -0,0 +1,101 @@
+"""
+Environment-driven DATABASES profiles.
+
+DB_PROFILE=sqlite (default) — single-file installs and development:
+    SQLITE_PATH            database file (default: BASE_DIR / "db.sqlite3")
+    SQLITE_BUSY_TIMEOUT    seconds a writer waits for the lock (default 5)
+    SQLITE_MMAP_SIZE       bytes of the file memory-mapped for reads (default 128 MiB)
+    SQLITE_CACHE_KB        page cache size in KiB (default 20000)
+
+  WAL lets readers run alongside the single writer, synchronous=NORMAL
+  drops the fsync per commit (still crash-safe in WAL mode, a power loss
+  can lose only the last transactions), and IMMEDIATE transactions take the
+  write lock up front so concurrent writers queue on the busy timeout
+  instead of failing with "database is locked" when a read upgrades.
+
+DB_PROFILE=postgres — production:
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    DB_CONN_MAX_AGE        seconds a connection is reused (default 60)
+    DB_POOL=1              psycopg connection pool instead of persistent
+                           connections (needs `psycopg[pool]`)
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT
+    DB_PGBOUNCER=1         behind PgBouncer in transaction mode: no
+                           server-side cursors
+
+`python manage.py bench_db_writes` measures write throughput of whichever
+profile is active.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ("sqlite", "postgres")
+
+
+def _env_int(env, name, default):
+    value = env.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_flag(env, name):
+    return env.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def sqlite_profile(base_dir, env):
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={_env_int(env, 'SQLITE_MMAP_SIZE', 128 * 1024 * 1024)}",
+        f"PRAGMA cache_size=-{_env_int(env, 'SQLITE_CACHE_KB', 20000)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": env.get("SQLITE_PATH") or base_dir / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": ";".join(pragmas),
+            "transaction_mode": "IMMEDIATE",
+            "timeout": _env_int(env, "SQLITE_BUSY_TIMEOUT", 5),
+        },
+    }
+
+
+def postgres_profile(env):
+    options = {}
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get("DB_NAME", "superadmin"),
+        "USER": env.get("DB_USER", "postgres"),
+        "PASSWORD": env.get("DB_PASSWORD", ""),
+        "HOST": env.get("DB_HOST", "localhost"),
+        "PORT": env.get("DB_PORT", "5432"),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": options,
+    }
+    if _env_flag(env, "DB_POOL"):
+        # Django refuses persistent connections on top of a pool.
+        config["CONN_MAX_AGE"] = 0
+        options["pool"] = {
+            "min_size": _env_int(env, "DB_POOL_MIN_SIZE", 2),
+            "max_size": _env_int(env, "DB_POOL_MAX_SIZE", 20),
+            "timeout": _env_int(env, "DB_POOL_TIMEOUT", 10),
+        }
+    else:
+        config["CONN_MAX_AGE"] = _env_int(env, "DB_CONN_MAX_AGE", 60)
+    if _env_flag(env, "DB_PGBOUNCER"):
+        config["DISABLE_SERVER_SIDE_CURSORS"] = True
+    return config
+
+
+def database_config(base_dir, env=None):
+    """
+    The DATABASES["default"] entry for env["DB_PROFILE"].
+    """
+    env = os.environ if env is None else env
+    profile = env.get("DB_PROFILE", "sqlite")
+    if profile == "sqlite":
+        return sqlite_profile(base_dir, env)
+    if profile == "postgres":
+        return postgres_profile(env)
+    raise ImproperlyConfigured(f"Unknown DB_PROFILE {profile!r}; expected one of {', '.join(PROFILES)}.")
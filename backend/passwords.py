@@ -0,0 +1,74 @@
+"""
+Environment-driven PASSWORD_HASHERS profiles.
+
+PASSWORD_HASHER_PROFILE picks the hasher new passwords are stored with:
+    pbkdf2 (default)   PBKDF2-SHA256; PBKDF2_ITERATIONS (default: Django's)
+    scrypt             hashlib.scrypt; SCRYPT_WORK_FACTOR (N, a power of 2),
+                       SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM
+    argon2             Argon2id (needs `argon2-cffi`); ARGON2_TIME_COST,
+                       ARGON2_MEMORY_COST (KiB), ARGON2_PARALLELISM
+    bcrypt             BCrypt-SHA256 (needs `bcrypt`)
+
+The other hashers stay in the list so existing hashes keep verifying.
+Django re-hashes a password with the preferred hasher on the next
+successful login whenever its algorithm or cost differs, so switching the
+profile or a cost upgrades users as they log in; nobody has to reset.
+
+`python manage.py bench_hashers` measures the cost of every profile and
+logins/s per core of the active one, and suggests costs for a target
+verify time.
+"""
+
+import importlib.util
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+HASHERS = {
+    "pbkdf2": "accounts.hashers.PBKDF2PasswordHasher",
+    "scrypt": "accounts.hashers.ScryptPasswordHasher",
+    "argon2": "accounts.hashers.Argon2PasswordHasher",
+    "bcrypt": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+}
+# verify-only: hashes written by older Django defaults
+LEGACY_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+LIBRARIES = {"argon2": "argon2", "bcrypt": "bcrypt"}
+
+COSTS = (
+    "PBKDF2_ITERATIONS",
+    "SCRYPT_WORK_FACTOR", "SCRYPT_BLOCK_SIZE", "SCRYPT_PARALLELISM",
+    "ARGON2_TIME_COST", "ARGON2_MEMORY_COST", "ARGON2_PARALLELISM",
+)
+
+
+def library_available(profile):
+    library = LIBRARIES.get(profile)
+    return library is None or importlib.util.find_spec(library) is not None
+
+
+def password_hashers(env=None):
+    """
+    PASSWORD_HASHERS for env["PASSWORD_HASHER_PROFILE"]: its hasher first.
+    """
+    env = os.environ if env is None else env
+    profile = env.get("PASSWORD_HASHER_PROFILE", "pbkdf2")
+    if profile not in HASHERS:
+        raise ImproperlyConfigured(
+            f"Unknown PASSWORD_HASHER_PROFILE {profile!r}; expected one of {', '.join(HASHERS)}."
+        )
+    if not library_available(profile):
+        raise ImproperlyConfigured(
+            f"PASSWORD_HASHER_PROFILE={profile} needs the {LIBRARIES[profile]!r} package."
+        )
+    others = [path for name, path in HASHERS.items() if name != profile]
+    return [HASHERS[profile], *others, *LEGACY_HASHERS]
+
+
+def hasher_costs(env=None):
+    """
+    PASSWORD_HASHER_COST: the cost overrides set in the environment.
+    """
+    env = os.environ if env is None else env
+    return {name: int(env[name]) for name in COSTS if env.get(name) not in (None, "")}
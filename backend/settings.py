@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .database import database_config
+from .passwords import hasher_costs, password_hashers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware (see METRICS below)
+    'accounts.metrics.MetricsMiddleware',
     # CorsMiddleware should load very high, before CommonMiddleware
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -85,17 +90,23 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Picked by the DB_PROFILE environment variable ("sqlite" or "postgres");
+# see backend/database.py for the knobs of each profile.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# ─── Password hashing ──────────────────────────────────────────────────────────
+# PASSWORD_HASHER_PROFILE (pbkdf2/scrypt/argon2/bcrypt) and the cost variables
+# are read from the environment (see backend/passwords.py); stored hashes are
+# upgraded on each user's next login.
+PASSWORD_HASHERS = password_hashers()
+PASSWORD_HASHER_COST = hasher_costs()
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -138,7 +149,8 @@ from datetime import timedelta
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication that trusts fresh token claims on reads
+        'accounts.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -155,6 +167,8 @@ SIMPLE_JWT = {
 
     # <-- This must match the import path to your MyTokenObtainPairSerializer:
     "TOKEN_OBTAIN_PAIR_SERIALIZER": "accounts.serializers.MyTokenObtainPairSerializer",
+    # Re-stamps username/permission claims on every refreshed access token
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.MyTokenRefreshSerializer",
 }
 AUTH_USER_MODEL = 'accounts.User'
 # ─── Email settings for development ────────────────────────────────────────────
@@ -166,3 +180,146 @@ EMAIL_USE_TLS = False
 EMAIL_HOST_USER = ''
 EMAIL_HOST_PASSWORD = ''
 DEFAULT_FROM_EMAIL = 'no-reply@example.com'
+
+# ─── Page-permission matrix cache ──────────────────────────────────────────────
+# Compiled per-user permission matrices used by HasPagePermission.
+# Set CACHE_ALIAS to a shared cache (e.g. Redis/Memcached) when running more
+# than one worker process so invalidations reach every process; without it a
+# change made in one worker reaches the others only once their entries are
+# TIMEOUT seconds old.
+PAGE_PERMISSION_CACHE = {
+    "MAXSIZE": 10000,
+    "CACHE_ALIAS": None,
+    "TIMEOUT": 3600,
+}
+
+# ─── Outbound mail queue ───────────────────────────────────────────────────────
+# Requests only enqueue mail; run `python manage.py send_queued_mail --loop`
+# to deliver it. Use "accounts.outbox.ImmediateOutbox" to send in-request.
+EMAIL_OUTBOX = {
+    "BACKEND": "accounts.outbox.DatabaseOutbox",
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 5,
+    "RETRY_BACKOFF": 30,
+    "LEASE": 300,
+}
+
+# ─── Password-reset OTPs ───────────────────────────────────────────────────────
+# STORE: "accounts.otp.DatabaseOTPStore" (purge with `manage.py purge_expired_otps`)
+#     or "accounts.otp.CacheOTPStore" (expires natively; needs a shared cache
+#        when running more than one process).
+PASSWORD_RESET_OTP = {
+    "STORE": "accounts.otp.DatabaseOTPStore",
+    "CACHE_ALIAS": "default",
+    "TTL": 900,
+    "RATE_LIMIT": 5,
+    "VERIFY_RATE_LIMIT": 10,
+    "RATE_WINDOW": 3600,
+}
+
+# ─── Stateless JWT claims ──────────────────────────────────────────────────────
+# Auth-version counters live in this cache; it must be shared between worker
+# processes (Redis/Memcached) once there is more than one. Claims are not
+# trusted from a LocMemCache unless SINGLE_PROCESS is set.
+STATELESS_JWT = {
+    "CACHE_ALIAS": "default",
+    "MAX_PERMS_IN_TOKEN": 200,
+    "SINGLE_PROCESS": False,
+}
+
+# ─── Cached list responses (PageListView, ProductViewSet.list) ─────────────────
+# Model versions live in this cache; lists are not cached (nor answered 304)
+# from a LocMemCache unless SINGLE_PROCESS is set.
+RESPONSE_CACHE = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+    "SINGLE_PROCESS": False,
+}
+
+# ─── Text search (?search= on products/comments) ───────────────────────────────
+# "accounts.search.SQLiteFTS5Backend" uses the FTS5 tables from migration 0006;
+# run `python manage.py rebuild_search_index` after switching to it.
+SEARCH = {
+    "BACKEND": "accounts.search.LikeSearchBackend",
+}
+
+# ─── Comment history archive ───────────────────────────────────────────────────
+# `python manage.py archive_comment_history` moves history older than
+# RETENTION_DAYS into monthly gzip JSON-lines segments under DIR.
+COMMENT_HISTORY_ARCHIVE = {
+    "DIR": BASE_DIR / "archive" / "comment_history",
+    "RETENTION_DAYS": 365,
+    "BATCH_SIZE": 5000,
+}
+
+# ─── Bulk export / import (/api/export/, /api/import/, import_records) ─────────
+EXPORT = {
+    "CHUNK_SIZE": 2000,
+    "CHUNK_BYTES": 64 * 1024,
+}
+# WORKERS: password-hashing processes for user imports (None = one per CPU).
+IMPORT = {
+    "CHUNK_SIZE": 1000,
+    "WORKERS": None,
+    "MAX_REPORTED_ERRORS": 1000,
+}
+
+# ─── Request metrics (GET /metrics, Prometheus text format) ────────────────────
+# /metrics answers staff sessions and "Authorization: Bearer <TOKEN>" (set
+# TOKEN for the scraper); PUBLIC = True opens it to anybody. SLOW_REQUEST_MS
+# logs slower requests with their SQL to the "accounts.metrics.slow" logger.
+METRICS = {
+    "ENABLED": True,
+    "TOKEN": None,
+    "PUBLIC": False,
+    "SLOW_REQUEST_MS": 1000,
+    "SLOW_SQL_LIMIT": 50,
+}
+
+# ─── Comment stream (GET /api/comments/stream/, Server-Sent Events) ────────────
+# LocalBroker fans out in-process: run one ASGI worker for the stream (or
+# plug a shared broker into BROKER). BUFFER_SIZE events per page are kept
+# for clients resuming with Last-Event-ID.
+REALTIME = {
+    "ENABLED": True,
+    "BROKER": "accounts.realtime.LocalBroker",
+    "BUFFER_SIZE": 200,
+    "QUEUE_SIZE": 1000,
+    "HEARTBEAT": 15,
+    "RETRY_MS": 3000,
+}
+
+# ─── Login throttling (POST /api/token/) ───────────────────────────────────────
+# Failed attempts per username / client IP within WINDOW seconds; over the
+# limit, logins are refused before the password is hashed.
+LOGIN_THROTTLE = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "default",
+    "WINDOW": 900,
+    "USER_FAILURES": 10,
+    "IP_FAILURES": 50,
+}
+
+# ─── Refresh-token blacklist (see accounts/token_blacklist.py) ─────────────────
+# Per-process bloom filters answer "never blacklisted" without a query; one
+# filter per REFRESH_TOKEN_LIFETIME / GENERATIONS of token expiry, dropped
+# once its tokens have expired. Prune expired rows from cron with
+# `python manage.py prune_token_blacklist`.
+TOKEN_BLACKLIST = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "default",
+    "GENERATIONS": 8,
+    "CAPACITY": 100_000,
+    "FALSE_POSITIVE_RATE": 0.001,
+}
+
+# ─── Group commit (comment creates, see accounts/group_commit.py) ──────────────
+# Coalesces concurrent comment creates (POST /api/comments/ and
+# /api/comments/batch/) into one transaction per MAX_WAIT_MS window, per
+# process. Off by default: the writes leave the request's transaction.
+GROUP_COMMIT = {
+    "ENABLED": False,
+    "MAX_BATCH": 500,
+    "MAX_WAIT_MS": 5,
+    "TIMEOUT": 30,
+}
@@ -4,6 +4,7 @@ from django.contrib import admin
 from django.urls import path, include
 from accounts.serializers import MyTokenObtainPairView
 from rest_framework_simplejwt.views import TokenRefreshView
+from accounts.metrics import metrics_view
 
 urlpatterns = [
     # 1) Django admin:
@@ -20,4 +21,7 @@ urlpatterns = [
     # 4) All other “/api/…” endpoints are delegated to accounts/urls.py
     #    This is where our router will register users, permissions, comments, etc.
     path("api/", include("accounts.urls")),
+
+    # 5) Prometheus scrape endpoint (see accounts/metrics.py):
+    path("metrics", metrics_view, name="metrics"),
 ]